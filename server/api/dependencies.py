@@ -1,29 +1,42 @@
+import hmac
 from typing import Annotated, Optional
-from fastapi import Depends, HTTPException, Security, status
+from fastapi import Depends, HTTPException, Request, Security, status
 from fastapi.security import OAuth2PasswordBearer, SecurityScopes
 from jwt.exceptions import InvalidTokenError, ExpiredSignatureError
 from pydantic import ValidationError
-import jwt
 import logging
 
-from core.config import SECRET_KEY, ALGORITHM
-from schemas.auth import TokenData
+from core.config import PEKA_METRICS_TOKEN
 from schemas.user import User
-from repositories.user_repo import get_user
-from db.supabase import create_supabase_client
+from repositories.user_repo import find_user
+from services.job_queue import JobQueue
+from services.llm_scheduler import LLMScheduler
+from services.peka_service import PekaService
+from services.token_cache import token_cache
+from services.user_cache import user_cache
+from postgrest import AsyncPostgrestClient
+from supabase import Client
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-supabase = create_supabase_client()
-
 oauth2_scheme = OAuth2PasswordBearer(
     tokenUrl="/api/auth/token",
     scopes={"me": "Read information about the current user.", "items": "Read items."},
 )
 
+def get_db(request: Request) -> Client:
+    """Return the worker-wide Supabase client created in the app lifespan (for Supabase auth)."""
+    return request.app.state.supabase
+
+def get_async_db(request: Request) -> AsyncPostgrestClient:
+    """Return the worker-wide async PostgREST client created in the app lifespan (for table access)."""
+    return request.app.state.async_db
+
 async def get_current_user(
-    security_scopes: SecurityScopes, token: Annotated[str, Depends(oauth2_scheme)]
+    security_scopes: SecurityScopes,
+    token: Annotated[str, Depends(oauth2_scheme)],
+    db: Annotated[AsyncPostgrestClient, Depends(get_async_db)],
 ) -> User:
     logger.info("Starting user authentication")
     logger.debug(f"Security scopes: {security_scopes.scopes}")
@@ -41,26 +54,17 @@ async def get_current_user(
     )
     
     try:
-        # Decode JWT token
-        logger.debug("Attempting to decode JWT token")
-        logger.debug(f"Using algorithm: {ALGORITHM}")
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        logger.debug(f"Token payload: {payload}")
+        # Decode and verify the JWT token, or reuse the result for a token seen before
+        verified = token_cache.verify(token)
         
-        email: Optional[str] = payload.get("sub")
+        email: Optional[str] = verified.subject
         if email is None:
             logger.error("No email found in token payload")
             raise credentials_exception
         
-        # Get token scopes
-        token_scopes = payload.get("scopes", [])
-        logger.debug(f"Token scopes: {token_scopes}")
-        token_data = TokenData(scopes=token_scopes, username=email)
-        logger.debug(f"Token data: {token_data}")
-        
-        # Get user from database - using email as username parameter
-        logger.info(f"Fetching user from database: {email}")
-        user = get_user(supabase, username=email)  # Using email as username parameter
+        # Get user from the cache or database - using email as username parameter
+        logger.info(f"Fetching user: {email}")
+        user = await user_cache.get_or_load(email, lambda username: find_user(db, username=username))
         if user is None:
             logger.error(f"User not found in database: {email}")
             raise credentials_exception
@@ -68,9 +72,9 @@ async def get_current_user(
         # Check scopes
         logger.debug(f"Checking required scopes: {security_scopes.scopes}")
         for scope in security_scopes.scopes:
-            if scope not in token_data.scopes:
+            if scope not in verified.scopes:
                 logger.error(f"User {email} missing required scope: {scope}")
-                logger.error(f"User has scopes: {token_data.scopes}")
+                logger.error(f"User has scopes: {sorted(verified.scopes)}")
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
                     detail="Not enough permissions",
@@ -107,4 +111,49 @@ async def get_current_active_user(
 ) -> User:
     logger.info(f"Getting active user: {current_user.email}")
     logger.debug(f"Active user details: {current_user}")
-    return current_user 
\ No newline at end of file
+    return current_user
+
+def get_peka_service(request: Request) -> PekaService:
+    """Return the worker-wide PekaService created in the app lifespan."""
+    peka_service = getattr(request.app.state, "peka_service", None)
+    if peka_service is None:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Cohere API key not configured. Please set COHERE_API_KEY environment variable."
+        )
+    return peka_service
+
+def get_llm_scheduler(request: Request) -> LLMScheduler:
+    """Return the worker-wide LLM admission scheduler created in the app lifespan."""
+    return request.app.state.llm_scheduler
+
+def get_job_queue(request: Request) -> JobQueue:
+    """Return the worker-wide background job queue created in the app lifespan."""
+    return request.app.state.job_queue
+
+def get_analysis_jobs(request: Request) -> JobQueue:
+    """Return the worker pool that runs async /analyze jobs."""
+    return request.app.state.analysis_jobs
+
+LOOPBACK_HOSTS = {"127.0.0.1", "::1", "localhost"}
+
+def verify_metrics_access(request: Request) -> None:
+    """Guard GET /metrics, which exposes per-route latencies, breaker state and queue depths.
+
+    With PEKA_METRICS_TOKEN set, callers must send it as a bearer token; without it,
+    only loopback clients are allowed, so a public bind never exposes the metrics.
+    """
+    if PEKA_METRICS_TOKEN:
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), PEKA_METRICS_TOKEN.encode()):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid metrics token",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        return
+    if request.client is None or request.client.host not in LOOPBACK_HOSTS:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Metrics are only served to local clients unless PEKA_METRICS_TOKEN is set"
+        )
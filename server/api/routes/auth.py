@@ -10,24 +10,26 @@ from schemas.auth import Token, GoogleAuthRequest, GoogleAuthResponse
 from services.auth_service import authenticate_user, create_jwt_token
 from services.google_auth_service import verify_google_token
 from repositories.user_repo import create_or_update_oauth_user
-from db.supabase import create_supabase_client
+from postgrest import AsyncPostgrestClient
+from supabase import Client
+from api.dependencies import get_async_db, get_db
 
 # Configure logging
 logger = logging.getLogger(__name__)
 from services.token_service import TokenService
 
 router = APIRouter()
-supabase = create_supabase_client()
 
 @router.post("/token", response_model=Token)
 async def login_for_access_token(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
+    db: Annotated[AsyncPostgrestClient, Depends(get_async_db)],
 ) -> Token:
     try:
         logger.info(f"Login attempt for email: {form_data.username}")
         logger.debug(f"Requested scopes: {form_data.scopes}")
         
-        user = authenticate_user(supabase, form_data.username, form_data.password)
+        user = await authenticate_user(db, form_data.username, form_data.password)
         if not user:
             logger.warning(f"Authentication failed for email: {form_data.username}")
             raise HTTPException(
@@ -76,7 +78,9 @@ async def login_for_access_token(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/google", response_model=GoogleAuthResponse)
-async def google_auth(request: Request, auth_request: GoogleAuthRequest):
+async def google_auth(
+    request: Request, auth_request: GoogleAuthRequest, db: Annotated[Client, Depends(get_db)]
+):
     """
     Verify Google token to get user info, then sign in or create user with Supabase
     """
@@ -94,7 +98,7 @@ async def google_auth(request: Request, auth_request: GoogleAuthRequest):
 
         # Try OAuth sign in first
         try:
-            oauth_response = supabase.auth.sign_in_with_oauth({
+            oauth_response = db.auth.sign_in_with_oauth({
                 "provider": "google",
                 "access_token": user_info['access_token'],
             })
@@ -104,7 +108,7 @@ async def google_auth(request: Request, auth_request: GoogleAuthRequest):
             print(f"OAuth sign in failed: {str(e)}")
 
         # Create or update user in our database
-        db_user = create_or_update_oauth_user(user_info)
+        db_user = await create_or_update_oauth_user(user_info)
         if not db_user:
             raise HTTPException(status_code=400, detail="Failed to create/update user")
 
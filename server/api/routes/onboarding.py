@@ -2,16 +2,15 @@ from typing import Annotated, List
 from fastapi import APIRouter, Depends, HTTPException
 from schemas.onboarding import OnboardingPreferences
 from schemas.user import User
-from api.dependencies import get_current_active_user
-from db.supabase import create_supabase_client
+from postgrest import AsyncPostgrestClient
+from api.dependencies import get_async_db, get_current_active_user
 
 router = APIRouter()
-supabase = create_supabase_client()
 
-async def get_user_id_by_email(email: str) -> int:
+async def get_user_id_by_email(db: AsyncPostgrestClient, email: str) -> int:
     try:
         # Get the user's ID from the users table
-        result = supabase.from_("users").select("id").eq("email", email).execute()
+        result = await db.from_("users").select("id").eq("email", email).execute()
         if not result.data or len(result.data) == 0:
             raise HTTPException(status_code=404, detail="User not found")
         return result.data[0]["id"]
@@ -22,14 +21,15 @@ async def get_user_id_by_email(email: str) -> int:
 @router.post("/preferences")
 async def save_onboarding_preferences(
     preferences: OnboardingPreferences,
-    current_user: Annotated[User, Depends(get_current_active_user)]
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    db: Annotated[AsyncPostgrestClient, Depends(get_async_db)]
 ):
     try:
         print(f"Saving preferences for user: {current_user.email}")
         print(f"Preferences data: {preferences.dict()}")
         
         # Get the numeric user ID
-        user_id = await get_user_id_by_email(current_user.email)
+        user_id = await get_user_id_by_email(db, current_user.email)
         print(f"Found user ID: {user_id}")
         
         # Format the data for Supabase
@@ -40,7 +40,7 @@ async def save_onboarding_preferences(
         print(f"Formatted data for database: {preference_data}")
         
         # Save preferences to database
-        result = supabase.from_("user_preferences").upsert(preference_data).execute()
+        result = await db.from_("user_preferences").upsert(preference_data).execute()
         print(f"Database response: {result}")
         
         return {"message": "Preferences saved successfully"}
@@ -56,17 +56,18 @@ async def save_onboarding_preferences(
 
 @router.get("/preferences", response_model=OnboardingPreferences)
 async def get_onboarding_preferences(
-    current_user: Annotated[User, Depends(get_current_active_user)]
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    db: Annotated[AsyncPostgrestClient, Depends(get_async_db)]
 ):
     try:
         print(f"Getting preferences for user: {current_user.email}")
         
         # Get the numeric user ID
-        user_id = await get_user_id_by_email(current_user.email)
+        user_id = await get_user_id_by_email(db, current_user.email)
         print(f"Found user ID: {user_id}")
         
         # Get preferences from database
-        result = supabase.from_("user_preferences").select("*").eq("user_id", user_id).execute()
+        result = await db.from_("user_preferences").select("*").eq("user_id", user_id).execute()
         print(f"Database response: {result}")
         
         if not result.data:
@@ -87,14 +88,15 @@ async def get_onboarding_preferences(
 
 @router.get("/")
 async def get_onboarding_status(
-    current_user: Annotated[User, Depends(get_current_active_user)]
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    db: Annotated[AsyncPostgrestClient, Depends(get_async_db)]
 ):
     try:
         # Get the numeric user ID
-        user_id = await get_user_id_by_email(current_user.email)
+        user_id = await get_user_id_by_email(db, current_user.email)
         
         # Check if user has completed onboarding
-        result = supabase.from_("user_preferences").select("*").eq("user_id", user_id).execute()
+        result = await db.from_("user_preferences").select("*").eq("user_id", user_id).execute()
         
         return {
             "completed": len(result.data) > 0,
@@ -1,64 +1,78 @@
 from fastapi import APIRouter, Depends, HTTPException, Request, status
-from typing import List
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from typing import Dict, List, Literal, Optional
 from schemas.peka import Task, PekaResponse, GeneralResponse
+from services.job_queue import JobQueue, JobQueueFull
+from services.llm_scheduler import LLMScheduler
 from services.peka_service import PekaService
+from services.task_enrichment import enrich_todo
 from services.todo_service import create_todo
-from api.dependencies import get_current_user
+from api.dependencies import get_analysis_jobs, get_current_user, get_job_queue, get_llm_scheduler, get_peka_service
 from schemas.user import User
 from schemas.todo import TodoCreate
+from core.metrics import metrics
 from pydantic import BaseModel
-import os
-from dotenv import load_dotenv
+import asyncio
+import json
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-load_dotenv()
-
 router = APIRouter(
     tags=["peka"]
 )
 
 class AnalyzeTasksRequest(BaseModel):
-    tasks: List[Task]
+    # Omit to analyze the user's open tasks from the database
+    tasks: Optional[List[Task]] = None
+    # 'local' | 'hybrid' | 'llm'; defaults to PEKA_ANALYZE_MODE
+    mode: Optional[Literal["local", "hybrid", "llm"]] = None
 
 class QueryRequest(BaseModel):
     query: str
+    bypass_cache: bool = False
 
 class CreateTaskRequest(BaseModel):
     title: str
     description: str = ""
     priority: str = "low"
     estimated_duration: int = 30
+    # Insert the todo right away and add AI suggestions in a background job
+    background: bool = False
 
-def get_cohere_api_key():
-    api_key = os.getenv("COHERE_API_KEY")
-    logger.debug(f"Loading Cohere API key: {'Found' if api_key else 'Not found'}")
-    if not api_key:
+@router.get("/ready")
+async def readiness(peka_service: PekaService = Depends(get_peka_service)):
+    """Readiness probe: checks that the Cohere API is reachable"""
+    if not await peka_service.check_connection():
         raise HTTPException(
-            status_code=500,
-            detail="Cohere API key not configured. Please set COHERE_API_KEY environment variable."
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Failed to connect to Cohere API. Please check your internet connection and API key."
         )
-    return api_key
+    return {"status": "ready"}
 
 @router.post("/analyze", response_model=PekaResponse)
 async def analyze_tasks(
     request: Request,
     task_request: AnalyzeTasksRequest,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    peka_service: PekaService = Depends(get_peka_service),
+    scheduler: LLMScheduler = Depends(get_llm_scheduler)
 ):
     """Analyze tasks and provide recommendations"""
     logger.info(f"Received analyze request from user {current_user.email}")
     logger.debug(f"Request body: {task_request}")
     try:
-        cohere_api_key = get_cohere_api_key()
-        logger.debug("Initializing PekaService")
-        peka_service = PekaService(cohere_api_key)
         logger.debug("Processing analyze request")
-        response = await peka_service.analyze_tasks(task_request.tasks)
+        tasks = task_request.tasks
+        if tasks is None:
+            tasks = await peka_service.get_user_tasks(current_user.id)
+        async with scheduler.slot(current_user.id):
+            response = await peka_service.analyze_tasks(
+                tasks, mode=task_request.mode, user_id=current_user.id
+            )
         logger.debug(f"Response: {response}")
         return response
     except HTTPException as e:
@@ -72,43 +86,114 @@ async def analyze_tasks(
             detail=f"Error analyzing tasks: {str(e)}"
         )
 
+@router.post("/analyze/jobs", response_model=dict, status_code=status.HTTP_202_ACCEPTED)
+async def submit_analysis_job(
+    task_request: AnalyzeTasksRequest,
+    current_user: User = Depends(get_current_user),
+    peka_service: PekaService = Depends(get_peka_service),
+    scheduler: LLMScheduler = Depends(get_llm_scheduler),
+    analysis_jobs: JobQueue = Depends(get_analysis_jobs)
+):
+    """Start an analysis in the background; poll GET /analyze/jobs/{job_id} for the result"""
+    logger.info(f"Received analyze job request from user {current_user.email}")
+    if task_request.tasks is not None and not task_request.tasks:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No tasks to analyze")
+
+    async def run_analysis():
+        tasks = task_request.tasks
+        if tasks is None:
+            tasks = await peka_service.get_user_tasks(current_user.id)
+        async with scheduler.slot(current_user.id):
+            response = await peka_service.analyze_tasks(
+                tasks, mode=task_request.mode, user_id=current_user.id
+            )
+        return response.model_dump(mode="json")
+
+    try:
+        job = analysis_jobs.submit("analyze", current_user.id, run_analysis)
+    except JobQueueFull:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many analyses queued. Please try again shortly.",
+            headers={"Retry-After": "10"}
+        )
+    return {"job_id": job.id, "status": job.status}
+
+@router.get("/analyze/jobs/{job_id}", response_model=dict)
+async def get_analysis_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+    analysis_jobs: JobQueue = Depends(get_analysis_jobs)
+):
+    """Status of an analysis job; 'result' holds the PekaResponse once it has succeeded"""
+    job = analysis_jobs.get(job_id, user_id=current_user.id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job.to_dict()
+
+@router.delete("/analyze/jobs/{job_id}", response_model=dict)
+async def cancel_analysis_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+    analysis_jobs: JobQueue = Depends(get_analysis_jobs)
+):
+    """Cancel a queued or running analysis job"""
+    job = analysis_jobs.cancel(job_id, user_id=current_user.id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job.to_dict()
+
+def _duplicates(created_todo) -> List[Dict]:
+    return [match.model_dump() for match in created_todo.possible_duplicates]
+
+async def create_todo_from_response(response: Dict, current_user: User) -> Dict:
+    """Insert the todo for a 'create' query response and add its id to the response"""
+    if response['intent'] == 'create' and response['task_details']:
+        logger.debug("Detected task creation intent")
+        todo_data = TodoCreate(
+            title=response['task_details']['title'],
+            description=response['task_details']['description'],
+            priority=response['task_details']['priority'],
+            estimated_duration=response['task_details']['estimated_duration']
+        )
+        
+        logger.debug(f"Creating todo in database: {todo_data}")
+        created_todo = await create_todo(todo_data, current_user.id)
+        logger.debug(f"Created todo: {created_todo}")
+
+        # Update response with actual task ID
+        response['task_details']['task_id'] = created_todo.id
+        response['task_details']['possible_duplicates'] = _duplicates(created_todo)
+        response['message'] = f"Task created successfully! {response['message']}"
+    return response
+
+def _sse(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
 @router.post("/query", response_model=dict)
 async def handle_query(
     request: Request,
     query_request: QueryRequest,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    peka_service: PekaService = Depends(get_peka_service),
+    scheduler: LLMScheduler = Depends(get_llm_scheduler)
 ):
     """Handle all queries through a unified endpoint"""
     logger.info(f"Received query request from user {current_user.email}")
     logger.debug(f"Request body: {query_request}")
     try:
-        cohere_api_key = get_cohere_api_key()
-        logger.debug("Initializing PekaService")
-        peka_service = PekaService(cohere_api_key)
         logger.debug("Processing unified query")
         
         # Get AI response
         logger.debug(f"Sending query to PekaService: {query_request.query}")
-        response = await peka_service.handle_query(query_request.query)
+        async with scheduler.slot(current_user.id):
+            response = await peka_service.handle_query(
+                query_request.query, bypass_cache=query_request.bypass_cache, user_id=current_user.id
+            )
         logger.debug(f"AI response: {response}")
 
         # If this is a task creation request, create the task in the database
-        if response['intent'] == 'create' and response['task_details']:
-            logger.debug("Detected task creation intent")
-            todo_data = TodoCreate(
-                title=response['task_details']['title'],
-                description=response['task_details']['description'],
-                priority=response['task_details']['priority'],
-                estimated_duration=response['task_details']['estimated_duration']
-            )
-            
-            logger.debug(f"Creating todo in database: {todo_data}")
-            created_todo = create_todo(todo_data, current_user.id)
-            logger.debug(f"Created todo: {created_todo}")
-
-            # Update response with actual task ID
-            response['task_details']['task_id'] = created_todo.id
-            response['message'] = f"Task created successfully! {response['message']}"
+        response = await create_todo_from_response(response, current_user)
         
         logger.info("Successfully processed query")
         return response
@@ -123,23 +208,141 @@ async def handle_query(
             detail=f"Error processing query: {str(e)}"
         )
 
+@router.post("/query/stream")
+async def stream_query(
+    request: Request,
+    query_request: QueryRequest,
+    current_user: User = Depends(get_current_user),
+    peka_service: PekaService = Depends(get_peka_service),
+    scheduler: LLMScheduler = Depends(get_llm_scheduler)
+):
+    """Stream a query response as Server-Sent Events: intent, message tokens, then the final payload"""
+    logger.info(f"Received streaming query request from user {current_user.email}")
+    # Admit before the response starts so an overloaded server can still answer 503
+    release_slot = await scheduler.acquire(current_user.id)
+
+    async def events():
+        stream = peka_service.stream_query(
+            query_request.query, bypass_cache=query_request.bypass_cache, user_id=current_user.id
+        )
+        try:
+            async for event, data in stream:
+                if await request.is_disconnected():
+                    # Stop generating for a client that has gone away
+                    logger.info("Client disconnected, cancelling Peka stream")
+                    metrics.increment("peka.stream.disconnected")
+                    break
+                if event == "final":
+                    data = await create_todo_from_response(data, current_user)
+                yield _sse(event, data)
+        except asyncio.CancelledError:
+            metrics.increment("peka.stream.disconnected")
+            raise
+        except HTTPException as e:
+            logger.error(f"HTTP error in stream_query: {str(e)}")
+            yield _sse("error", {"status_code": e.status_code, "detail": e.detail})
+        except Exception as e:
+            logger.error(f"Unexpected error in stream_query: {str(e)}")
+            logger.exception("Full traceback:")
+            yield _sse("error", {"status_code": 500, "detail": "Error processing query"})
+        finally:
+            await stream.aclose()
+            release_slot()
+
+    body = events()
+
+    async def finish():
+        # Runs once the response ends, however it ends. Closing the body closes the upstream
+        # LLM stream if the client left mid-stream (events() suspended at a yield), and
+        # releases the slot even if it left before the first chunk, when events() never started
+        try:
+            await body.aclose()
+        finally:
+            release_slot()
+
+    try:
+        return StreamingResponse(
+            body,
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            background=BackgroundTask(finish)
+        )
+    except BaseException:
+        release_slot()
+        raise
+
+@router.delete("/conversation")
+async def clear_conversation(
+    current_user: User = Depends(get_current_user),
+    peka_service: PekaService = Depends(get_peka_service)
+):
+    """Forget the user's earlier queries, so the next one starts a new conversation"""
+    peka_service.memory.clear(current_user.id)
+    return {"message": "Conversation cleared"}
+
+async def create_task_in_background(
+    task_request: CreateTaskRequest,
+    current_user: User,
+    peka_service: PekaService,
+    scheduler: LLMScheduler,
+    job_queue: JobQueue
+) -> Dict:
+    """Insert the todo now and queue its AI enrichment; poll /jobs/{job_id} for the suggestions"""
+    todo_data = TodoCreate(
+        title=task_request.title,
+        description=task_request.description,
+        priority=task_request.priority,
+        estimated_duration=task_request.estimated_duration
+    )
+    logger.debug(f"Creating todo in database: {todo_data}")
+    created_todo = await create_todo(todo_data, current_user.id)
+
+    job_id, message = None, "Task created successfully! Peka is reviewing it and will add suggestions shortly."
+    try:
+        job = job_queue.submit(
+            "enrich_task",
+            current_user.id,
+            lambda: enrich_todo(peka_service, scheduler, created_todo, current_user.id)
+        )
+        job_id = job.id
+    except JobQueueFull:
+        # The todo is saved either way; only the suggestions are skipped
+        logger.warning(f"Enrichment queue full, skipping suggestions for todo {created_todo.id}")
+        message = "Task created successfully!"
+
+    return {
+        "task_id": created_todo.id,
+        "title": created_todo.title,
+        "description": created_todo.description,
+        "priority": created_todo.priority,
+        "estimated_duration": created_todo.estimated_duration,
+        "message": message,
+        "job_id": job_id,
+        "status": "queued" if job_id else None,
+        "possible_duplicates": _duplicates(created_todo)
+    }
+
 @router.post("/create-task", response_model=dict)
 async def create_task(
     request: Request,
     task_request: CreateTaskRequest,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    peka_service: PekaService = Depends(get_peka_service),
+    scheduler: LLMScheduler = Depends(get_llm_scheduler),
+    job_queue: JobQueue = Depends(get_job_queue)
 ):
     """Create a new task with AI assistance"""
     logger.info(f"Received task creation request from user {current_user.email}")
     logger.debug(f"Request body: {task_request}")
     try:
-        cohere_api_key = get_cohere_api_key()
-        logger.debug("Initializing PekaService")
-        peka_service = PekaService(cohere_api_key)
         logger.debug("Processing task creation request")
+        if task_request.background:
+            return await create_task_in_background(task_request, current_user, peka_service, scheduler, job_queue)
+
         
         # Get AI-enhanced task details
-        ai_response = await peka_service.create_task(task_request.model_dump())
+        async with scheduler.slot(current_user.id):
+            ai_response = await peka_service.create_task(task_request.model_dump())
         logger.debug(f"AI response: {ai_response}")
 
         # Create todo in database
@@ -151,11 +354,12 @@ async def create_task(
         )
         
         logger.debug(f"Creating todo in database: {todo_data}")
-        created_todo = create_todo(todo_data, current_user.id)
+        created_todo = await create_todo(todo_data, current_user.id)
         logger.debug(f"Created todo: {created_todo}")
 
         # Update response with actual task ID
         ai_response['task_id'] = created_todo.id
+        ai_response['possible_duplicates'] = _duplicates(created_todo)
         ai_response['message'] = f"Task created successfully! {ai_response['message']}"
         
         return ai_response
@@ -168,4 +372,16 @@ async def create_task(
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error creating task: {str(e)}"
-        ) 
\ No newline at end of file
+        ) 
+
+@router.get("/jobs/{job_id}", response_model=dict)
+async def get_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+    job_queue: JobQueue = Depends(get_job_queue)
+):
+    """Status and, once finished, the result of one of the current user's background jobs"""
+    job = job_queue.get(job_id, user_id=current_user.id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job.to_dict()
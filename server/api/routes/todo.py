@@ -1,7 +1,7 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from typing import List
-from schemas.todo import Todo, TodoCreate
-from services.todo_service import create_todo, get_user_todos, get_todo, update_todo, delete_todo
+from schemas.todo import Todo, TodoCreate, TodoCreated, TodoSearchResult
+from services.todo_service import create_todo, get_user_todos, get_todo, update_todo, delete_todo, search_todos
 from api.dependencies import get_current_user
 from schemas.user import User
 
@@ -9,20 +9,30 @@ router = APIRouter(
     tags=["todo"]
 )
 
-@router.post("/", response_model=Todo)
+@router.post("/", response_model=TodoCreated)
 async def create_todo_item(todo: TodoCreate, current_user: User = Depends(get_current_user)):
     """Create a new todo item"""
-    return create_todo(todo, current_user.id)
+    return await create_todo(todo, current_user.id)
 
 @router.get("/", response_model=List[Todo])
 async def read_todos(current_user: User = Depends(get_current_user)):
     """Get all todos for the current user"""
-    return get_user_todos(current_user.id)
+    return await get_user_todos(current_user.id)
+
+# Declared before /{todo_id} so "search" is not parsed as an id
+@router.get("/search", response_model=List[TodoSearchResult])
+async def search_todo_items(
+    q: str = Query(..., min_length=1, max_length=500),
+    limit: int = Query(10, ge=1, le=50),
+    current_user: User = Depends(get_current_user)
+):
+    """Search the current user's todos by meaning rather than exact words"""
+    return await search_todos(current_user.id, q, limit)
 
 @router.get("/{todo_id}", response_model=Todo)
 async def read_todo(todo_id: int, current_user: User = Depends(get_current_user)):
     """Get a specific todo by ID"""
-    todo = get_todo(todo_id, current_user.id)
+    todo = await get_todo(todo_id, current_user.id)
     if not todo:
         raise HTTPException(status_code=404, detail="Todo not found")
     return todo
@@ -30,7 +40,7 @@ async def read_todo(todo_id: int, current_user: User = Depends(get_current_user)
 @router.put("/{todo_id}", response_model=Todo)
 async def update_todo_item(todo_id: int, todo: TodoCreate, current_user: User = Depends(get_current_user)):
     """Update a todo item"""
-    updated_todo = update_todo(todo_id, todo, current_user.id)
+    updated_todo = await update_todo(todo_id, todo, current_user.id)
     if not updated_todo:
         raise HTTPException(status_code=404, detail="Todo not found")
     return updated_todo
@@ -38,6 +48,6 @@ async def update_todo_item(todo_id: int, todo: TodoCreate, current_user: User =
 @router.delete("/{todo_id}")
 async def delete_todo_item(todo_id: int, current_user: User = Depends(get_current_user)):
     """Delete a todo item"""
-    if not delete_todo(todo_id, current_user.id):
+    if not await delete_todo(todo_id, current_user.id):
         raise HTTPException(status_code=404, detail="Todo not found")
     return {"message": "Todo deleted successfully"} 
\ No newline at end of file
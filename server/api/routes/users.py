@@ -2,12 +2,12 @@ from typing import Annotated
 from fastapi import APIRouter, Depends, HTTPException, Security
 from schemas.user import User
 from repositories.user_repo import user_exists
-from api.dependencies import get_current_active_user
-from db.supabase import create_supabase_client
-from core.security import get_password_hash
+from postgrest import AsyncPostgrestClient
+from api.dependencies import get_async_db, get_current_active_user
+from core.security import get_password_hash_async
+from services.user_cache import user_cache
 
 router = APIRouter()
-supabase = create_supabase_client()
 
 @router.get("/me/", response_model=User)
 async def read_users_me(
@@ -22,7 +22,7 @@ async def read_own_items(
     return [{"item_id": "Foo", "owner": current_user.username}]
 
 @router.post("/")
-async def create_user(user: User):
+async def create_user(user: User, db: Annotated[AsyncPostgrestClient, Depends(get_async_db)]):
     try:
         print("Starting user creation process...")
         print(f"Received user data: {user.dict(exclude={'password'})}")
@@ -33,7 +33,7 @@ async def create_user(user: User):
 
         # Check if user already exists
         print("Checking if user exists...")
-        if user_exists(value=user_email):
+        if await user_exists(value=user_email):
             print(f"User with email {user_email} already exists")
             raise HTTPException(
                 status_code=400,
@@ -43,10 +43,10 @@ async def create_user(user: User):
         print("User does not exist, proceeding with creation")
         
         # Hash the password
-        hashed_password = get_password_hash(user.password)
+        hashed_password = await get_password_hash_async(user.password)
         
         # Create user in database with only the required fields
-        result = supabase.from_("users").insert({
+        result = await db.from_("users").insert({
             "email": user_email,
             "name": user.name,
             "password": hashed_password
@@ -57,6 +57,9 @@ async def create_user(user: User):
                 status_code=500,
                 detail="Failed to create user account"
             )
+        # Drop the negative entry left by any request made with this email before it existed
+        user_cache.invalidate(user_email)
+        user_cache.invalidate(user.email)
             
         print("User created successfully")
         return {"message": "User created successfully"}
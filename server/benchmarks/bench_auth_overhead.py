@@ -0,0 +1,99 @@
+"""Per-request cost of ``get_current_user`` with and without its caches.
+
+Calls the dependency directly with real signed tokens for ``--users`` users.
+The ``users`` table is a stand-in that takes ``--db-ms`` per query, which is
+roughly a Supabase round-trip. Three cases run: both caches on; the user cache
+only (every token is decoded and verified again); and neither (one query per
+request, the old behaviour). A case runs without a cache by clearing that cache
+before every request. The report shows dependency latency, database queries per
+request and the user cache hit rate. Run ``--db-ms 0`` to isolate the CPU cost
+of token verification.
+"""
+import argparse
+import asyncio
+import logging
+import random
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+
+from benchmarks.common import print_summary
+
+from fastapi.security import SecurityScopes
+
+import api.dependencies as dependencies
+from core.security import create_access_token
+from services.token_cache import token_cache
+from services.user_cache import user_cache
+
+
+class UsersTable:
+    """Answers select("*").eq("email", ...).execute() after a fixed delay."""
+
+    def __init__(self, db_seconds: float):
+        self.db_seconds = db_seconds
+        self.queries = 0
+
+    def from_(self, table):
+        return self
+
+    def select(self, columns):
+        return self
+
+    def eq(self, column, email):
+        self._email = email
+        return self
+
+    async def execute(self):
+        self.queries += 1
+        await asyncio.sleep(self.db_seconds)
+        user_id = int(self._email.split("@")[0][len("user"):])
+        return SimpleNamespace(data=[{"id": user_id, "name": f"User {user_id}", "email": self._email,
+                                      "password": None, "created_at": None}])
+
+
+async def run(args) -> None:
+    table = UsersTable(args.db_ms / 1000)
+    tokens = [
+        create_access_token({"sub": f"user{i}@example.com", "scopes": ["me"]}, timedelta(minutes=30))
+        for i in range(1, args.users + 1)
+    ]
+    scopes = SecurityScopes(scopes=["me"])
+    rng = random.Random(args.seed)
+
+    cases = (("both caches", True, True), ("user cache only", True, False), ("no cache", False, False))
+    for label, users_cached, tokens_cached in cases:
+        user_cache.clear()
+        token_cache.clear()
+        table.queries = 0
+        before = user_cache.stats()
+        latencies = []
+        for _ in range(args.requests):
+            if not users_cached:
+                user_cache.clear()
+            if not tokens_cached:
+                token_cache.clear()
+            token = rng.choice(tokens)
+            start = time.perf_counter()
+            await dependencies.get_current_user(scopes, token, table)
+            latencies.append(time.perf_counter() - start)
+        stats = user_cache.stats()
+        hits, misses = stats["hits"] - before["hits"], stats["misses"] - before["misses"]
+        print_summary(label, latencies)
+        print(f"    db queries/request={table.queries / args.requests:.3f}  "
+              f"hit rate={hits / max(1, hits + misses):.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--db-ms", type=float, default=15.0, help="simulated users query round-trip")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
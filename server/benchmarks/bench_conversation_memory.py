@@ -0,0 +1,57 @@
+"""Prompt growth over a long conversation: resending full history vs. ConversationMemory.
+
+Plays ``--turns`` query/answer exchanges and reports the estimated tokens of the
+conversation context that would be sent with the next query - the whole
+transcript versus the memory's budgeted recent turns plus running summary. The
+summary here is the local extractive fallback, so no LLM is needed; with the LLM
+summary the context is bounded the same way.
+"""
+import argparse
+import time
+
+from benchmarks.common import print_summary
+
+from services.conversation_memory import ConversationMemory, extractive_summary
+from services.prompt_builder import estimate_tokens
+
+QUERIES = [
+    "I need to prepare for my exam on Friday, can you help me plan?",
+    "Make that a task for tomorrow morning, about two hours",
+    "What should I focus on first in chapter three?",
+    "How do I stop checking my phone while studying?",
+    "Add a reminder to call the library about the reserved book",
+]
+ANSWER = (
+    "Start with the topics you find hardest while you are fresh, then review the rest in short blocks. "
+    "Take a five minute break every half hour and keep your phone in another room. "
+    "- Outline chapter three\n- Do two practice problems\n- Review your notes before bed"
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--turn-tokens", type=int, default=400)
+    parser.add_argument("--summary-tokens", type=int, default=150)
+    args = parser.parse_args()
+
+    memory = ConversationMemory(10, 3600, args.turn_tokens, args.summary_tokens)
+    transcript, samples = [], []
+    print(f"{'turn':>5}{'full history':>15}{'memory':>10}")
+    for turn in range(1, args.turns + 1):
+        query = f"{QUERIES[turn % len(QUERIES)]} ({turn})"
+        transcript.append(f"User: {query}\nPeka: {ANSWER}")
+        start = time.perf_counter()
+        conversation = memory.record(1, query, ANSWER)
+        if conversation.overflow:
+            turns, conversation.overflow = conversation.overflow, []
+            conversation.summary = extractive_summary(conversation.summary, turns, args.summary_tokens)
+        samples.append(time.perf_counter() - start)
+        if turn % 5 == 0 or turn == 1:
+            full = estimate_tokens("\n".join(transcript))
+            print(f"{turn:>5}{full:>15}{estimate_tokens(memory.context(1)):>10}")
+    print_summary("record + local summary", samples)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Requests per second one worker serves when every request makes a database call.
+
+Drives ``GET /api/todo/`` on the real FastAPI app in-process (httpx ASGI
+transport) with ``--concurrency`` requests in flight. Authentication is
+overridden, so each request makes exactly one PostgREST query. The queries go
+over real HTTP to a local stand-in for Supabase (a threaded HTTP server at
+SUPABASE_URL) that answers after ``--db-ms``.
+
+Two modes are compared. "async" uses the async repository. "blocking" uses the
+sync supabase client on the event loop, as the routes did before the async
+repository, so a worker serves one query at a time.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from benchmarks.common import print_summary
+import httpx
+
+from api.dependencies import get_current_user
+from db.supabase import close_async_postgrest_client, close_supabase_client, get_supabase_client
+from main import app
+from schemas.todo import Todo
+from schemas.user import User
+import services.todo_service as todo_service
+
+TODOS = [
+    {"id": i, "user_id": 1, "title": f"Task {i}", "description": "", "priority": "low",
+     "estimated_duration": 30, "created_at": "2024-01-01T00:00:00+00:00"}
+    for i in range(1, 21)
+]
+
+
+def start_postgrest_stub(db_seconds: float) -> ThreadingHTTPServer:
+    body = json.dumps(TODOS).encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, so the client's pool is exercised
+
+        def do_GET(self):
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            time.sleep(db_seconds)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    address = urlparse(os.environ["SUPABASE_URL"])
+    server = ThreadingHTTPServer((address.hostname, address.port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def blocking_get_user_todos():
+    async def get_user_todos(user_id: int):
+        result = get_supabase_client().from_("todo").select("*").eq("user_id", user_id).execute()
+        return [Todo(**todo) for todo in result.data]
+    return get_user_todos
+
+
+async def run_mode(mode: str, args) -> None:
+    original = todo_service.repo_get_user_todos
+    if mode == "blocking":
+        todo_service.repo_get_user_todos = blocking_get_user_todos()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            async def one():
+                async with semaphore:
+                    start = time.perf_counter()
+                    response = await client.get("/api/todo/")
+                    response.raise_for_status()
+                    latencies.append(time.perf_counter() - start)
+
+            with contextlib.redirect_stdout(io.StringIO()):  # the repositories print every response
+                await one()  # open a pooled connection before timing
+                latencies.clear()
+                start = time.perf_counter()
+                await asyncio.gather(*(one() for _ in range(args.requests)))
+                elapsed = time.perf_counter() - start
+    finally:
+        todo_service.repo_get_user_todos = original
+        await close_async_postgrest_client()
+        close_supabase_client()
+    print_summary(f"GET /api/todo/ ({mode})", latencies)
+    print(f"    throughput={args.requests / elapsed:.1f} req/s at concurrency {args.concurrency}")
+
+
+async def run(args) -> None:
+    app.dependency_overrides[get_current_user] = lambda: User(id=1, name="bench", email="bench@example.com")
+    for mode in args.modes:
+        await run_mode(mode, args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--db-ms", type=float, default=20.0, help="simulated PostgREST response time")
+    parser.add_argument("--modes", nargs="+", choices=["blocking", "async"], default=["blocking", "async"])
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    server = start_postgrest_stub(args.db_ms / 1000)
+    try:
+        asyncio.run(run(args))
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Todo endpoint latency while Peka LLM calls are in flight.
+
+Drives the real FastAPI app in-process (httpx ASGI transport) with the Cohere
+clients replaced by fakes that take ``--llm-ms`` per call. It measures
+``GET /api/todo/`` latency on an idle worker, then again while ``--inflight``
+``/api/peka/query`` requests are running. With the async service the two should
+match; ``--blocking`` reproduces the old behaviour (sync calls on the event loop)
+for comparison. tests/test_event_loop_concurrency.py asserts the async case.
+"""
+import argparse
+import asyncio
+import logging
+import time
+from types import SimpleNamespace
+
+from benchmarks.common import print_summary
+import httpx
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+import services.llm_backends as llm_backends
+from api.dependencies import get_current_user
+from api.routes import todo as todo_routes
+from main import app
+from schemas.user import User
+from services.llm_scheduler import LLMScheduler
+from services.peka_service import PekaService
+
+GENERAL_JSON = '{"response": "Take a break.", "action_items": ["Breathe"], "timestamp": "2024-01-01T00:00:00"}'
+
+
+def build_fakes(llm_seconds: float, blocking: bool):
+    class FakeAsyncClient:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        async def generate(self, **kwargs):
+            if blocking:
+                time.sleep(llm_seconds)
+            else:
+                await asyncio.sleep(llm_seconds)
+            return SimpleNamespace(generations=[SimpleNamespace(text="general")])
+
+        async def close(self):
+            pass
+
+    def fake_chat(_prompt_value):
+        time.sleep(llm_seconds)
+        return AIMessage(content=GENERAL_JSON)
+
+    llm_backends.cohere.AsyncClient = FakeAsyncClient
+    llm_backends.ChatCohere = lambda *args, **kwargs: RunnableLambda(fake_chat)
+
+
+async def sample_todo_latency(client: httpx.AsyncClient, samples: int):
+    latencies = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        response = await client.get("/api/todo/")
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.01)
+    return latencies
+
+
+async def run(args):
+    build_fakes(args.llm_ms / 1000, args.blocking)
+    service = PekaService("bench-key")
+    if args.blocking:
+        async def invoke_on_loop(name, chain, chain_input):
+            return chain.invoke(chain_input)
+        service._invoke_chain = invoke_on_loop
+    app.state.peka_service = service
+    # ASGITransport does not run the lifespan; admit every request so only the event loop is measured
+    app.state.llm_scheduler = LLMScheduler(max_concurrency=10_000, max_queue_depth=10_000, max_batch_concurrency=1)
+    app.dependency_overrides[get_current_user] = lambda: User(id=1, name="bench", email="bench@example.com")
+    async def no_todos(user_id):
+        return []
+    todo_routes.get_user_todos = no_todos
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        idle = await sample_todo_latency(client, args.samples)
+
+        inflight = [
+            # Distinct queries so neither the response cache nor coalescing hides the LLM latency
+            asyncio.create_task(client.post("/api/peka/query", json={"query": f"how do I stop procrastinating {i}"}))
+            for i in range(args.inflight)
+        ]
+        await asyncio.sleep(0)
+        busy = await sample_todo_latency(client, args.samples)
+        await asyncio.gather(*inflight)
+
+    await service.close()
+    mode = "blocking" if args.blocking else "async"
+    print_summary(f"todo idle ({mode})", idle)
+    print_summary(f"todo with {args.inflight} LLM calls ({mode})", busy)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--llm-ms", type=float, default=2000.0)
+    parser.add_argument("--inflight", type=int, default=8)
+    parser.add_argument("--samples", type=int, default=50)
+    parser.add_argument("--blocking", action="store_true", help="run LLM calls on the event loop (old behaviour)")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Local intent classifier versus the Cohere intent call on the labelled eval set.
+
+Reports accuracy, how many Cohere calls the fast path saves, and latency. Offline,
+the LLM side is modelled with ``--llm-ms`` per call and assumed correct; with
+``--live`` (COHERE_API_KEY set) every eval query is also sent through the old
+LLM intent call and its real accuracy and latency are used instead.
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from benchmarks.common import print_summary
+from core.config import PEKA_INTENT_CONFIDENCE
+from services.intent_classifier import IntentClassifier, load_examples
+
+EVAL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "intent_eval.jsonl")
+
+
+async def llm_intents(queries):
+    from services.peka_service import PekaService
+
+    service = PekaService(os.environ["COHERE_API_KEY"])
+    intents, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        intents.append(await service._detect_query_intent_llm(query))
+        latencies.append(time.perf_counter() - start)
+    await service.close()
+    return intents, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threshold", type=float, default=PEKA_INTENT_CONFIDENCE)
+    parser.add_argument("--llm-ms", type=float, default=600.0, help="modelled Cohere intent call latency")
+    parser.add_argument("--live", action="store_true")
+    args = parser.parse_args()
+
+    examples = load_examples(EVAL_PATH)
+    labels = [e["intent"] for e in examples]
+    classifier = IntentClassifier.load()
+
+    predictions, local_latencies = [], []
+    for _ in range(50):
+        for example in examples:
+            start = time.perf_counter()
+            classifier.predict(example["query"])
+            local_latencies.append(time.perf_counter() - start)
+    predictions = [classifier.predict(e["query"]) for e in examples]
+
+    if args.live:
+        llm_labels, llm_latencies = asyncio.run(llm_intents([e["query"] for e in examples]))
+    else:
+        llm_labels, llm_latencies = labels, [args.llm_ms / 1000] * len(examples)
+
+    confident = [p.confidence >= args.threshold for p in predictions]
+    hybrid = [p.intent if ok else llm for p, ok, llm in zip(predictions, confident, llm_labels)]
+    hybrid_latencies = [
+        local + (0 if ok else llm)
+        for local, ok, llm in zip(local_latencies[:len(examples)], confident, llm_latencies)
+    ]
+
+    def accuracy(predicted):
+        return sum(p == l for p, l in zip(predicted, labels)) / len(labels)
+
+    n = len(examples)
+    # Old path: one intent call for every query, plus the unified few-shot call for create/analyze
+    old_calls = n + sum(label != "general" for label in labels)
+    new_calls = (n - sum(confident)) + sum(intent == "create" for intent in hybrid)
+    print(f"eval queries: {n}, threshold: {args.threshold}")
+    print(f"local-only accuracy:      {accuracy([p.intent for p in predictions]):.3f}")
+    print(f"fast-path coverage:       {sum(confident) / n:.3f}")
+    fast_hits = sum(p.intent == label for p, ok, label in zip(predictions, confident, labels) if ok)
+    print(f"fast-path accuracy:       {fast_hits / max(1, sum(confident)):.3f}")
+    print(f"LLM-only accuracy:        {accuracy(llm_labels):.3f}{'' if args.live else ' (assumed)'}")
+    print(f"hybrid accuracy:          {accuracy(hybrid):.3f}")
+    print(f"LLM calls (intent+unified): old={old_calls} new={new_calls} saved={old_calls - new_calls}")
+    print_summary("local classifier", local_latencies)
+    print_summary("LLM intent call", llm_latencies)
+    print_summary("hybrid intent", hybrid_latencies)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Fairness check for the LLM scheduler under one noisy user.
+
+One user floods the interactive lane with ``--flood`` requests while several
+light users each send a handful; a batch job runs alongside. With weighted
+fair queuing the light users' waits should stay close to a single service
+time instead of queueing behind the flood. Also reports 503 rejections once
+the queue limit is reached.
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import print_summary
+from fastapi import HTTPException
+
+from core.metrics import metrics
+from services.llm_scheduler import LLMScheduler
+
+
+async def request(scheduler: LLMScheduler, user_id: str, lane: str, service_seconds: float, waits: dict, rejected: dict):
+    start = time.perf_counter()
+    try:
+        async with scheduler.slot(user_id, lane=lane):
+            waits.setdefault(user_id, []).append(time.perf_counter() - start)
+            await asyncio.sleep(service_seconds)
+    except HTTPException:
+        rejected[user_id] = rejected.get(user_id, 0) + 1
+
+
+async def run(args) -> None:
+    scheduler = LLMScheduler(args.concurrency, args.queue_depth, args.batch_concurrency)
+    service = args.service_ms / 1000
+    waits, rejected = {}, {}
+    calls = [request(scheduler, "noisy", "interactive", service, waits, rejected) for _ in range(args.flood)]
+    calls += [request(scheduler, "batch", "batch", service, waits, rejected) for _ in range(args.flood // 4)]
+    flood = [asyncio.create_task(c) for c in calls]
+    # Let the flood fill the queue before the light users arrive
+    await asyncio.sleep(0)
+    light = [
+        request(scheduler, f"user-{u}", "interactive", service, waits, rejected)
+        for _ in range(args.per_user) for u in range(args.users)
+    ]
+    await asyncio.gather(*flood, *light)
+
+    print_summary("noisy user wait", waits.get("noisy", []))
+    print_summary("batch wait", waits.get("batch", []))
+    print_summary("light users wait", [w for u, ws in waits.items() if u.startswith("user-") for w in ws])
+    print(f"rejected (503): {rejected}")
+    snapshot = metrics.snapshot()
+    print({k: v for k, v in snapshot["counters"].items() if k.startswith("peka.scheduler")})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--batch-concurrency", type=int, default=1)
+    parser.add_argument("--queue-depth", type=int, default=64)
+    parser.add_argument("--flood", type=int, default=40)
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--per-user", type=int, default=2)
+    parser.add_argument("--service-ms", type=float, default=50.0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
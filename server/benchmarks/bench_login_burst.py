@@ -0,0 +1,106 @@
+"""Latency of other endpoints while a burst of logins is being verified.
+
+Drives the real FastAPI app in-process (httpx ASGI transport). ``--logins``
+concurrent ``POST /api/auth/token`` requests each verify a real bcrypt hash of
+cost BCRYPT_ROUNDS. Until they all finish, ``GET /metrics`` is sampled as a
+stand-in for any cheap endpoint. The users table is a stand-in that answers instantly,
+so only password work is measured. ``--blocking`` verifies on the event loop,
+which was the old behaviour, for comparison.
+"""
+import argparse
+import asyncio
+import logging
+import time
+from types import SimpleNamespace
+
+from benchmarks.common import print_summary
+import httpx
+
+import services.auth_service as auth_service
+from api.dependencies import get_async_db
+from core.security import get_password_hash, pwd_context
+from main import app
+
+PASSWORD = "correct horse battery staple"
+
+
+class UsersTable:
+    def __init__(self, hashed_password: str):
+        self.row = {"id": 1, "name": "Bench", "email": "bench@example.com",
+                    "password": hashed_password, "created_at": None}
+
+    def from_(self, table):
+        return self
+
+    def select(self, columns):
+        return self
+
+    def eq(self, column, value):
+        return self
+
+    async def execute(self):
+        return SimpleNamespace(data=[dict(self.row)])
+
+
+async def sample_latency(client: httpx.AsyncClient, samples: int, until: asyncio.Future = None):
+    """Time GET /metrics samples times, or until the future is done if one is given.
+
+    Each sample also counts any overshoot of the pause after it, so a stall of the event
+    loop between requests is measured too, not only one during a request.
+    """
+    latencies = []
+    while (until is None and len(latencies) < samples) or (until is not None and not until.done()):
+        start = time.perf_counter()
+        response = await client.get("/metrics")
+        response.raise_for_status()
+        await asyncio.sleep(0.005)
+        latencies.append(time.perf_counter() - start - 0.005)
+    return latencies
+
+
+async def run(args):
+    users = UsersTable(get_password_hash(PASSWORD))
+    app.dependency_overrides[get_async_db] = lambda: users
+    if args.blocking:
+        async def verify_on_loop(plain_password, hashed_password):
+            return pwd_context.verify_and_update(plain_password, hashed_password)
+        auth_service.verify_and_update_password = verify_on_loop
+
+    form = {"username": "bench@example.com", "password": PASSWORD}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        idle = await sample_latency(client, args.samples)
+
+        login_latencies = []
+
+        async def login():
+            start = time.perf_counter()
+            response = await client.post("/api/auth/token", data=form)
+            response.raise_for_status()
+            login_latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        burst = asyncio.gather(*(login() for _ in range(args.logins)))
+        busy = await sample_latency(client, args.samples, until=burst)
+        await burst
+        elapsed = time.perf_counter() - start
+
+    mode = "blocking" if args.blocking else "pooled"
+    print_summary(f"/metrics idle ({mode})", idle)
+    print_summary(f"/metrics during {args.logins} logins", busy)
+    print_summary(f"login ({mode})", login_latencies)
+    print(f"    logins/s={args.logins / elapsed:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logins", type=int, default=32)
+    parser.add_argument("--samples", type=int, default=50)
+    parser.add_argument("--blocking", action="store_true", help="verify passwords on the event loop (old behaviour)")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""Offline load test of PekaService's main code paths.
+
+Drives ``handle_query`` (a mix of create, general and analyze queries),
+``analyze_tasks`` and ``create_task`` with ``--concurrency`` requests in flight
+against an LLM backend from services.llm_backends, and reports per path:
+throughput, errors, latency percentiles and estimated prompt tokens per request
+by prompt type (from the ``peka.prompt.*`` counters).
+
+The default synthetic backend needs no network or API key, so the suite runs in
+CI; ``--seed`` makes its latencies and failures reproducible. ``--backend
+cassette`` replays a recorded cassette instead; the default one,
+benchmarks/data/peka_cassette.jsonl, was recorded from the synthetic backend with
+the default arguments. ``--record PATH`` records whichever backend runs (e.g.
+``--backend cohere`` with COHERE_API_KEY set) so later runs can replay it. Task
+lists are generated from the seed with whole-day ages, so prompts - and cassette
+keys - stay the same between runs.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+from benchmarks.common import print_summary
+
+from core.metrics import metrics
+from schemas.peka import Task
+from services.llm_backends import CassetteBackend, CohereBackend, SyntheticBackend
+from services.peka_service import PekaService
+
+QUERIES = [
+    "Create a task to finish the budget report, about 90 minutes",
+    "How do I stop procrastinating on big projects?",
+    "How am I doing on my tasks?",
+    "Add a reminder to call the dentist tomorrow",
+    "Any tips for staying focused in the afternoon?",
+    "What should I do first today? Please prioritize my list",
+]
+TITLES = ["Write report", "Call dentist", "Plan sprint", "Review PR", "Pay rent", "Gym", "Read chapter 3", "Email Sam"]
+
+
+def make_user_tasks(users: int, per_user: int, seed: int) -> Dict[int, List[Task]]:
+    rng = random.Random(seed)
+    # Midnight-anchored ages, so the 'age' in analysis prompts does not drift during a day
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    return {
+        user_id: [
+            Task(
+                id=user_id * 1000 + i,
+                user_id=user_id,
+                title=f"{rng.choice(TITLES)} {i}",
+                description=rng.choice(["", "Needs input from the team before Friday."]),
+                priority=rng.choice(["low", "medium", "high"]),
+                estimated_duration=rng.choice([15, 30, 60, 120]),
+                created_at=today - timedelta(days=rng.randint(0, 30)),
+                progress=rng.choice(["not_started", "in_progress"]),
+            )
+            for i in range(per_user)
+        ]
+        for user_id in range(1, users + 1)
+    }
+
+
+def build_backend(args):
+    if args.backend == "cassette":
+        backend = CassetteBackend(args.cassette, latency_scale=args.latency_scale)
+    elif args.backend == "cohere":
+        backend = CohereBackend(os.environ["COHERE_API_KEY"])
+    else:
+        backend = SyntheticBackend(latency_ms=args.latency_ms, failure_rate=args.failure_rate, seed=args.seed)
+    if args.record:
+        backend = CassetteBackend(args.record, inner=backend)
+    return backend
+
+
+def prompt_counters() -> Dict[str, float]:
+    return {k: v for k, v in metrics.snapshot()["counters"].items() if k.startswith("peka.prompt.")}
+
+
+async def run_path(name: str, requests: int, concurrency: int, make_call) -> None:
+    before = prompt_counters()
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], {}
+
+    async def one(i: int) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await make_call(i)
+            except Exception as e:
+                key = f"{type(e).__name__} {getattr(e, 'status_code', '')}".strip()
+                errors[key] = errors.get(key, 0) + 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+
+    after = prompt_counters()
+    tokens = {
+        key[len("peka.prompt."):-len(".tokens")]: (after[key] - before.get(key, 0)) / requests
+        for key in after
+        if key.endswith(".tokens") and after[key] != before.get(key, 0)
+    }
+    print_summary(name, latencies)
+    print(f"    throughput={requests / elapsed:.1f} req/s  errors={errors or 0}")
+    print(f"    prompt tokens/request: total={sum(tokens.values()):.0f} "
+          + " ".join(f"{prompt}={value:.0f}" for prompt, value in sorted(tokens.items())))
+
+
+async def run(args) -> None:
+    service = PekaService(None, backend=build_backend(args))
+    user_tasks = make_user_tasks(args.users, args.tasks, args.seed)
+
+    async def get_user_tasks(user_id: int) -> List[Task]:
+        return user_tasks[user_id]
+
+    async def no_stored_analysis(*args):
+        return None
+
+    # The benchmark owns the data; nothing touches Supabase
+    service.get_user_tasks = get_user_tasks
+    service._stored_analysis = no_stored_analysis
+
+    def user_of(i: int) -> int:
+        return i % args.users + 1
+
+    paths = {
+        "handle_query": lambda i: service.handle_query(
+            QUERIES[i % len(QUERIES)], bypass_cache=not args.cache, user_id=user_of(i)
+        ),
+        "analyze_tasks": lambda i: service.analyze_tasks(
+            user_tasks[user_of(i)], mode=args.mode, user_id=user_of(i) if args.cache else None, use_stored=False
+        ),
+        "create_task": lambda i: service.create_task({
+            "title": f"{TITLES[i % len(TITLES)]} {i % 50}",
+            "description": "",
+            "priority": "medium",
+            "estimated_duration": 30,
+        }),
+    }
+    try:
+        for name in args.paths:
+            await run_path(name, args.requests, args.concurrency, paths[name])
+    finally:
+        await service.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--backend", choices=["synthetic", "cassette", "cohere"], default="synthetic")
+    parser.add_argument("--cassette", default="benchmarks/data/peka_cassette.jsonl")
+    parser.add_argument("--record", help="record every response to this cassette")
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="synthetic median latency")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="cassette: multiply recorded latency")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--tasks", type=int, default=20, help="open tasks per user")
+    parser.add_argument("--mode", choices=["local", "hybrid", "llm"], default="hybrid")
+    parser.add_argument("--cache", action="store_true", help="let response and analysis caches serve repeats")
+    parser.add_argument("--paths", nargs="+", choices=["handle_query", "analyze_tasks", "create_task"],
+                        default=["handle_query", "analyze_tasks", "create_task"])
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    random.seed(args.seed)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Per-request overhead of building a PekaService versus reusing the lifespan one.
+
+The old routes built ``PekaService(key)`` per request, which created fresh Cohere
+clients and ran a ``generate("Test connection")`` probe before any work. This
+benchmark measures that setup cost (construction + probe) per request; the shared
+instance pays nothing, so the numbers are the latency saved per request.
+
+By default the Cohere clients are replaced with fakes whose probe latency is drawn
+from a log-normal distribution (``--probe-ms`` median). Pass ``--live`` with
+COHERE_API_KEY set to measure against the real API.
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from types import SimpleNamespace
+
+from benchmarks.common import print_summary
+import services.llm_backends as llm_backends
+from services.peka_service import PekaService
+
+
+class _FakeClient:
+    def __init__(self, *args, probe_ms: float = 0.0, **kwargs):
+        self.probe_ms = probe_ms
+
+    async def generate(self, **kwargs):
+        await asyncio.sleep(random.lognormvariate(0, 0.5) * self.probe_ms / 1000)
+        # Shaped like a Cohere generate response, so the connection probe succeeds
+        return SimpleNamespace(generations=[SimpleNamespace(text="ok")])
+
+    async def close(self):
+        pass
+
+
+class _FakeChat:
+    def __init__(self, *args, **kwargs):
+        pass
+
+
+async def run(args, api_key):
+    per_request, shared = [], []
+    service = PekaService(api_key)
+    for _ in range(args.requests):
+        start = time.perf_counter()
+        fresh = PekaService(api_key)
+        await fresh.check_connection()
+        per_request.append(time.perf_counter() - start)
+        await fresh.close()
+
+        start = time.perf_counter()
+        _ = service  # lifespan instance: nothing to do per request
+        shared.append(time.perf_counter() - start)
+    await service.close()
+
+    print_summary("per-request service + probe", per_request)
+    print_summary("lifespan-scoped service", shared)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--probe-ms", type=float, default=250.0, help="median fake probe latency")
+    parser.add_argument("--live", action="store_true", help="use the real Cohere API")
+    args = parser.parse_args()
+
+    api_key = os.getenv("COHERE_API_KEY") if args.live else "bench-key"
+    if args.live and not api_key:
+        parser.error("--live requires COHERE_API_KEY")
+    if not args.live:
+        llm_backends.cohere.AsyncClient = lambda *a, **kw: _FakeClient(probe_ms=args.probe_ms)
+        llm_backends.ChatCohere = _FakeChat
+
+    asyncio.run(run(args, api_key))
+
+
+if __name__ == "__main__":
+    main()
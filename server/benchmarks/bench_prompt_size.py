@@ -0,0 +1,36 @@
+"""Analysis prompt size: full ``model_dump`` JSON versus the compact, budgeted form.
+
+Uses ``estimate_tokens`` from services.prompt_builder for both, over task lists
+with realistic descriptions.
+"""
+import argparse
+import json
+import time
+
+from benchmarks.bench_task_scoring import make_tasks
+from core.config import PEKA_PROMPT_TASK_TOKENS
+from services.prompt_builder import estimate_tokens, serialize_tasks
+
+FILLER = "Follow up with the team about the outstanding items from last week's review and make sure everyone has what they need. "
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 20, 100, 500])
+    parser.add_argument("--budget", type=int, default=PEKA_PROMPT_TASK_TOKENS)
+    args = parser.parse_args()
+
+    print(f"{'tasks':>6} {'full tokens':>12} {'compact tokens':>15} {'kept':>6} {'build ms':>9}")
+    for n in args.sizes:
+        tasks = make_tasks(n)
+        for task in tasks:
+            task.description = FILLER * 3
+        full = json.dumps([task.model_dump() for task in tasks], default=str)
+        start = time.perf_counter()
+        compact, kept = serialize_tasks(tasks, args.budget)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{n:>6} {estimate_tokens(full):>12} {estimate_tokens(compact):>15} {kept:>6} {elapsed:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Degraded-provider check for the upstream resilience layer.
+
+Simulates Cohere failing with 503s (or hanging, with ``--hang``) for a run of
+requests and reports per-request latency with the circuit breaker and request
+deadline in place: after ``--failures`` failed calls the breaker opens and the
+remaining requests fail fast instead of waiting out their full budget. Then the
+provider recovers and a trial call closes the circuit again.
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import print_summary
+
+from core.metrics import metrics
+from services.resilience import CircuitBreaker, UpstreamCaller, UpstreamUnavailable, deadline, expires_in
+
+
+class ProviderError(Exception):
+    def __init__(self, status: int):
+        super().__init__(f"HTTP {status}")
+        self.http_status = status
+
+
+async def run(args) -> None:
+    breaker = CircuitBreaker("bench.breaker", args.failures, args.reset_seconds)
+    caller = UpstreamCaller(breaker, retries=args.retries, backoff_base=0.05)
+    healthy = False
+
+    async def upstream():
+        if healthy:
+            await asyncio.sleep(0.02)
+            return "ok"
+        if args.hang:
+            await asyncio.sleep(3600)
+        raise ProviderError(503)
+
+    latencies, errors = [], {}
+    for _ in range(args.requests):
+        start = time.perf_counter()
+        try:
+            with deadline(expires_in(args.deadline)):
+                await caller.call("bench", upstream)
+        except (UpstreamUnavailable, ProviderError) as e:
+            errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+        latencies.append(time.perf_counter() - start)
+
+    print_summary("degraded requests", latencies)
+    print(f"errors: {errors}  breaker: {breaker.state}")
+
+    healthy = True
+    await asyncio.sleep(args.reset_seconds)
+    await caller.call("bench", upstream)
+    print(f"after recovery breaker: {breaker.state}")
+    print({k: v for k, v in metrics.snapshot()["counters"].items() if k.startswith(("bench.", "peka.upstream.bench"))})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--failures", type=int, default=5)
+    parser.add_argument("--retries", type=int, default=2)
+    parser.add_argument("--deadline", type=float, default=1.0)
+    parser.add_argument("--reset-seconds", type=float, default=0.5)
+    parser.add_argument("--hang", action="store_true", help="Provider hangs instead of returning 503")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
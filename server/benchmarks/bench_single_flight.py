@@ -0,0 +1,85 @@
+"""Coalescing check: N concurrent identical Peka requests make one upstream call.
+
+Fires ``--concurrency`` identical create queries and identical general queries at a
+fake Cohere client that counts requests. Both queries are classified locally, so
+only the unified generate (create) or the chat chain (general) reaches Cohere. Exits non-zero if more
+than one upstream call per request type was made.
+"""
+import argparse
+import asyncio
+import sys
+import time
+from types import SimpleNamespace
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+import services.llm_backends as llm_backends
+from core.metrics import metrics
+from services.peka_service import PekaService
+
+UNIFIED_JSON = (
+    '{"intent": "create", "task_details": {"title": "Call John", "description": "", '
+    '"priority": "medium", "estimated_duration": 30}, "message": "Done.", "action_items": []}'
+)
+GENERAL_JSON = '{"response": "Take a break.", "action_items": [], "timestamp": "2024-01-01T00:00:00"}'
+
+
+def install_fakes(upstream_seconds: float, counts: dict):
+    class FakeAsyncClient:
+        def __init__(self, *a, **kw):
+            pass
+
+        async def generate(self, **kwargs):
+            counts["generate"] += 1
+            await asyncio.sleep(upstream_seconds)
+            return SimpleNamespace(generations=[SimpleNamespace(text=UNIFIED_JSON)])
+
+        async def close(self):
+            pass
+
+    def fake_chat(_prompt_value):
+        counts["chat"] += 1
+        time.sleep(upstream_seconds)
+        return AIMessage(content=GENERAL_JSON)
+
+    llm_backends.cohere.AsyncClient = FakeAsyncClient
+    llm_backends.ChatCohere = lambda *a, **kw: RunnableLambda(fake_chat)
+
+
+async def fire(n: int, call):
+    start = time.perf_counter()
+    results = await asyncio.gather(*(call() for _ in range(n)))
+    return results, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--upstream-ms", type=float, default=300.0)
+    args = parser.parse_args()
+
+    counts = {"generate": 0, "chat": 0}
+    install_fakes(args.upstream_ms / 1000, counts)
+
+    async def run():
+        service = PekaService("bench-key")
+        create, create_time = await fire(args.concurrency, lambda: service.handle_query("add a task to call John"))
+        general, general_time = await fire(
+            args.concurrency, lambda: service.handle_query("how do I stay motivated", bypass_cache=True)
+        )
+        await service.close()
+        return create, create_time, general, general_time
+
+    create, create_time, general, general_time = asyncio.run(run())
+    print(f"create:  {args.concurrency} requests -> {counts['generate']} generate call(s) in {create_time * 1000:.0f}ms")
+    print(f"general: {args.concurrency} requests -> {counts['chat']} chat call(s) in {general_time * 1000:.0f}ms")
+    print(f"coalesced: {metrics.counter('peka.single_flight.coalesced'):.0f}")
+    assert all(r["task_details"]["title"] == "Call John" for r in create)
+    assert len({id(r) for r in create}) == len(create), "callers must not share response objects"
+    if counts["generate"] != 1 or counts["chat"] != 1:
+        sys.exit("expected exactly one upstream call per request type")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Sequential versus speculative intent resolution in PekaService.handle_query.
+
+Every query is forced down the Cohere intent path (local classifier disabled) and
+run once with PEKA_SPECULATIVE off and once on. The fake Cohere client answers the
+intent call in ``--intent-ms`` and the unified call in ``--unified-ms``; the fake
+chat model (general answers) takes ``--general-ms``. Per-stage timings come from
+the same metrics the service records in production.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from types import SimpleNamespace
+
+from benchmarks.common import print_summary
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+import services.llm_backends as llm_backends
+import services.peka_service as peka_module
+from core.metrics import metrics
+from services.peka_service import PekaService
+
+QUERIES = [
+    ("write the quarterly report by friday", "create"),
+    ("what's the best way to beat procrastination", "general"),
+    ("call the vet about max", "create"),
+    ("i need some motivation", "general"),
+]
+
+
+def install_fakes(args):
+    intents = dict(QUERIES)
+
+    def jitter(ms):
+        return random.lognormvariate(0, 0.3) * ms / 1000
+
+    class FakeAsyncClient:
+        def __init__(self, *a, **kw):
+            pass
+
+        async def generate(self, prompt, max_tokens, **kwargs):
+            query = next(q for q in intents if q in prompt)
+            if max_tokens <= 10:
+                await asyncio.sleep(jitter(args.intent_ms))
+                text = intents[query]
+            else:
+                await asyncio.sleep(jitter(args.unified_ms))
+                text = json.dumps({
+                    "intent": intents[query],
+                    "task_details": {"title": query, "description": "", "priority": "medium", "estimated_duration": 30}
+                    if intents[query] == "create" else None,
+                    "message": "ok",
+                    "action_items": [],
+                })
+            return SimpleNamespace(generations=[SimpleNamespace(text=text)])
+
+        async def close(self):
+            pass
+
+    def fake_chat(_prompt_value):
+        time.sleep(jitter(args.general_ms))
+        return AIMessage(content='{"response": "ok", "action_items": [], "timestamp": "2024-01-01T00:00:00"}')
+
+    llm_backends.cohere.AsyncClient = FakeAsyncClient
+    llm_backends.ChatCohere = lambda *a, **kw: RunnableLambda(fake_chat)
+    peka_module.PEKA_INTENT_CONFIDENCE = 1.01  # force the LLM intent path
+
+
+async def run_mode(service, speculative: bool, rounds: int):
+    peka_module.PEKA_SPECULATIVE = speculative
+    totals = {intent: [] for _, intent in QUERIES}
+    for _ in range(rounds):
+        for query, intent in QUERIES:
+            start = time.perf_counter()
+            await service.handle_query(query, bypass_cache=True)
+            totals[intent].append(time.perf_counter() - start)
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rounds", type=int, default=25)
+    parser.add_argument("--intent-ms", type=float, default=500.0)
+    parser.add_argument("--unified-ms", type=float, default=2500.0)
+    parser.add_argument("--general-ms", type=float, default=2000.0)
+    args = parser.parse_args()
+    install_fakes(args)
+
+    async def run():
+        service = PekaService("bench-key")
+        for speculative in (False, True):
+            totals = await run_mode(service, speculative, args.rounds)
+            label = "speculative" if speculative else "sequential"
+            for intent, samples in totals.items():
+                print_summary(f"{label} {intent}", samples)
+        await service.close()
+
+    asyncio.run(run())
+    print(json.dumps({k: v for k, v in metrics.snapshot().items() if k != "gauges"}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
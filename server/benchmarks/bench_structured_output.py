@@ -0,0 +1,89 @@
+"""Parse-success comparison: fence stripping + json.loads vs. services.structured_output.
+
+Runs a set of realistic unified-query outputs - clean, fenced, wrapped in chatter,
+cut off by max_tokens or a stop sequence, with trailing commas - through the old
+cleanup and through parse_structured, and reports how many each turns into a valid
+UnifiedResponse, plus the per-output parse cost.
+"""
+import argparse
+import json
+import time
+from datetime import datetime
+
+from benchmarks.common import print_summary
+
+from schemas.peka import UnifiedResponse
+from services.structured_output import StructuredOutputError, parse_structured, structured_output_stats
+
+CREATE = (
+    '{"intent": "create", "task_details": {"title": "Call John", "description": "Make a phone call to John", '
+    '"priority": "medium", "estimated_duration": 30}, "message": "I\'ve created a task for calling John.", '
+    '"action_items": ["Prepare any topics to discuss", "Find his number"]}'
+)
+GENERAL = (
+    '{"intent": "general", "task_details": null, "message": "Here are some tips to boost your productivity:", '
+    '"action_items": ["Take regular breaks", "Plan tomorrow tonight"]}'
+)
+
+OUTPUTS = {
+    "clean": CREATE,
+    "fenced": f"```json\n{GENERAL}\n```",
+    "chatter": f"Sure! Here is the JSON:\n{CREATE}\nLet me know if you need anything else.",
+    "trailing_comma": GENERAL.replace('"]}', '",]}'),
+    "cut_in_action_items": CREATE[: CREATE.index("Find his")],
+    "cut_in_message": GENERAL[: GENERAL.index("boost")],
+    "cut_after_key": CREATE[: CREATE.index('"action_items"') + len('"action_items":')],
+    "cut_in_task_details": CREATE[: CREATE.index('"priority"')],
+}
+
+
+def defaults(data):
+    task = {"title": "Untitled", "description": "", "priority": "low", "estimated_duration": 30}
+    return {
+        "task_details": task if data.get("intent") == "create" else None,
+        "message": "",
+        "action_items": [],
+        "timestamp": datetime.utcnow().isoformat(),
+    }
+
+
+def legacy_parse(text: str) -> bool:
+    text = text.strip().replace("```json", "").replace("```", "").strip()
+    try:
+        data = json.loads(text)
+        UnifiedResponse.model_validate({**data, "timestamp": datetime.utcnow().isoformat()})
+        return True
+    except Exception:
+        return False
+
+
+def structured_parse(text: str) -> bool:
+    try:
+        parse_structured("bench", text, UnifiedResponse, defaults)
+        return True
+    except StructuredOutputError:
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'output':<22}{'legacy':>8}{'structured':>12}")
+    for name, text in OUTPUTS.items():
+        print(f"{name:<22}{'ok' if legacy_parse(text) else 'FAIL':>8}{'ok' if structured_parse(text) else 'FAIL':>12}")
+
+    for label, fn in (("legacy parse", legacy_parse), ("structured parse", structured_parse)):
+        samples = []
+        for _ in range(args.iterations // len(OUTPUTS)):
+            for text in OUTPUTS.values():
+                start = time.perf_counter()
+                fn(text)
+                samples.append(time.perf_counter() - start)
+        print_summary(label, samples)
+    print(structured_output_stats().get("bench"))
+
+
+if __name__ == "__main__":
+    main()
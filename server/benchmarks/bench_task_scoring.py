@@ -0,0 +1,60 @@
+"""Local task scoring latency across task-list sizes.
+
+Reports feature extraction (pydantic Task -> arrays), the vectorized scoring and
+ranking step alone, and the full ``analyze_locally`` response build.
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.common import print_summary
+from schemas.peka import Task
+from services.task_scoring import analyze_locally, score_features, task_features
+
+import numpy as np
+
+
+def make_tasks(n: int):
+    now = datetime.now(timezone.utc)
+    return [
+        Task(
+            id=i,
+            user_id=1,
+            title=f"Task {i}",
+            description="",
+            priority=random.choice(["low", "medium", "high"]),
+            estimated_duration=random.choice([None, 15, 30, 60, 120]),
+            created_at=now - timedelta(days=random.uniform(0, 60)),
+            progress=random.choice(["not_started", "in_progress", "completed"]),
+        )
+        for i in range(n)
+    ]
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    for n in args.sizes:
+        tasks = make_tasks(n)
+        features = task_features(tasks)
+        repeat = max(10, args.repeat // max(1, n // 1000))
+        print_summary(f"n={n} extract", timed(lambda: task_features(tasks), repeat))
+        print_summary(f"n={n} score+rank", timed(lambda: np.argsort(-score_features(features), kind="stable"), repeat))
+        print_summary(f"n={n} analyze_locally", timed(lambda: analyze_locally(tasks), repeat))
+
+
+if __name__ == "__main__":
+    main()
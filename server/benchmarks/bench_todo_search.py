@@ -0,0 +1,107 @@
+"""Latency of semantic todo search and duplicate detection at 10k todos.
+
+Builds one user's index over ``--todos`` generated todos with the local
+HashingEmbedder (no network), then measures: the initial build, search and
+duplicate-check latency, incremental upsert/remove, and a rebuild after the
+index is dropped, which should embed nothing because every text is cached.
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timezone
+
+from benchmarks.common import print_summary
+
+from core.metrics import metrics
+from schemas.todo import Todo
+from services.todo_index import HashingEmbedder, TodoIndex
+
+VERBS = ["Write", "Review", "Call", "Email", "Plan", "Fix", "Book", "Pay", "Clean", "Prepare", "Update", "Read"]
+OBJECTS = ["quarterly report", "dentist", "landlord", "sprint board", "login bug", "flights to Lisbon", "rent",
+           "garage", "slides for Monday", "resume", "team wiki", "chapter 3", "insurance claim", "budget sheet"]
+DETAILS = ["", "before Friday", "with the design team", "needs numbers from finance", "follow up if no answer",
+           "keep it under an hour", "ask Sam first"]
+QUERIES = ["money owed for the apartment", "bug that breaks signing in", "presentation for next week",
+           "doctor appointment", "travel to Portugal", "tidy up the house"]
+
+USER_ID = 1
+
+
+def make_todos(count: int, seed: int):
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    return [
+        Todo(
+            id=i,
+            user_id=USER_ID,
+            title=f"{rng.choice(VERBS)} {rng.choice(OBJECTS)} #{i}",
+            description=rng.choice(DETAILS),
+            created_at=now,
+        )
+        for i in range(1, count + 1)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--todos", type=int, default=10_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    todos = make_todos(args.todos, args.seed)
+    index = TodoIndex(HashingEmbedder(args.dim), max_users=10, ttl=3600, cache_entries=args.todos * 2)
+
+    def loader(user_id):
+        return todos
+
+    start = time.perf_counter()
+    index.load(USER_ID, loader)
+    print(f"build ({args.todos} todos, dim={args.dim}): {(time.perf_counter() - start) * 1000:.1f}ms")
+
+    rng = random.Random(args.seed)
+    search, embed_only, duplicate = [], [], []
+    for i in range(args.queries):
+        query = QUERIES[i % len(QUERIES)]
+        start = time.perf_counter()
+        index.search(USER_ID, query, loader, limit=10)
+        search.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        index.embedder.embed_query(query)
+        embed_only.append(time.perf_counter() - start)
+
+        sample = rng.choice(todos)
+        start = time.perf_counter()
+        index.similar(USER_ID, sample.title, sample.description, loader, threshold=0.85)
+        duplicate.append(time.perf_counter() - start)
+    print_summary("search top-10 (incl. embed)", search)
+    print_summary("  of which query embedding", embed_only)
+    print_summary("duplicate check (cached text)", duplicate)
+
+    upserts, removes = [], []
+    for i in range(args.queries):
+        todo = Todo(id=args.todos + i + 1, user_id=USER_ID, title=f"New task {i} {rng.choice(OBJECTS)}",
+                    description="", created_at=datetime.now(timezone.utc))
+        start = time.perf_counter()
+        index.upsert(todo)
+        upserts.append(time.perf_counter() - start)
+    for i in range(args.queries):
+        start = time.perf_counter()
+        index.remove(USER_ID, args.todos + i + 1)
+        removes.append(time.perf_counter() - start)
+    print_summary("incremental upsert", upserts)
+    print_summary("incremental remove", removes)
+
+    embedded_before = metrics.snapshot()["counters"].get("peka.todo_index.embedded", 0)
+    index.invalidate_user(USER_ID)
+    start = time.perf_counter()
+    index.load(USER_ID, loader)
+    elapsed = (time.perf_counter() - start) * 1000
+    embedded = metrics.snapshot()["counters"].get("peka.todo_index.embedded", 0) - embedded_before
+    print(f"rebuild from cached embeddings: {elapsed:.1f}ms, texts embedded: {embedded:.0f}")
+
+
+if __name__ == "__main__":
+    main()
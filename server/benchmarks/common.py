@@ -0,0 +1,42 @@
+"""Small helpers shared by the benchmark scripts.
+
+Run benchmarks from the server directory, e.g. ``python -m benchmarks.bench_peka_service_lifecycle``.
+"""
+import math
+import os
+import statistics
+import sys
+from typing import Dict, List
+
+# Make the server package importable when a script is run directly
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Repositories build a Supabase client at import; benchmarks never reach it
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_API_KEY", "bench.bench.bench")  # supabase-py only checks the JWT shape
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Latency summary in milliseconds for a list of durations in seconds."""
+    return {
+        "n": len(samples),
+        "mean_ms": statistics.fmean(samples) * 1000 if samples else 0.0,
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p95_ms": percentile(samples, 95) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+    }
+
+
+def print_summary(label: str, samples: List[float]) -> None:
+    s = summarize(samples)
+    print(
+        f"{label:<32} n={s['n']:<5} mean={s['mean_ms']:8.2f}ms "
+        f"p50={s['p50_ms']:8.2f}ms p95={s['p95_ms']:8.2f}ms p99={s['p99_ms']:8.2f}ms"
+    )
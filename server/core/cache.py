@@ -0,0 +1,114 @@
+"""Bounded in-process TTL + LRU cache shared by the service-level caches."""
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterator, Optional, Tuple
+
+from core.metrics import metrics
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after a TTL.
+
+    Bounded by entry count and, optionally, by the approximate size of the stored
+    values (``sizeof``, default ``sys.getsizeof``). When ``name`` is given, hits,
+    misses and evictions are also counted in core.metrics as ``<name>.hits`` etc.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: float = 300.0,
+        max_bytes: Optional[int] = None,
+        name: Optional[str] = None,
+        sizeof: Callable[[Any], int] = sys.getsizeof,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.name = name
+        self._sizeof = sizeof
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float, int]]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _count(self, event: str, value: int = 1) -> None:
+        setattr(self, event, getattr(self, event) + value)
+        if self.name:
+            metrics.increment(f"{self.name}.{event}", value)
+
+    def _remove(self, key: Hashable) -> None:
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                self._count("misses")
+                return default
+            value, expires_at, _ = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self._count("misses")
+                return default
+            self._entries.move_to_end(key)
+            self._count("hits")
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        size = self._sizeof(value) if self.max_bytes else 0
+        if self.max_bytes and size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, expires_at, size)
+            self._bytes += size
+            evicted = 0
+            while len(self._entries) > self.max_entries or (self.max_bytes and self._bytes > self.max_bytes):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                evicted += 1
+            if evicted:
+                self._count("evictions", evicted)
+
+    def delete(self, key: Hashable) -> bool:
+        with self._lock:
+            if key not in self._entries:
+                return False
+            self._remove(key)
+            return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def items(self) -> Iterator[Tuple[Hashable, Any]]:
+        """Snapshot of the live (non-expired) entries, least recently used first."""
+        now = time.monotonic()
+        with self._lock:
+            live = [(key, value) for key, (value, expires_at, _) in self._entries.items() if expires_at > now]
+        return iter(live)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -7,7 +7,122 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# Authenticated users cached per worker by JWT subject, and seconds before a cached user is re-read
+AUTH_USER_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_USER_CACHE_MAX_ENTRIES", "10000"))
+AUTH_USER_CACHE_TTL = float(os.getenv("AUTH_USER_CACHE_TTL", "60"))
+# Seconds an unknown subject is remembered, so a token for a deleted user cannot hammer the database
+AUTH_USER_CACHE_NEGATIVE_TTL = float(os.getenv("AUTH_USER_CACHE_NEGATIVE_TTL", "5"))
+# Verified access tokens cached per worker; each entry expires with its token
+AUTH_TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_TOKEN_CACHE_MAX_ENTRIES", "10000"))
+# bcrypt work factor (log2 of the iterations) for new hashes; logins rehash passwords stored with another cost
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Threads per worker that hash and verify passwords; further logins wait for a free one
+PASSWORD_HASH_THREADS = int(os.getenv("PASSWORD_HASH_THREADS", "4"))
+
+# Supabase connection pool, shared by all database calls in a worker
+SUPABASE_MAX_CONNECTIONS = int(os.getenv("SUPABASE_MAX_CONNECTIONS", "20"))
+# Idle connections kept open for reuse, and seconds an idle connection is kept
+SUPABASE_MAX_KEEPALIVE = int(os.getenv("SUPABASE_MAX_KEEPALIVE", "10"))
+SUPABASE_KEEPALIVE_EXPIRY = float(os.getenv("SUPABASE_KEEPALIVE_EXPIRY", "30"))
+# Seconds allowed for a whole request, for connecting, and for waiting on a free pooled connection
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "10"))
+SUPABASE_CONNECT_TIMEOUT = float(os.getenv("SUPABASE_CONNECT_TIMEOUT", "5"))
+SUPABASE_POOL_TIMEOUT = float(os.getenv("SUPABASE_POOL_TIMEOUT", "5"))
+
+# Bearer token required by GET /metrics; unset, only clients on this host (loopback) may read it
+PEKA_METRICS_TOKEN = os.getenv("PEKA_METRICS_TOKEN")
 
 # Google OAuth Settings
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
-GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET") 
\ No newline at end of file
+GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
+
+# Peka / Cohere Settings
+COHERE_API_KEY = os.getenv("COHERE_API_KEY")
+# Run a one-token Cohere call at startup to fail loudly on a bad key or network
+PEKA_STARTUP_PROBE = os.getenv("PEKA_STARTUP_PROBE", "false").lower() == "true"
+# Worker threads for LangChain calls that have no usable async path
+PEKA_LLM_THREADS = int(os.getenv("PEKA_LLM_THREADS", "8"))
+# Minimum local classifier confidence to skip the Cohere intent call
+PEKA_INTENT_CONFIDENCE = float(os.getenv("PEKA_INTENT_CONFIDENCE", "0.8"))
+# Start the intent call and the unified generation together when the local classifier is unsure
+PEKA_SPECULATIVE = os.getenv("PEKA_SPECULATIVE", "false").lower() == "true"
+# General-query response cache
+PEKA_CACHE_TTL = float(os.getenv("PEKA_CACHE_TTL", "3600"))
+PEKA_CACHE_MAX_ENTRIES = int(os.getenv("PEKA_CACHE_MAX_ENTRIES", "2048"))
+PEKA_CACHE_MAX_BYTES = int(os.getenv("PEKA_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+# Embedding lookups catch paraphrases at the cost of one embed call per miss
+PEKA_CACHE_SEMANTIC = os.getenv("PEKA_CACHE_SEMANTIC", "false").lower() == "true"
+PEKA_CACHE_SIMILARITY = float(os.getenv("PEKA_CACHE_SIMILARITY", "0.92"))
+PEKA_EMBED_MODEL = os.getenv("PEKA_EMBED_MODEL", "embed-english-light-v3.0")
+# Task analysis: 'local' (no LLM), 'hybrid' (local ranking, LLM explanation) or 'llm'
+PEKA_ANALYZE_MODE = os.getenv("PEKA_ANALYZE_MODE", "hybrid")
+# Per-user task analysis cache (invalidated by todo changes)
+PEKA_ANALYSIS_CACHE_TTL = float(os.getenv("PEKA_ANALYSIS_CACHE_TTL", "86400"))
+PEKA_ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv("PEKA_ANALYSIS_CACHE_MAX_ENTRIES", "10000"))
+# Prompt budgets: task lists beyond the token budget keep only the top-scoring tasks
+PEKA_PROMPT_TASK_TOKENS = int(os.getenv("PEKA_PROMPT_TASK_TOKENS", "1500"))
+PEKA_PROMPT_QUERY_CHARS = int(os.getenv("PEKA_PROMPT_QUERY_CHARS", "500"))
+PEKA_PROMPT_DESCRIPTION_CHARS = int(os.getenv("PEKA_PROMPT_DESCRIPTION_CHARS", "400"))
+# LLM admission control: concurrent slots, waiting requests before 503, slots batch work may use
+PEKA_MAX_CONCURRENCY = int(os.getenv("PEKA_MAX_CONCURRENCY", "16"))
+PEKA_MAX_QUEUE_DEPTH = int(os.getenv("PEKA_MAX_QUEUE_DEPTH", "64"))
+PEKA_BATCH_MAX_CONCURRENCY = int(os.getenv("PEKA_BATCH_MAX_CONCURRENCY", "4"))
+# Resilience for Cohere calls: total budget per Peka request, and retries for retryable errors
+PEKA_REQUEST_DEADLINE = float(os.getenv("PEKA_REQUEST_DEADLINE", "25"))
+PEKA_LLM_RETRIES = int(os.getenv("PEKA_LLM_RETRIES", "2"))
+PEKA_RETRY_BASE_SECONDS = float(os.getenv("PEKA_RETRY_BASE_SECONDS", "0.25"))
+# Circuit breaker: consecutive upstream failures before failing fast, and seconds before a trial call
+PEKA_BREAKER_FAILURES = int(os.getenv("PEKA_BREAKER_FAILURES", "5"))
+PEKA_BREAKER_RESET_SECONDS = float(os.getenv("PEKA_BREAKER_RESET_SECONDS", "30"))
+# Hedging: start a second attempt once a call is slower than its observed p95
+PEKA_HEDGE = os.getenv("PEKA_HEDGE", "false").lower() == "true"
+PEKA_HEDGE_MIN_SAMPLES = int(os.getenv("PEKA_HEDGE_MIN_SAMPLES", "20"))
+# Background jobs (e.g. AI enrichment of new tasks): workers, queue bound, attempts, result retention
+PEKA_JOB_WORKERS = int(os.getenv("PEKA_JOB_WORKERS", "4"))
+PEKA_JOB_MAX_PENDING = int(os.getenv("PEKA_JOB_MAX_PENDING", "256"))
+PEKA_JOB_MAX_ATTEMPTS = int(os.getenv("PEKA_JOB_MAX_ATTEMPTS", "3"))
+PEKA_JOB_RESULT_TTL = float(os.getenv("PEKA_JOB_RESULT_TTL", "3600"))
+# Seconds queued and running jobs get to finish on shutdown
+PEKA_JOB_SHUTDOWN_SECONDS = float(os.getenv("PEKA_JOB_SHUTDOWN_SECONDS", "10"))
+# Async analysis jobs: concurrent analyses, queued jobs before 503, how long results are kept
+PEKA_ANALYSIS_JOB_WORKERS = int(os.getenv("PEKA_ANALYSIS_JOB_WORKERS", "2"))
+PEKA_ANALYSIS_JOB_MAX_PENDING = int(os.getenv("PEKA_ANALYSIS_JOB_MAX_PENDING", "100"))
+PEKA_ANALYSIS_JOB_RESULT_TTL = float(os.getenv("PEKA_ANALYSIS_JOB_RESULT_TTL", "900"))
+# Most open tasks loaded from the database for one analysis (newest first)
+PEKA_ANALYZE_MAX_TASKS = int(os.getenv("PEKA_ANALYZE_MAX_TASKS", "200"))
+# Nightly precomputed recommendations: enable the in-process scheduler on one worker only
+PEKA_BATCH_ENABLED = os.getenv("PEKA_BATCH_ENABLED", "false").lower() == "true"
+# Hour of day (UTC) the batch starts, users per page, analyses in flight at once
+PEKA_BATCH_HOUR_UTC = int(os.getenv("PEKA_BATCH_HOUR_UTC", "4"))
+PEKA_BATCH_PAGE_SIZE = int(os.getenv("PEKA_BATCH_PAGE_SIZE", "100"))
+PEKA_BATCH_CONCURRENCY = int(os.getenv("PEKA_BATCH_CONCURRENCY", "4"))
+# Where the batch records its progress, so a restarted run resumes after the last finished page
+PEKA_BATCH_CHECKPOINT_PATH = os.getenv("PEKA_BATCH_CHECKPOINT_PATH", ".peka_batch_checkpoint.json")
+# Look up batch-computed recommendations on an analysis-cache miss; set on every worker when the batch
+# runs on one of them or from cron (never in 'local' mode, where computing is cheaper than the lookup)
+PEKA_SERVE_STORED_RECOMMENDATIONS = os.getenv(
+    "PEKA_SERVE_STORED_RECOMMENDATIONS", os.getenv("PEKA_BATCH_ENABLED", "false")
+).lower() == "true"
+# Stored recommendations older than this are recomputed instead of served (ranking depends on task age)
+PEKA_RECOMMENDATION_MAX_AGE = float(os.getenv("PEKA_RECOMMENDATION_MAX_AGE", "129600"))
+# Conversation memory for /query: users kept (LRU), seconds of inactivity before a conversation is forgotten
+PEKA_MEMORY_MAX_USERS = int(os.getenv("PEKA_MEMORY_MAX_USERS", "10000"))
+PEKA_MEMORY_TTL = float(os.getenv("PEKA_MEMORY_TTL", "3600"))
+# Tokens of recent turns resent with each query, and of the running summary of older turns
+PEKA_MEMORY_TURN_TOKENS = int(os.getenv("PEKA_MEMORY_TURN_TOKENS", "400"))
+PEKA_MEMORY_SUMMARY_TOKENS = int(os.getenv("PEKA_MEMORY_SUMMARY_TOKENS", "150"))
+# LLM provider for PekaService: 'cohere', 'cassette' (replay PEKA_LLM_CASSETTE) or 'synthetic' (offline load tests)
+PEKA_LLM_BACKEND = os.getenv("PEKA_LLM_BACKEND", "cohere")
+PEKA_LLM_CASSETTE = os.getenv("PEKA_LLM_CASSETTE", "benchmarks/data/peka_cassette.jsonl")
+# Synthetic backend: median latency of a call and the share of calls that fail with a 503
+PEKA_SYNTHETIC_LATENCY_MS = float(os.getenv("PEKA_SYNTHETIC_LATENCY_MS", "300"))
+PEKA_SYNTHETIC_FAILURE_RATE = float(os.getenv("PEKA_SYNTHETIC_FAILURE_RATE", "0"))
+# Todo search and duplicate detection: embedder ('cohere', or the local 'hashing' stand-in)
+PEKA_TODO_EMBEDDER = os.getenv("PEKA_TODO_EMBEDDER", "cohere")
+# Users whose todo index is kept in memory, seconds before an index is rebuilt from the database,
+# and embeddings cached by text
+PEKA_TODO_INDEX_MAX_USERS = int(os.getenv("PEKA_TODO_INDEX_MAX_USERS", "1000"))
+PEKA_TODO_INDEX_TTL = float(os.getenv("PEKA_TODO_INDEX_TTL", "600"))
+PEKA_TODO_EMBED_CACHE_ENTRIES = int(os.getenv("PEKA_TODO_EMBED_CACHE_ENTRIES", "20000"))
+# Cosine similarity at which a new todo is reported as a possible duplicate
+PEKA_TODO_DUPLICATE_SIMILARITY = float(os.getenv("PEKA_TODO_DUPLICATE_SIMILARITY", "0.85"))
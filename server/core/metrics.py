@@ -0,0 +1,73 @@
+"""In-process metrics registry exposed at GET /metrics.
+
+Counters and gauges are plain floats; timings keep a bounded window of recent
+samples so percentiles stay cheap to compute. Everything is per worker process.
+"""
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Optional
+
+TIMING_WINDOW = 1024
+
+
+class Metrics:
+    def __init__(self, timing_window: int = TIMING_WINDOW):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = defaultdict(float)
+        self._gauges: Dict[str, float] = {}
+        self._timings: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=timing_window))
+
+    def increment(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self._counters[name] += value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self._timings[name].append(seconds)
+
+    @contextmanager
+    def timer(self, name: str):
+        """Observe the duration of the block; failed or cancelled blocks are not recorded."""
+        start = time.perf_counter()
+        yield
+        self.observe(name, time.perf_counter() - start)
+
+    def counter(self, name: str) -> float:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def sample_count(self, name: str) -> int:
+        with self._lock:
+            return len(self._timings.get(name, ()))
+
+    def percentile(self, name: str, pct: float) -> Optional[float]:
+        """Percentile of the recent samples for a timing, or None if there are none."""
+        with self._lock:
+            samples = sorted(self._timings.get(name, ()))
+        if not samples:
+            return None
+        return samples[max(0, math.ceil(pct / 100 * len(samples)) - 1)]
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            timings = {name: sorted(samples) for name, samples in self._timings.items()}
+            snapshot = {"counters": dict(self._counters), "gauges": dict(self._gauges)}
+
+        def pick(samples, pct):
+            return round(samples[max(0, math.ceil(pct / 100 * len(samples)) - 1)] * 1000, 3)
+
+        snapshot["timings_ms"] = {
+            name: {"count": len(samples), "p50": pick(samples, 50), "p95": pick(samples, 95), "p99": pick(samples, 99)}
+            for name, samples in timings.items() if samples
+        }
+        return snapshot
+
+
+metrics = Metrics()
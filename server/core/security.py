@@ -1,9 +1,17 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
 from passlib.context import CryptContext
 import jwt
-from .config import SECRET_KEY, ALGORITHM
+from .config import SECRET_KEY, ALGORITHM, BCRYPT_ROUNDS, PASSWORD_HASH_THREADS
+from .metrics import metrics
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+# bcrypt releases the GIL while hashing, so a few threads keep a login burst off the event loop
+# without a process pool; the pool size caps how many CPU cores logins can take at once
+_password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_THREADS, thread_name_prefix="bcrypt")
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -11,6 +19,23 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+async def _run_in_password_pool(name: str, func, *args):
+    loop = asyncio.get_running_loop()
+    with metrics.timer(f"auth.password.{name}"):
+        return await loop.run_in_executor(_password_executor, func, *args)
+
+async def get_password_hash_async(password: str) -> str:
+    """get_password_hash, run in the password thread pool"""
+    return await _run_in_password_pool("hash", pwd_context.hash, password)
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Check a password in the password thread pool.
+
+    Returns (valid, new_hash); new_hash is set when the password is valid but the stored
+    hash uses another work factor than BCRYPT_ROUNDS, and should replace the stored one.
+    """
+    return await _run_in_password_pool("verify", pwd_context.verify_and_update, plain_password, hashed_password)
+
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
     if expires_delta:
@@ -19,4 +44,4 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
         expire = datetime.now(timezone.utc) + timedelta(minutes=15)
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt 
\ No newline at end of file
+    return encoded_jwt
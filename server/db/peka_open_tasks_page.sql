@@ -0,0 +1,25 @@
+-- Keyset page for services/recommendation_batch.py: the open todos of the next page_size users
+-- (by id, above after_user_id) that have any, at most max_tasks per user, newest first.
+-- Users without open todos are never visited. Needs db/todo_progress.sql.
+create or replace function peka_open_tasks_page(after_user_id bigint, page_size int, max_tasks int)
+returns setof todo
+language sql stable
+as $$
+    with page as (
+        select distinct user_id
+        from todo
+        where user_id > after_user_id and progress <> 'completed'
+        order by user_id
+        limit page_size
+    )
+    select open_tasks.*
+    from page
+    cross join lateral (
+        select *
+        from todo
+        where todo.user_id = page.user_id and todo.progress <> 'completed'
+        order by created_at desc
+        limit max_tasks
+    ) open_tasks
+    order by open_tasks.user_id, open_tasks.created_at desc;
+$$;
@@ -0,0 +1,8 @@
+-- Precomputed analyses written by services/recommendation_batch.py and served by /api/peka/analyze
+create table if not exists peka_recommendation (
+    user_id bigint primary key references users (id) on delete cascade,
+    mode text not null,
+    tasks_hash text not null,
+    response jsonb not null,
+    computed_at timestamptz not null default now()
+);
@@ -1,12 +1,227 @@
-from supabase import Client, create_client
+"""The worker's Supabase clients.
+
+Table reads and writes go through one async PostgREST client per worker
+(``get_async_postgrest_client``), so a database call never holds up the event
+loop; supabase-py 1.2 has no async client, so it is built from postgrest
+directly. The sync supabase Client (``get_supabase_client``) remains for Supabase
+auth and for code that runs in worker threads. Each client has one HTTP
+connection pool, sized and timed out by the SUPABASE_* settings in core.config.
+
+The app lifespan builds both and closes them; routes receive them through
+``api.dependencies.get_async_db`` and ``get_db``, and repositories call the
+getters. Scripts that run without the app get the same clients on first use.
+
+Every call is measured: ``supabase.request.<table>`` timings,
+``supabase.responses.<N>xx`` and ``supabase.errors`` counters, and
+``supabase.pool.{in_flight,connections,idle}`` gauges (``supabase.async_pool.*``
+for the async client).
+"""
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+import httpx
+from postgrest import AsyncPostgrestClient, SyncPostgrestClient
+from postgrest.constants import DEFAULT_POSTGREST_CLIENT_HEADERS
+from postgrest.utils import AsyncClient, SyncClient
+from supabase import Client
+from supabase.lib.client_options import ClientOptions
+
 from config import api, url
+from core.config import (
+    SUPABASE_CONNECT_TIMEOUT,
+    SUPABASE_KEEPALIVE_EXPIRY,
+    SUPABASE_MAX_CONNECTIONS,
+    SUPABASE_MAX_KEEPALIVE,
+    SUPABASE_POOL_TIMEOUT,
+    SUPABASE_TIMEOUT,
+)
+from core.metrics import metrics
 
 api_url: str = url
 key: str = api
 
-def create_supabase_client():
-    supabase: Client = create_client(
-        supabase_url=api_url,
-        supabase_key=key
+
+class _TransportMetrics:
+    """Times each call through a pooled transport and publishes the pool's usage."""
+
+    def __init__(self, transport, pool_metric: str):
+        self._transport = transport
+        self._pool_metric = pool_metric
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def _count_in_flight(self, delta: int) -> None:
+        with self._lock:
+            self._in_flight += delta
+            metrics.set_gauge(f"{self._pool_metric}.in_flight", self._in_flight)
+
+    def _publish_pool(self) -> None:
+        # Sampled as each request arrives: a connection only turns idle once its response
+        # body has been read, after the transport returns
+        connections = getattr(getattr(self._transport, "_pool", None), "connections", None)
+        if connections is not None:
+            metrics.set_gauge(f"{self._pool_metric}.connections", len(connections))
+            metrics.set_gauge(f"{self._pool_metric}.idle", sum(1 for connection in connections if connection.is_idle()))
+
+    @contextmanager
+    def _measure(self, request: httpx.Request):
+        # /rest/v1/<table>, or /rest/v1/rpc/<function>
+        table = request.url.path.rsplit("/", 1)[-1]
+        self._publish_pool()
+        self._count_in_flight(1)
+        try:
+            with metrics.timer(f"supabase.request.{table}"):
+                yield
+        except Exception:
+            metrics.increment("supabase.errors")
+            raise
+        finally:
+            self._count_in_flight(-1)
+
+    @staticmethod
+    def _count_response(response: httpx.Response) -> httpx.Response:
+        metrics.increment(f"supabase.responses.{response.status_code // 100}xx")
+        return response
+
+
+class MeteredTransport(_TransportMetrics, httpx.BaseTransport):
+    def __init__(self, transport: httpx.HTTPTransport):
+        super().__init__(transport, "supabase.pool")
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        with self._measure(request):
+            response = self._transport.handle_request(request)
+        return self._count_response(response)
+
+    def close(self) -> None:
+        self._transport.close()
+
+
+class MeteredAsyncTransport(_TransportMetrics, httpx.AsyncBaseTransport):
+    def __init__(self, transport: httpx.AsyncHTTPTransport):
+        super().__init__(transport, "supabase.async_pool")
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        with self._measure(request):
+            response = await self._transport.handle_async_request(request)
+        return self._count_response(response)
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+class PooledPostgrestClient(SyncPostgrestClient):
+    def __init__(self, base_url: str, *, transport: httpx.BaseTransport, **kwargs):
+        self._transport = transport
+        super().__init__(base_url, **kwargs)
+
+    def create_session(self, base_url, headers, timeout) -> SyncClient:
+        return SyncClient(base_url=base_url, headers=headers, timeout=timeout, transport=self._transport)
+
+
+class PooledClient(Client):
+    """A supabase Client whose PostgREST sessions all use one shared transport.
+
+    supabase-py rebuilds its PostgREST client after auth events; the rebuilt
+    one keeps using the same transport, so the pool is never duplicated.
+    """
+
+    def __init__(self, supabase_url: str, supabase_key: str, transport: httpx.BaseTransport, timeout: httpx.Timeout):
+        self.transport = transport
+        self.timeout = timeout
+        super().__init__(supabase_url, supabase_key, ClientOptions())
+
+    def _init_postgrest_client(self, rest_url, headers, schema, timeout=None) -> SyncPostgrestClient:
+        return PooledPostgrestClient(
+            rest_url, headers=headers, schema=schema, timeout=self.timeout, transport=self.transport
+        )
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+class PooledAsyncPostgrestClient(AsyncPostgrestClient):
+    def __init__(self, base_url: str, *, transport: httpx.AsyncBaseTransport, **kwargs):
+        self._transport = transport
+        super().__init__(base_url, **kwargs)
+
+    def create_session(self, base_url, headers, timeout) -> AsyncClient:
+        return AsyncClient(base_url=base_url, headers=headers, timeout=timeout, transport=self._transport)
+
+
+def _pool_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=SUPABASE_MAX_CONNECTIONS,
+        max_keepalive_connections=SUPABASE_MAX_KEEPALIVE,
+        keepalive_expiry=SUPABASE_KEEPALIVE_EXPIRY,
+    )
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(SUPABASE_TIMEOUT, connect=SUPABASE_CONNECT_TIMEOUT, pool=SUPABASE_POOL_TIMEOUT)
+
+
+def create_supabase_client() -> PooledClient:
+    """A new client with its own connection pool; use get_supabase_client for the shared one."""
+    transport = MeteredTransport(httpx.HTTPTransport(limits=_pool_limits()))
+    return PooledClient(api_url, key, transport, _timeout())
+
+
+def create_async_postgrest_client() -> AsyncPostgrestClient:
+    """A new async client for {SUPABASE_URL}/rest/v1 with its own connection pool."""
+    transport = MeteredAsyncTransport(httpx.AsyncHTTPTransport(limits=_pool_limits()))
+    # The same headers supabase-py sends with the service key
+    headers = {**DEFAULT_POSTGREST_CLIENT_HEADERS, "apiKey": key, "Authorization": f"Bearer {key}"}
+    return PooledAsyncPostgrestClient(
+        f"{api_url}/rest/v1", headers=headers, timeout=_timeout(), transport=transport
     )
-    return supabase
+
+
+_client: Optional[PooledClient] = None
+_client_lock = threading.Lock()
+
+
+def get_supabase_client() -> PooledClient:
+    """The worker's shared client, created on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = create_supabase_client()
+    return _client
+
+
+def close_supabase_client() -> None:
+    """Close the shared client's connections; the next get_supabase_client builds a new one."""
+    global _client
+    with _client_lock:
+        client, _client = _client, None
+    if client is not None:
+        client.close()
+
+
+_async_client: Optional[AsyncPostgrestClient] = None
+
+
+def get_async_postgrest_client() -> AsyncPostgrestClient:
+    """The worker's shared async client, created on first use.
+
+    Its connections belong to the event loop that opened them; a script that runs
+    several event loops should close it at the end of each.
+    """
+    global _async_client
+    if _async_client is None:
+        with _client_lock:
+            if _async_client is None:
+                _async_client = create_async_postgrest_client()
+    return _async_client
+
+
+async def close_async_postgrest_client() -> None:
+    """Close the shared async client's connections; the next get builds a new one."""
+    global _async_client
+    with _client_lock:
+        client, _async_client = _async_client, None
+    if client is not None:
+        await client.aclose()
@@ -0,0 +1,10 @@
+-- Task status read by the analysis paths (repositories/todo_repo.get_open_tasks, task scoring);
+-- apply before deploying the server that selects and filters on todo.progress
+alter table todo
+    add column if not exists progress text not null default 'not_started'
+        check (progress in ('not_started', 'in_progress', 'completed'));
+
+-- get_open_tasks: a user's not-completed todos, newest first
+create index if not exists todo_user_open_idx
+    on todo (user_id, created_at desc)
+    where progress <> 'completed';
@@ -1,7 +1,38 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+import asyncio
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
 from api.routes import auth, users, onboarding, todo, peka, calendar
+from api.dependencies import verify_metrics_access
+from core.config import (
+    COHERE_API_KEY,
+    PEKA_ANALYSIS_JOB_MAX_PENDING,
+    PEKA_ANALYSIS_JOB_RESULT_TTL,
+    PEKA_ANALYSIS_JOB_WORKERS,
+    PEKA_BATCH_ENABLED,
+    PEKA_BATCH_MAX_CONCURRENCY,
+    PEKA_JOB_MAX_ATTEMPTS,
+    PEKA_JOB_MAX_PENDING,
+    PEKA_JOB_RESULT_TTL,
+    PEKA_JOB_SHUTDOWN_SECONDS,
+    PEKA_JOB_WORKERS,
+    PEKA_LLM_BACKEND,
+    PEKA_MAX_CONCURRENCY,
+    PEKA_MAX_QUEUE_DEPTH,
+    PEKA_STARTUP_PROBE,
+)
+from core.metrics import metrics
+from db.supabase import (
+    close_async_postgrest_client,
+    close_supabase_client,
+    get_async_postgrest_client,
+    get_supabase_client,
+)
+from services.job_queue import JobQueue
+from services.llm_scheduler import LLMScheduler
+from services.peka_service import PekaService
+from services.recommendation_batch import RecommendationBatch, run_daily
 import logging
 from dotenv import load_dotenv
 import os
@@ -22,7 +53,63 @@ logger.info("Loading environment variables...")
 cohere_key = os.getenv("COHERE_API_KEY")
 logger.info(f"Cohere API key loaded: {'Found' if cohere_key else 'Not found'}")
 
-app = FastAPI(title="Peka API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One set of database clients (and connection pools) per worker process, shared by routes and repositories
+    app.state.supabase = get_supabase_client()
+    app.state.async_db = get_async_postgrest_client()
+    # One PekaService (and one set of Cohere clients) per worker process
+    app.state.peka_service = None
+    app.state.llm_scheduler = LLMScheduler(
+        max_concurrency=PEKA_MAX_CONCURRENCY,
+        max_queue_depth=PEKA_MAX_QUEUE_DEPTH,
+        max_batch_concurrency=PEKA_BATCH_MAX_CONCURRENCY,
+    )
+    app.state.job_queue = JobQueue(
+        "peka.jobs",
+        workers=PEKA_JOB_WORKERS,
+        max_pending=PEKA_JOB_MAX_PENDING,
+        max_attempts=PEKA_JOB_MAX_ATTEMPTS,
+        result_ttl=PEKA_JOB_RESULT_TTL,
+    )
+    app.state.job_queue.start()
+    # Separate pool so long analyses cannot starve task enrichment (and vice versa)
+    app.state.analysis_jobs = JobQueue(
+        "peka.analysis_jobs",
+        workers=PEKA_ANALYSIS_JOB_WORKERS,
+        max_pending=PEKA_ANALYSIS_JOB_MAX_PENDING,
+        max_attempts=PEKA_JOB_MAX_ATTEMPTS,
+        result_ttl=PEKA_ANALYSIS_JOB_RESULT_TTL,
+    )
+    app.state.analysis_jobs.start()
+    if COHERE_API_KEY or PEKA_LLM_BACKEND != "cohere":
+        app.state.peka_service = PekaService(COHERE_API_KEY)
+        if PEKA_STARTUP_PROBE and not await app.state.peka_service.check_connection():
+            logger.warning("Cohere startup probe failed; Peka requests may fail until the API is reachable")
+    else:
+        logger.warning("COHERE_API_KEY not set; Peka endpoints are disabled")
+    batch_task = None
+    if PEKA_BATCH_ENABLED and app.state.peka_service is not None:
+        batch = RecommendationBatch(app.state.peka_service, app.state.llm_scheduler)
+        batch_task = asyncio.create_task(run_daily(batch), name="peka.batch")
+    yield
+    if batch_task is not None:
+        # An interrupted run resumes from its checkpoint on the next start
+        batch_task.cancel()
+        await asyncio.gather(batch_task, return_exceptions=True)
+    # Let background jobs finish while the Cohere clients are still open
+    await asyncio.gather(
+        app.state.job_queue.shutdown(PEKA_JOB_SHUTDOWN_SECONDS),
+        app.state.analysis_jobs.shutdown(PEKA_JOB_SHUTDOWN_SECONDS),
+    )
+    if app.state.peka_service is not None:
+        await app.state.peka_service.close()
+        app.state.peka_service = None
+    # Last: the jobs above may still have been writing to the database
+    close_supabase_client()
+    await close_async_postgrest_client()
+
+app = FastAPI(title="Peka API", lifespan=lifespan)
 
 # Configure session middleware with a secure secret key
 app.add_middleware(
@@ -72,4 +159,8 @@ app.include_router(calendar.router, prefix="/api/calendar", tags=["calendar"])
 @app.get("/")
 async def root():
     logger.info("Root endpoint accessed")
-    return {"message": "Welcome to Peka API"} 
\ No newline at end of file
+    return {"message": "Welcome to Peka API"}
+
+@app.get("/metrics", dependencies=[Depends(verify_metrics_access)])
+async def read_metrics():
+    return metrics.snapshot()
@@ -0,0 +1,29 @@
+from datetime import datetime, timezone
+from typing import Dict, Optional
+from db.supabase import get_async_postgrest_client
+
+# See db/peka_recommendation.sql
+TABLE = "peka_recommendation"
+
+async def get_recommendation(user_id: int) -> Optional[Dict]:
+    """The stored analysis row for a user (mode, tasks_hash, response, computed_at), if any."""
+    try:
+        result = await get_async_postgrest_client().from_(TABLE).select("*").eq("user_id", user_id).limit(1).execute()
+        return result.data[0] if result.data else None
+    except Exception as e:
+        print(f"Repository Error getting recommendation: {str(e)}")
+        raise Exception(f"Database error: {str(e)}")
+
+async def save_recommendation(user_id: int, mode: str, tasks_hash: str, response: Dict) -> None:
+    """Insert or replace the user's stored analysis, stamped with the current time."""
+    try:
+        await get_async_postgrest_client().from_(TABLE).upsert({
+            "user_id": user_id,
+            "mode": mode,
+            "tasks_hash": tasks_hash,
+            "response": response,
+            "computed_at": datetime.now(timezone.utc).isoformat(),
+        }).execute()
+    except Exception as e:
+        print(f"Repository Error saving recommendation: {str(e)}")
+        raise Exception(f"Database error: {str(e)}")
@@ -1,36 +1,81 @@
-from typing import Optional, List
+import asyncio
+from typing import Dict, Optional, List
 from schemas.todo import Todo
-from db.supabase import create_supabase_client
+from schemas.peka import Task
+from db.supabase import get_async_postgrest_client
+from services.todo_index import todo_index
 
-supabase = create_supabase_client()
+# Only what task scoring and the analysis prompt read
+TASK_COLUMNS = "id,user_id,title,description,priority,estimated_duration,created_at,progress"
 
-def create_todo(data: dict) -> Optional[Todo]:
+async def create_todo(data: dict) -> Optional[Todo]:
     try:
         print(f"Repository: Creating todo with data: {data}")
-        result = supabase.from_("todo").insert(data).execute()
+        result = await get_async_postgrest_client().from_("todo").insert(data).execute()
         print(f"Repository: Supabase response: {result}")
         if result.data and len(result.data) > 0:
-            return Todo(**result.data[0])
+            todo = Todo(**result.data[0])
+            # Indexing may embed the text, a blocking call; keep it off the event loop
+            await asyncio.to_thread(todo_index.upsert, todo)
+            return todo
         print("Repository: No data returned from Supabase")
         return None
     except Exception as e:
         print(f"Repository Error creating todo: {str(e)}")
         raise Exception(f"Database error: {str(e)}")
 
-def get_user_todos(user_id: int) -> List[Todo]:
+async def get_user_todos(user_id: int) -> List[Todo]:
     try:
         print(f"Repository: Getting todos for user {user_id}")
-        result = supabase.from_("todo").select("*").eq("user_id", user_id).execute()
+        result = await get_async_postgrest_client().from_("todo").select("*").eq("user_id", user_id).execute()
         print(f"Repository: Supabase response: {result}")
         return [Todo(**todo) for todo in result.data]
     except Exception as e:
         print(f"Repository Error getting user todos: {str(e)}")
         raise Exception(f"Database error: {str(e)}")
 
-def get_todo(todo_id: int, user_id: int) -> Optional[Todo]:
+async def get_open_tasks(user_id: int, limit: int) -> List[Task]:
+    """Up to limit of the user's not-completed todos, newest first, as analysis Tasks."""
+    try:
+        print(f"Repository: Getting up to {limit} open tasks for user {user_id}")
+        result = await (
+            get_async_postgrest_client().from_("todo")
+            .select(TASK_COLUMNS)
+            .eq("user_id", user_id)
+            .neq("progress", "completed")
+            .order("created_at", desc=True)
+            .limit(limit)
+            .execute()
+        )
+        print(f"Repository: Got {len(result.data)} open tasks")
+        return [Task(**task) for task in result.data]
+    except Exception as e:
+        print(f"Repository Error getting open tasks: {str(e)}")
+        raise Exception(f"Database error: {str(e)}")
+
+async def get_open_tasks_page(after_user_id: int, page_size: int, limit: int) -> Dict[int, List[Task]]:
+    """Open tasks of the next page_size users above after_user_id that have any, keyed by
+    user id in ascending order, up to limit per user, newest first (db/peka_open_tasks_page.sql)."""
+    try:
+        print(f"Repository: Getting open tasks for up to {page_size} users after {after_user_id}")
+        request = await get_async_postgrest_client().rpc(
+            "peka_open_tasks_page",
+            {"after_user_id": after_user_id, "page_size": page_size, "max_tasks": limit},
+        )
+        result = await request.execute()
+        tasks_by_user: Dict[int, List[Task]] = {}
+        for task in result.data:
+            tasks_by_user.setdefault(task["user_id"], []).append(Task(**task))
+        print(f"Repository: Got {len(result.data)} open tasks for {len(tasks_by_user)} users")
+        return tasks_by_user
+    except Exception as e:
+        print(f"Repository Error getting open tasks page: {str(e)}")
+        raise Exception(f"Database error: {str(e)}")
+
+async def get_todo(todo_id: int, user_id: int) -> Optional[Todo]:
     try:
         print(f"Repository: Getting todo {todo_id} for user {user_id}")
-        result = supabase.from_("todo").select("*").eq("id", todo_id).eq("user_id", user_id).single().execute()
+        result = await get_async_postgrest_client().from_("todo").select("*").eq("id", todo_id).eq("user_id", user_id).single().execute()
         print(f"Repository: Supabase response: {result}")
         if result.data:
             return Todo(**result.data)
@@ -39,23 +84,27 @@ def get_todo(todo_id: int, user_id: int) -> Optional[Todo]:
         print(f"Repository Error getting todo: {str(e)}")
         raise Exception(f"Database error: {str(e)}")
 
-def update_todo(todo_id: int, user_id: int, data: dict) -> Optional[Todo]:
+async def update_todo(todo_id: int, user_id: int, data: dict) -> Optional[Todo]:
     try:
         print(f"Repository: Updating todo {todo_id} for user {user_id} with data: {data}")
-        result = supabase.from_("todo").update(data).eq("id", todo_id).eq("user_id", user_id).execute()
+        result = await get_async_postgrest_client().from_("todo").update(data).eq("id", todo_id).eq("user_id", user_id).execute()
         print(f"Repository: Supabase response: {result}")
         if result.data and len(result.data) > 0:
-            return Todo(**result.data[0])
+            todo = Todo(**result.data[0])
+            await asyncio.to_thread(todo_index.upsert, todo)
+            return todo
         return None
     except Exception as e:
         print(f"Repository Error updating todo: {str(e)}")
         raise Exception(f"Database error: {str(e)}")
 
-def delete_todo(todo_id: int, user_id: int) -> bool:
+async def delete_todo(todo_id: int, user_id: int) -> bool:
     try:
         print(f"Repository: Deleting todo {todo_id} for user {user_id}")
-        result = supabase.from_("todo").delete().eq("id", todo_id).eq("user_id", user_id).execute()
+        result = await get_async_postgrest_client().from_("todo").delete().eq("id", todo_id).eq("user_id", user_id).execute()
         print(f"Repository: Supabase response: {result}")
+        if result.data:
+            todo_index.remove(user_id, todo_id)
         return bool(result.data)
     except Exception as e:
         print(f"Repository Error deleting todo: {str(e)}")
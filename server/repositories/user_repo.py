@@ -1,46 +1,61 @@
 from typing import Optional, Dict
 from schemas.user import UserInDB
-from db.supabase import create_supabase_client
+from db.supabase import get_async_postgrest_client
+from services.user_cache import user_cache
 from datetime import datetime
 import json
 
-supabase = create_supabase_client()
-
-def get_user(db, username: str) -> Optional[UserInDB]:
+async def find_user(db, username: str) -> Optional[UserInDB]:
+    """Like get_user, but raises on a database error instead of reporting the user as missing."""
     try:
-        user = db.from_("users").select("*").eq("email", username).execute()
-        if user.data and len(user.data) > 0:
-            # Convert the password field to hashed_password for the model
-            user_data = user.data[0]
-            # Ensure all required fields are present with defaults
-            user_data.setdefault('id', user_data.get('id'))  # Include the ID field
-            user_data.setdefault('name', '')
-            user_data.setdefault('email', username)
-            user_data.setdefault('created_at', None)
-            # Convert password to hashed_password
-            user_data['hashed_password'] = user_data.pop('password', None)
-            return UserInDB(**user_data)
-        return None
+        user = await db.from_("users").select("*").eq("email", username).execute()
     except Exception as e:
         print(f"Error getting user: {str(e)}")
+        raise Exception(f"Database error: {str(e)}")
+    if user.data and len(user.data) > 0:
+        # Convert the password field to hashed_password for the model
+        user_data = user.data[0]
+        # Ensure all required fields are present with defaults
+        user_data.setdefault('id', user_data.get('id'))  # Include the ID field
+        user_data.setdefault('name', '')
+        user_data.setdefault('email', username)
+        user_data.setdefault('created_at', None)
+        # Convert password to hashed_password
+        user_data['hashed_password'] = user_data.pop('password', None)
+        return UserInDB(**user_data)
+    return None
+
+async def get_user(db, username: str) -> Optional[UserInDB]:
+    try:
+        return await find_user(db, username)
+    except Exception:
         return None
 
-def user_exists(key: str = "email", value: str = None) -> bool:
+async def user_exists(key: str = "email", value: str = None) -> bool:
     try:
-        user = supabase.from_("users").select("*").eq(key, value).execute()
+        user = await get_async_postgrest_client().from_("users").select("*").eq(key, value).execute()
         return len(user.data) > 0
     except Exception as e:
         print(f"Error checking user existence: {str(e)}")
         return False
 
-def create_or_update_oauth_user(user_info: Dict) -> Optional[Dict]:
+async def update_password_hash(email: str, hashed_password: str) -> bool:
+    try:
+        result = await get_async_postgrest_client().from_("users").update({"password": hashed_password}).eq("email", email).execute()
+        user_cache.invalidate(email)
+        return bool(result.data)
+    except Exception as e:
+        print(f"Error updating password hash: {str(e)}")
+        raise Exception(f"Database error: {str(e)}")
+
+async def create_or_update_oauth_user(user_info: Dict) -> Optional[Dict]:
     try:
         print("\n=== Starting OAuth User Creation/Update ===")
         print(f"Input user_info: {json.dumps(user_info, indent=2)}")
         
         # Check if user exists
         print("\nChecking if user exists...")
-        user = supabase.from_("users").select("*").eq("email", user_info['email']).execute()
+        user = await get_async_postgrest_client().from_("users").select("*").eq("email", user_info['email']).execute()
         print(f"User query result: {json.dumps(user.data if hasattr(user, 'data') else None, indent=2)}")
         
         user_data = {
@@ -53,13 +68,14 @@ def create_or_update_oauth_user(user_info: Dict) -> Optional[Dict]:
         try:
             if not user.data:
                 print("\nAttempting to create new user...")
-                result = supabase.from_("users").insert(user_data).execute()
+                result = await get_async_postgrest_client().from_("users").insert(user_data).execute()
                 print(f"Insert result: {json.dumps(result.data if hasattr(result, 'data') else None, indent=2)}")
             else:
                 print("\nAttempting to update existing user...")
-                result = supabase.from_("users").update(user_data).eq("email", user_info['email']).execute()
+                result = await get_async_postgrest_client().from_("users").update(user_data).eq("email", user_info['email']).execute()
                 print(f"Update result: {json.dumps(result.data if hasattr(result, 'data') else None, indent=2)}")
 
+            user_cache.invalidate(user_info['email'])
             if result.data:
                 print("\nSuccessfully processed user.")
                 return result.data[0]  # Return the raw dictionary from the database
@@ -34,8 +34,18 @@ class PekaResponse(BaseModel):
     sorted_tasks: List[int]
     top_recommendation: TaskRecommendation
     explanation: str
+    cached: bool = False  # True when served from the per-user analysis cache
+    computed_at: Optional[datetime] = None  # Set when served from the nightly precomputed batch
 
 class GeneralResponse(BaseModel):
     response: str
     action_items: List[str]
-    timestamp: datetime 
\ No newline at end of file
+    timestamp: datetime 
+
+class TaskCreationResponse(BaseModel):
+    task_id: int = 0
+    title: str
+    description: str
+    priority: str
+    estimated_duration: int
+    message: str
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 from enum import Enum
 from pydantic import BaseModel
 
@@ -8,11 +8,17 @@ class Priority(str, Enum):
     MEDIUM = "medium"
     HIGH = "high"
 
+class Progress(str, Enum):
+    NOT_STARTED = "not_started"
+    IN_PROGRESS = "in_progress"
+    COMPLETED = "completed"
+
 class TodoBase(BaseModel):
     title: str
     description: str = ""  # Default to empty string as per DB
     priority: Priority = Priority.LOW  # Default to 'low' as per DB
     estimated_duration: Optional[int] = None  # Can be NULL
+    progress: Optional[Progress] = None  # None on create/update means 'not_started' / unchanged (db/todo_progress.sql)
 
 class TodoCreate(TodoBase):
     pass
@@ -23,4 +29,17 @@ class Todo(TodoBase):
     created_at: datetime
 
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True
+
+class TodoMatch(BaseModel):
+    id: int
+    title: str
+    score: float  # Cosine similarity, 1.0 for identical text
+
+class TodoCreated(Todo):
+    # Existing todos that look like the same task; the new todo is created regardless
+    possible_duplicates: List[TodoMatch] = []
+
+class TodoSearchResult(BaseModel):
+    todo: Todo
+    score: float
@@ -0,0 +1,50 @@
+"""Per-user cache of task analyses.
+
+Entries are keyed by user, analysis mode, a content hash of the task set and a
+per-user version. Todo mutations bump the version (see services/todo_service.py),
+so a stale analysis is never served even if the client sends an old task list.
+"""
+import hashlib
+import json
+import threading
+from typing import Dict, List, Optional
+
+from core.cache import TTLCache
+from core.config import PEKA_ANALYSIS_CACHE_TTL, PEKA_ANALYSIS_CACHE_MAX_ENTRIES
+from schemas.peka import PekaResponse, Task
+
+
+def task_set_hash(tasks: List[Task]) -> str:
+    """Order-independent digest of the fields that affect an analysis."""
+    rows = sorted(
+        (task.model_dump(mode="json", exclude={"user_id"}) for task in tasks),
+        key=lambda row: row["id"],
+    )
+    return hashlib.sha256(json.dumps(rows, sort_keys=True).encode()).hexdigest()
+
+
+class AnalysisCache:
+    def __init__(self, max_entries: int, ttl: float):
+        self._cache = TTLCache(max_entries=max_entries, ttl=ttl, name="peka.analysis_cache")
+        self._versions: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, user_id: int, tasks_hash: str, mode: str):
+        return (user_id, self._versions.get(user_id, 0), mode, tasks_hash)
+
+    def get(self, user_id: int, tasks_hash: str, mode: str) -> Optional[PekaResponse]:
+        return self._cache.get(self._key(user_id, tasks_hash, mode))
+
+    def set(self, user_id: int, tasks_hash: str, mode: str, response: PekaResponse) -> None:
+        self._cache.set(self._key(user_id, tasks_hash, mode), response.model_copy())
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Make every cached analysis for the user unreachable; old entries age out of the LRU."""
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
+    def stats(self) -> Dict:
+        return self._cache.stats()
+
+
+analysis_cache = AnalysisCache(PEKA_ANALYSIS_CACHE_MAX_ENTRIES, PEKA_ANALYSIS_CACHE_TTL)
@@ -1,26 +1,29 @@
 from datetime import datetime, timedelta
 from typing import Optional, Dict
-from passlib.context import CryptContext
+import logging
 from core.config import ACCESS_TOKEN_EXPIRE_MINUTES
-from core.security import create_access_token
-from repositories.user_repo import get_user
+from core.security import create_access_token, verify_and_update_password
+from repositories.user_repo import get_user, update_password_hash
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+logger = logging.getLogger(__name__)
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
-
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
-
-def authenticate_user(db, email: str, password: str):
-    user = get_user(db, email)
+async def authenticate_user(db, email: str, password: str):
+    user = await get_user(db, email)
     if not user:
         return False
     if not user.hashed_password:  # OAuth user
         return False
-    if not verify_password(password, user.hashed_password):
+    valid, new_hash = await verify_and_update_password(password, user.hashed_password)
+    if not valid:
         return False
+    if new_hash:
+        # Stored with another bcrypt cost than BCRYPT_ROUNDS; only a login sees the plain password
+        try:
+            await update_password_hash(user.email, new_hash)
+            user.hashed_password = new_hash
+        except Exception as e:
+            # The old hash still verifies; try again on the next login
+            logger.warning(f"Failed to rehash password for {user.email}: {str(e)}")
     return user
 
 def create_jwt_token(data: Dict) -> str:
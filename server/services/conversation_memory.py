@@ -0,0 +1,130 @@
+"""Per-user conversation memory for Peka queries.
+
+Each user's recent turns are resent with their next query, within a token
+budget. Turns that no longer fit move to an overflow list, which PekaService
+folds into a short running summary (by the LLM, or locally with
+``extractive_summary`` if that fails). The context sent with a query is
+therefore at most ``summary_tokens + turn_tokens`` however long the
+conversation gets. Conversations live in an LRU cache bounded by user count
+and forgotten after ``ttl`` seconds without a new turn.
+"""
+import re
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+
+from core.cache import TTLCache
+from services.prompt_builder import estimate_tokens, truncate
+
+# What is kept of each message; long answers are the bulk of the history otherwise
+QUERY_CHARS = 300
+REPLY_CHARS = 400
+# Share of the turn budget left after older turns are moved out for summarizing
+COMPACT_TO = 0.6
+
+Turn = Tuple[str, str]  # (role, text), role 'User' or 'Peka'
+
+ASKED_PREFIX = "Earlier the user asked: "
+
+# Words that point back at earlier turns ("what about that one?", "explain it again")
+_FOLLOW_UP = re.compile(
+    r"\b(it|that|those|these|they|them|above|earlier|previous|previously|again|"
+    r"you said|you mentioned|we discussed|what about|how about|and then)\b",
+    re.IGNORECASE,
+)
+# Queries this short are usually replies to the last turn ("why?", "ok, and then")
+_FOLLOW_UP_MAX_WORDS = 3
+
+
+def refers_back(query: str) -> bool:
+    """Whether the query reads as a follow-up that needs the earlier turns to be answered.
+
+    Standalone queries are answered without the conversation, so their answers can be
+    shared through the response cache.
+    """
+    return len(query.split()) <= _FOLLOW_UP_MAX_WORDS or _FOLLOW_UP.search(query) is not None
+
+
+def clip_tokens(text: str, max_tokens: int) -> str:
+    """Keep the end of text within max_tokens, dropping whole words from the front."""
+    words = text.split()
+    while words and estimate_tokens(" ".join(words)) > max_tokens:
+        words = words[max(1, len(words) // 10):]
+    return " ".join(words)
+
+
+def extractive_summary(summary: str, turns: List[Turn], max_tokens: int) -> str:
+    """Local fallback summary: the previous summary plus what the user asked, oldest questions dropped first."""
+    head, _, earlier = summary.partition(ASKED_PREFIX)
+    asked = [item for item in earlier.split("; ") if item]
+    asked += [truncate(text, 120) for role, text in turns if role == "User"]
+    head = head.strip()
+    while asked:
+        text = " ".join(filter(None, (head, ASKED_PREFIX + "; ".join(asked))))
+        if estimate_tokens(text) <= max_tokens:
+            return text
+        asked.pop(0)
+    return clip_tokens(head, max_tokens)
+
+
+class Conversation:
+    __slots__ = ("summary", "turns", "turn_tokens", "overflow", "compacting")
+
+    def __init__(self):
+        self.summary = ""
+        self.turns: Deque[Tuple[str, str, int]] = deque()
+        self.turn_tokens = 0
+        self.overflow: List[Turn] = []
+        self.compacting = False
+
+    def render(self) -> str:
+        """The summary and recent turns as prompt text; empty for a new conversation."""
+        lines = [f"Summary of earlier conversation: {self.summary}"] if self.summary else []
+        lines.extend(f"{role}: {text}" for role, text, _ in self.turns)
+        return "\n".join(lines)
+
+
+class ConversationMemory:
+    def __init__(self, max_users: int, ttl: float, turn_tokens: int, summary_tokens: int):
+        self.turn_tokens = turn_tokens
+        self.summary_tokens = summary_tokens
+        self._conversations = TTLCache(max_entries=max_users, ttl=ttl, name="peka.memory")
+
+    def get(self, user_id: int) -> Optional[Conversation]:
+        return self._conversations.get(user_id)
+
+    def context(self, user_id: Optional[int]) -> str:
+        """Prompt text for the user's conversation so far ('' without a user or history)."""
+        if user_id is None:
+            return ""
+        conversation = self.get(user_id)
+        return conversation.render() if conversation else ""
+
+    def record(self, user_id: int, query: str, reply: str) -> Conversation:
+        """Append a query and its reply; turns pushed past the budget go to the overflow list.
+
+        The caller should compact the overflow (see PekaService._compact_memory).
+        """
+        conversation = self.get(user_id) or Conversation()
+        for role, text in (("User", truncate(query, QUERY_CHARS)), ("Peka", truncate(reply, REPLY_CHARS))):
+            if not text:
+                continue
+            tokens = estimate_tokens(text) + 2
+            conversation.turns.append((role, text, tokens))
+            conversation.turn_tokens += tokens
+        # Once over budget, evict down to COMPACT_TO of it, so a summary call covers several
+        # turns instead of running on every query; the latest exchange is always kept
+        if conversation.turn_tokens > self.turn_tokens:
+            target = self.turn_tokens * COMPACT_TO
+            while conversation.turn_tokens > target and len(conversation.turns) > 2:
+                role, text, tokens = conversation.turns.popleft()
+                conversation.turn_tokens -= tokens
+                conversation.overflow.append((role, text))
+        # Re-set on every turn, so the TTL counts from the last message
+        self._conversations.set(user_id, conversation)
+        return conversation
+
+    def clear(self, user_id: int) -> None:
+        self._conversations.delete(user_id)
+
+    def stats(self):
+        return self._conversations.stats()
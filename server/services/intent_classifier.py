@@ -0,0 +1,135 @@
+"""Local intent classifier used before falling back to the Cohere intent call.
+
+Keyword/regex rules catch the unambiguous phrasings ("add ...", "remind me ...",
+"prioritize my tasks") and a small multinomial Naive Bayes model, trained on
+``services/data/intent_train.jsonl`` and shipped as ``intent_model.json``, scores
+everything else. Prediction is pure Python and takes a few microseconds.
+
+Retrain after editing the training data with::
+
+    python -m services.intent_classifier
+"""
+import json
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+INTENTS = ("create", "analyze", "general")
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+DEFAULT_MODEL_PATH = os.path.join(DATA_DIR, "intent_model.json")
+DEFAULT_TRAIN_PATH = os.path.join(DATA_DIR, "intent_train.jsonl")
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+# (pattern, intent, confidence) - checked in order, first match wins
+_RULES = [
+    (re.compile(
+        r"^(please |pls |plz |can (you|u) |i need to |i want to )?"
+        r"(create|add|schedule|remind me|make (a|me a|a new)|set (a|up a) (reminder|deadline)|"
+        r"new (task|todo|reminder)|put|block out|note down)\b"
+    ), "create", 0.95),
+    (re.compile(
+        r"\b(prioriti[sz]e|reprioriti[sz]e|rank my|sort my|my (tasks|todos?|todo list|task list|list|progress|workload)|"
+        r"on my (list|plate)|which (task|todo)|what should i (do|work on|focus on|tackle))\b"
+    ), "analyze", 0.9),
+]
+# A rule the model disagrees with is demoted below the default LLM fallback threshold
+_RULE_CONFLICT_PENALTY = 0.25
+
+
+class IntentPrediction(NamedTuple):
+    intent: str
+    confidence: float
+    source: str  # 'rule' | 'model'
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased unigrams plus adjacent bigrams."""
+    words = _TOKEN_RE.findall(text.lower())
+    return words + [f"{a}_{b}" for a, b in zip(words, words[1:])]
+
+
+class IntentClassifier:
+    def __init__(self, model: Dict):
+        self.intents = model["intents"]
+        self.log_prior = model["log_prior"]
+        self.log_likelihood = model["log_likelihood"]
+        self.unknown = model["unknown"]
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_MODEL_PATH) -> "IntentClassifier":
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def _model_posterior(self, query: str) -> Dict[str, float]:
+        tokens = tokenize(query)
+        scores = {}
+        for intent in self.intents:
+            likelihood = self.log_likelihood[intent]
+            unknown = self.unknown[intent]
+            scores[intent] = self.log_prior[intent] + sum(likelihood.get(t, unknown) for t in tokens)
+        top = max(scores.values())
+        exp_scores = {intent: math.exp(score - top) for intent, score in scores.items()}
+        total = sum(exp_scores.values())
+        return {intent: value / total for intent, value in exp_scores.items()}
+
+    def predict(self, query: str) -> IntentPrediction:
+        posterior = self._model_posterior(query)
+        model_intent = max(posterior, key=posterior.get)
+
+        normalized = " ".join(_TOKEN_RE.findall(query.lower()))
+        for pattern, intent, confidence in _RULES:
+            if pattern.search(normalized):
+                if intent != model_intent:
+                    confidence -= _RULE_CONFLICT_PENALTY
+                return IntentPrediction(intent, max(confidence, posterior[intent]), "rule")
+
+        return IntentPrediction(model_intent, posterior[model_intent], "model")
+
+
+def train(examples: Iterable[Dict], alpha: float = 1.0) -> Dict:
+    """Fit a Laplace-smoothed multinomial Naive Bayes model on {query, intent} rows."""
+    token_counts = {intent: Counter() for intent in INTENTS}
+    doc_counts = Counter()
+    for example in examples:
+        doc_counts[example["intent"]] += 1
+        token_counts[example["intent"]].update(tokenize(example["query"]))
+
+    vocabulary = set().union(*token_counts.values())
+    total_docs = sum(doc_counts.values())
+    model = {"intents": list(INTENTS), "log_prior": {}, "log_likelihood": {}, "unknown": {}}
+    for intent in INTENTS:
+        denominator = sum(token_counts[intent].values()) + alpha * (len(vocabulary) + 1)
+        model["log_prior"][intent] = math.log(doc_counts[intent] / total_docs)
+        model["log_likelihood"][intent] = {
+            token: round(math.log((token_counts[intent][token] + alpha) / denominator), 4)
+            for token in sorted(vocabulary)
+        }
+        model["unknown"][intent] = round(math.log(alpha / denominator), 4)
+    return model
+
+
+def load_examples(path: str) -> List[Dict]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+_default_classifier: Optional[IntentClassifier] = None
+
+
+def get_intent_classifier() -> IntentClassifier:
+    """Process-wide classifier loaded from the shipped model file."""
+    global _default_classifier
+    if _default_classifier is None:
+        _default_classifier = IntentClassifier.load()
+    return _default_classifier
+
+
+if __name__ == "__main__":
+    trained = train(load_examples(DEFAULT_TRAIN_PATH))
+    with open(DEFAULT_MODEL_PATH, "w") as f:
+        json.dump(trained, f, separators=(",", ":"), sort_keys=True)
+    print(f"Wrote {DEFAULT_MODEL_PATH} ({sum(len(v) for v in trained['log_likelihood'].values())} weights)")
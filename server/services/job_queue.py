@@ -0,0 +1,234 @@
+"""Bounded in-process background job queue.
+
+Jobs are coroutine factories run by a fixed pool of worker tasks. The queue holds
+at most ``max_pending`` jobs (``submit`` raises ``JobQueueFull`` beyond that, so
+callers can degrade instead of piling up work). Failed attempts are retried with
+jittered exponential backoff, except for client errors (4xx HTTPException) that
+would fail the same way again. Finished jobs stay queryable for ``result_ttl``
+seconds. Queued or running jobs can be cancelled; a running job's coroutine is
+cancelled without taking its worker down. ``shutdown`` stops intake, lets queued and running jobs finish within a
+grace period and marks whatever is left as failed.
+
+Everything lives in the worker process: jobs do not survive a restart, and a job
+is only visible to the worker that accepted it.
+"""
+import asyncio
+import logging
+import random
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from fastapi import HTTPException
+
+from core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+JobFn = Callable[[], Awaitable[Any]]
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class Job:
+    __slots__ = ("id", "kind", "user_id", "fn", "status", "result", "error", "attempts",
+                 "created_at", "started_at", "finished_at", "task", "cancel_requested")
+
+    def __init__(self, kind: str, user_id, fn: JobFn):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.user_id = user_id
+        self.fn = fn
+        self.status = QUEUED
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.attempts = 0
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self.cancel_requested = False
+
+    @property
+    def done(self) -> bool:
+        return self.status in (SUCCEEDED, FAILED, CANCELLED)
+
+    def to_dict(self) -> Dict:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "attempts": self.attempts,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+def _retryable(exc: BaseException) -> bool:
+    return not (isinstance(exc, HTTPException) and exc.status_code < 500)
+
+
+class JobQueue:
+    def __init__(
+        self,
+        name: str,
+        workers: int,
+        max_pending: int,
+        max_attempts: int = 3,
+        retry_base: float = 1.0,
+        result_ttl: float = 3600.0,
+    ):
+        self.name = name
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.result_ttl = result_ttl
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._jobs: Dict[str, Job] = {}
+        self._workers: Set[asyncio.Task] = set()
+        self._retries: Set[asyncio.Task] = set()
+        self._running = 0
+        self._accepting = False
+
+    def start(self) -> None:
+        self._accepting = True
+        for i in range(self.workers):
+            self._workers.add(asyncio.create_task(self._worker(), name=f"{self.name}-{i}"))
+
+    def _publish(self) -> None:
+        metrics.set_gauge(f"{self.name}.pending", self._queue.qsize() + len(self._retries))
+        metrics.set_gauge(f"{self.name}.running", self._running)
+
+    def _purge(self) -> None:
+        cutoff = time.time() - self.result_ttl
+        expired = [job_id for job_id, job in self._jobs.items() if job.done and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def submit(self, kind: str, user_id, fn: JobFn) -> Job:
+        """Queue fn to run in the background; raises JobQueueFull when the queue is at capacity."""
+        if not self._accepting:
+            raise JobQueueFull(f"{self.name} is not accepting jobs")
+        self._purge()
+        job = Job(kind, user_id, fn)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            metrics.increment(f"{self.name}.rejected")
+            raise JobQueueFull(f"{self.name} is full")
+        self._jobs[job.id] = job
+        metrics.increment(f"{self.name}.submitted")
+        self._publish()
+        return job
+
+    def get(self, job_id: str, user_id=None) -> Optional[Job]:
+        """Look up a job; with user_id, only that user's jobs are visible."""
+        job = self._jobs.get(job_id)
+        if job is None or (user_id is not None and job.user_id != user_id):
+            return None
+        if job.done and job.finished_at < time.time() - self.result_ttl:
+            return None
+        return job
+
+    def _finish(self, job: Job, status: str, result: Any = None, error: Optional[str] = None) -> None:
+        job.status, job.result, job.error = status, result, error
+        job.finished_at = time.time()
+        job.fn = job.task = None
+        metrics.increment(f"{self.name}.{status}")
+
+    def cancel(self, job_id: str, user_id=None) -> Optional[Job]:
+        """Cancel a queued or running job; finished jobs are returned unchanged."""
+        job = self.get(job_id, user_id)
+        if job is None or job.done:
+            return job
+        job.cancel_requested = True
+        if job.task is not None:
+            job.task.cancel()
+        else:
+            # Still queued (or waiting to retry): the worker drops it when dequeued
+            self._finish(job, CANCELLED)
+        return job
+
+    async def _requeue_later(self, job: Job, delay: float) -> None:
+        try:
+            await asyncio.sleep(delay)
+            if job.cancel_requested:
+                return
+            job.status = QUEUED
+            await self._queue.put(job)
+        finally:
+            self._retries.discard(asyncio.current_task())
+            self._publish()
+
+    async def _run(self, job: Job) -> None:
+        job.status = RUNNING
+        job.attempts += 1
+        job.started_at = job.started_at or time.time()
+        self._running += 1
+        self._publish()
+        start = time.perf_counter()
+        try:
+            # Own task per attempt, so cancelling the job leaves the worker running
+            job.task = asyncio.ensure_future(job.fn())
+            result = await job.task
+        except asyncio.CancelledError:
+            # Only swallow the cancel if it was this job's, not the worker's own (shutdown)
+            if not job.cancel_requested or asyncio.current_task().cancelling():
+                self._finish(job, FAILED, error="Cancelled")
+                raise
+            self._finish(job, CANCELLED)
+        except Exception as e:
+            job.task = None
+            if _retryable(e) and job.attempts < self.max_attempts and self._accepting:
+                delay = random.uniform(0, self.retry_base * 2 ** job.attempts)
+                logger.warning(f"{self.name}: {job.kind} job {job.id} failed ({str(e)}); retrying in {delay:.1f}s")
+                metrics.increment(f"{self.name}.retried")
+                job.status = QUEUED
+                job.error = str(e)
+                self._retries.add(asyncio.create_task(self._requeue_later(job, delay)))
+            else:
+                logger.error(f"{self.name}: {job.kind} job {job.id} failed after {job.attempts} attempts: {str(e)}")
+                self._finish(job, FAILED, error=str(getattr(e, "detail", e)))
+        else:
+            metrics.observe(f"{self.name}.run", time.perf_counter() - start)
+            self._finish(job, SUCCEEDED, result=result)
+        finally:
+            self._running -= 1
+            self._publish()
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                if job.done:
+                    continue
+                if not job.attempts:
+                    metrics.observe(f"{self.name}.queue_wait", time.time() - job.created_at)
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def shutdown(self, timeout: float) -> None:
+        """Stop intake, give queued and running jobs up to timeout seconds, then cancel the rest."""
+        self._accepting = False
+        for task in list(self._retries):
+            task.cancel()
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"{self.name}: shutdown grace period over with jobs still unfinished")
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, *self._retries, return_exceptions=True)
+        self._workers.clear()
+        for job in self._jobs.values():
+            if not job.done:
+                self._finish(job, FAILED, error="Server shutting down")
+        self._publish()
@@ -0,0 +1,353 @@
+"""Model providers PekaService can run against.
+
+A backend supplies the two things PekaService calls: ``client``, with the
+cohere.AsyncClient methods it uses (``generate``, streaming ``generate``,
+``embed``, ``close``), and ``chat_model``, a LangChain runnable that turns the
+JSON prompt into an AIMessage. Three backends are provided:
+
+- ``CohereBackend``: the real API.
+- ``CassetteBackend``: replays ``generate``/chat/embed responses recorded to a
+  JSONL cassette, keyed by prompt and parameters. In record mode it wraps another
+  backend and writes each response as it arrives.
+- ``SyntheticBackend``: well-formed canned responses with log-normal latency
+  and a configurable failure rate, seeded for reproducible runs.
+
+PEKA_LLM_BACKEND selects one for the app; benchmarks build them directly.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+import cohere
+from langchain_community.chat_models import ChatCohere
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+from core.config import (
+    PEKA_LLM_CASSETTE,
+    PEKA_REQUEST_DEADLINE,
+    PEKA_SYNTHETIC_FAILURE_RATE,
+    PEKA_SYNTHETIC_LATENCY_MS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class LLMBackend:
+    name = "base"
+    client: Any
+    chat_model: Any
+
+    async def close(self) -> None:
+        await self.client.close()
+
+
+class CohereBackend(LLMBackend):
+    name = "cohere"
+
+    def __init__(self, api_key: str):
+        if not api_key:
+            raise ValueError("Cohere API key is not provided")
+        logger.debug(f"Using Cohere API key: {api_key[:5]}...")
+        # Async Cohere client so generate calls never block the event loop
+        self.client = cohere.AsyncClient(
+            api_key=api_key,
+            timeout=PEKA_REQUEST_DEADLINE  # No single call may outlive a request's budget
+        )
+        self.chat_model = ChatCohere(
+            model="command",
+            temperature=0.7,
+            cohere_api_key=api_key,
+            verbose=True,
+            streaming=False,
+            timeout=PEKA_REQUEST_DEADLINE
+        )
+
+
+def _generation(text: str):
+    return SimpleNamespace(generations=[SimpleNamespace(text=text)])
+
+
+async def _token_stream(chunks: List[str], delay: float = 0.0) -> AsyncIterator:
+    for chunk in chunks:
+        if delay:
+            await asyncio.sleep(delay)
+        yield SimpleNamespace(text=chunk)
+
+
+def _prompt_text(prompt_value) -> str:
+    return prompt_value.to_string() if hasattr(prompt_value, "to_string") else str(prompt_value)
+
+
+class CassetteMiss(LookupError):
+    pass
+
+
+class CassetteBackend(LLMBackend):
+    """Replay (or, with ``inner``, record) responses from a JSONL cassette.
+
+    Each line is ``{"kind", "key", "response", "latency"}``; kind is generate,
+    stream, chat or embed. On replay, recorded latency is slept for scaled by
+    ``latency_scale`` (0 replays instantly). A request that is not on the
+    cassette raises CassetteMiss.
+    """
+    name = "cassette"
+
+    def __init__(self, path: str, inner: Optional[LLMBackend] = None, latency_scale: float = 0.0):
+        self.path = path
+        self.inner = inner
+        self.latency_scale = latency_scale
+        self._entries: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        if inner is None:
+            if not os.path.exists(path):
+                raise FileNotFoundError(
+                    f"LLM cassette {path} not found; record one first, e.g. "
+                    f"python -m benchmarks.bench_peka_paths --record {path}"
+                )
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries[entry["key"]] = entry
+            logger.info(f"Loaded {len(self._entries)} recorded LLM responses from {path}")
+        self.client = _CassetteClient(self)
+        self.chat_model = RunnableLambda(self._chat)
+
+    @staticmethod
+    def key(kind: str, prompt: str, params: Dict) -> str:
+        payload = json.dumps([kind, prompt, params], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _record(self, kind: str, key: str, response: Any, latency: float) -> None:
+        entry = {"kind": kind, "key": key, "response": response, "latency": round(latency, 4)}
+        with self._lock:
+            self._entries[key] = entry
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+
+    def _lookup(self, kind: str, key: str, prompt: str) -> Dict:
+        entry = self._entries.get(key)
+        if entry is None:
+            raise CassetteMiss(f"No recorded {kind} response for prompt {prompt[:80]!r}")
+        return entry
+
+    def _chat(self, prompt_value) -> AIMessage:
+        prompt = _prompt_text(prompt_value)
+        key = self.key("chat", prompt, {})
+        if self.inner is not None:
+            start = time.perf_counter()
+            message = self.inner.chat_model.invoke(prompt_value)
+            self._record("chat", key, message.content, time.perf_counter() - start)
+            return message
+        entry = self._lookup("chat", key, prompt)
+        # Chains run on PekaService's thread pool, so a blocking sleep is what the real model does too
+        time.sleep(entry["latency"] * self.latency_scale)
+        return AIMessage(content=entry["response"])
+
+    async def close(self) -> None:
+        if self.inner is not None:
+            await self.inner.close()
+
+
+class _CassetteClient:
+    def __init__(self, backend: CassetteBackend):
+        self.backend = backend
+
+    async def generate(self, prompt: str, stream: bool = False, **params):
+        backend = self.backend
+        kind = "stream" if stream else "generate"
+        key = backend.key(kind, prompt, params)
+        if backend.inner is not None:
+            start = time.perf_counter()
+            response = await backend.inner.client.generate(prompt=prompt, stream=stream, **params)
+            if not stream:
+                backend._record(kind, key, response.generations[0].text, time.perf_counter() - start)
+                return response
+            chunks = [token.text async for token in response if token.text]
+            backend._record(kind, key, chunks, time.perf_counter() - start)
+            return _token_stream(chunks)
+        entry = backend._lookup(kind, key, prompt)
+        if not stream:
+            await asyncio.sleep(entry["latency"] * backend.latency_scale)
+            return _generation(entry["response"])
+        chunks = entry["response"]
+        return _token_stream(chunks, entry["latency"] * backend.latency_scale / max(1, len(chunks)))
+
+    async def embed(self, texts: List[str], **params):
+        backend = self.backend
+        key = backend.key("embed", json.dumps(texts), params)
+        if backend.inner is not None:
+            start = time.perf_counter()
+            response = await backend.inner.client.embed(texts=texts, **params)
+            backend._record("embed", key, response.embeddings, time.perf_counter() - start)
+            return response
+        entry = backend._lookup("embed", key, texts[0])
+        await asyncio.sleep(entry["latency"] * backend.latency_scale)
+        return SimpleNamespace(embeddings=entry["response"])
+
+    async def close(self) -> None:
+        pass
+
+
+class SyntheticUpstreamError(Exception):
+    """A simulated provider failure; retryable like a real 503."""
+    http_status = 503
+
+
+_QUOTED_QUERY_RE = re.compile(r'(?:Query|The user said|The user has asked): "(.*)"')
+_TASK_ID_RE = re.compile(r'\{"id":(\d+)')
+_TITLE_RE = re.compile(r"^Title: (.*)$", re.MULTILINE)
+_PRIORITY_RE = re.compile(r"^Priority: (\w+)", re.MULTILINE)
+_DURATION_RE = re.compile(r"^Estimated Duration: (\d+)", re.MULTILINE)
+_CREATE_RE = re.compile(r"\b(add|create|remind|reminder|schedule|todo|task to|plan)\b", re.IGNORECASE)
+_ANALYZE_RE = re.compile(r"\b(how am i|progress|prioriti[sz]e|analy[sz]e|review my|what should i do)\b", re.IGNORECASE)
+
+GENERAL_ANSWER = (
+    "Break the work into short focused blocks and start with the smallest next step. "
+    "Protect one distraction-free hour a day for your most important task."
+)
+GENERAL_ACTIONS = ["Pick one task to start now", "Set a 25 minute timer", "Silence notifications"]
+
+
+def _query_of(prompt: str) -> str:
+    # The last quoted query is the current one; earlier turns may quote others
+    matches = _QUOTED_QUERY_RE.findall(prompt)
+    return matches[-1] if matches else ""
+
+
+def synthetic_intent(query: str) -> str:
+    if _CREATE_RE.search(query):
+        return "create"
+    if _ANALYZE_RE.search(query):
+        return "analyze"
+    return "general"
+
+
+def synthetic_response(kind: str, prompt: str, params: Dict) -> str:
+    """A plausible, schema-valid response for whichever Peka prompt this is."""
+    if kind == "chat":
+        if '"sorted_tasks"' in prompt:
+            ids = [int(i) for i in _TASK_ID_RE.findall(prompt)] or [0]
+            return json.dumps({
+                "sorted_tasks": ids,
+                "top_recommendation": {"task_id": ids[0], "reason": "It is the most urgent task on your list."},
+                "explanation": "Start with the high-priority work, then clear the quick wins.",
+            })
+        if "Estimated Duration:" in prompt:
+            title = _TITLE_RE.search(prompt)
+            priority = _PRIORITY_RE.search(prompt)
+            duration = _DURATION_RE.search(prompt)
+            return json.dumps({
+                "title": title.group(1) if title else "Task",
+                "description": "Block time for it and gather what you need first.",
+                "priority": priority.group(1) if priority else "medium",
+                "estimated_duration": int(duration.group(1)) if duration else 30,
+                "message": "Your task is ready. Schedule it early in the day.",
+            })
+        return json.dumps({"response": GENERAL_ANSWER, "action_items": GENERAL_ACTIONS,
+                           "timestamp": "2024-01-01T00:00:00"})
+    if "Summarize this conversation" in prompt:
+        return "The user is planning their week and asked for help prioritizing tasks."
+    if "explain this ordering" in prompt:
+        return "Your most important task comes first; the short ones after it are quick wins to keep momentum."
+    query = _query_of(prompt)
+    intent = synthetic_intent(query)
+    if params.get("max_tokens", 0) <= 10:
+        return intent
+    if kind == "stream":
+        return GENERAL_ANSWER + "\n" + "\n".join(f"- {item}" for item in GENERAL_ACTIONS)
+    return json.dumps({
+        "intent": intent,
+        "task_details": {"title": query[:80] or "Task", "description": "", "priority": "medium",
+                         "estimated_duration": 30} if intent == "create" else None,
+        "message": "I've created that task for you." if intent == "create" else "Here is what I suggest:",
+        "action_items": GENERAL_ACTIONS[:2],
+    })
+
+
+class SyntheticBackend(LLMBackend):
+    """Canned responses with log-normal latency (median ``latency_ms``, spread ``sigma``)
+    and ``failure_rate`` of calls raising SyntheticUpstreamError."""
+    name = "synthetic"
+
+    def __init__(
+        self,
+        latency_ms: float = 300.0,
+        sigma: float = 0.5,
+        failure_rate: float = 0.0,
+        seed: Optional[int] = None,
+        stream_chunks: int = 20,
+        responder: Callable[[str, str, Dict], str] = synthetic_response,
+    ):
+        self.latency_ms = latency_ms
+        self.sigma = sigma
+        self.failure_rate = failure_rate
+        self.stream_chunks = stream_chunks
+        self.responder = responder
+        self._rng = random.Random(seed)
+        self.client = _SyntheticClient(self)
+        self.chat_model = RunnableLambda(self._chat)
+
+    def latency(self) -> float:
+        return self._rng.lognormvariate(0, self.sigma) * self.latency_ms / 1000 if self.latency_ms else 0.0
+
+    def maybe_fail(self) -> None:
+        if self.failure_rate and self._rng.random() < self.failure_rate:
+            raise SyntheticUpstreamError("Synthetic upstream failure (503)")
+
+    def _chat(self, prompt_value) -> AIMessage:
+        time.sleep(self.latency())
+        self.maybe_fail()
+        return AIMessage(content=self.responder("chat", _prompt_text(prompt_value), {}))
+
+
+class _SyntheticClient:
+    def __init__(self, backend: SyntheticBackend):
+        self.backend = backend
+
+    async def generate(self, prompt: str, stream: bool = False, **params):
+        backend = self.backend
+        latency = backend.latency()
+        if not stream:
+            await asyncio.sleep(latency)
+            backend.maybe_fail()
+            return _generation(backend.responder("generate", prompt, params))
+        # Time to first token is about a fifth of the total, the rest is spread over the chunks
+        await asyncio.sleep(latency / 5)
+        backend.maybe_fail()
+        words = backend.responder("stream", prompt, params).split(" ")
+        size = max(1, len(words) // backend.stream_chunks)
+        chunks = [" ".join(words[i:i + size]) + " " for i in range(0, len(words), size)]
+        return _token_stream(chunks, latency * 4 / 5 / len(chunks))
+
+    async def embed(self, texts: List[str], **params):
+        await asyncio.sleep(self.backend.latency() / 4)
+        self.backend.maybe_fail()
+        vectors = []
+        for text in texts:
+            digest = hashlib.sha256(text.lower().encode()).digest()
+            vectors.append([byte / 255 - 0.5 for byte in digest])
+        return SimpleNamespace(embeddings=vectors)
+
+    async def close(self) -> None:
+        pass
+
+
+def create_backend(name: str, api_key: Optional[str]) -> LLMBackend:
+    """Build the backend PEKA_LLM_BACKEND names: cohere, cassette or synthetic."""
+    if name == "cohere":
+        return CohereBackend(api_key)
+    if name == "cassette":
+        return CassetteBackend(PEKA_LLM_CASSETTE)
+    if name == "synthetic":
+        return SyntheticBackend(latency_ms=PEKA_SYNTHETIC_LATENCY_MS, failure_rate=PEKA_SYNTHETIC_FAILURE_RATE)
+    raise ValueError(f"Unknown LLM backend {name!r}")
@@ -0,0 +1,177 @@
+"""Fair-share admission control for Peka LLM work.
+
+A global cap bounds how many requests hold an LLM slot at once. Waiting requests
+sit in one of two lanes - ``interactive`` (user-facing queries) and ``batch``
+(background/precompute work) - and interactive work is always dispatched first,
+while batch work is additionally capped so it can never occupy every slot.
+Within a lane, users are served by weighted fair queuing: each request is tagged
+with a virtual finish time ``max(lane_clock, user_last_finish) + 1 / weight``
+and the smallest tag runs next, so a user looping on /analyze only delays
+their own requests.
+
+When the queue is full the request is rejected immediately with 503 and a
+Retry-After estimate instead of waiting into a timeout.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, List
+
+from fastapi import HTTPException, status
+
+from core.metrics import metrics
+
+LANES = ("interactive", "batch")
+# Used for Retry-After until real service times have been observed
+DEFAULT_SERVICE_SECONDS = 5.0
+
+
+class _Waiter:
+    __slots__ = ("future", "user_id", "lane", "enqueued_at", "cancelled")
+
+    def __init__(self, future: asyncio.Future, user_id, lane: str):
+        self.future = future
+        self.user_id = user_id
+        self.lane = lane
+        self.enqueued_at = time.perf_counter()
+        self.cancelled = False
+
+
+class LLMScheduler:
+    def __init__(self, max_concurrency: int, max_queue_depth: int, max_batch_concurrency: int):
+        self.max_concurrency = max_concurrency
+        self.max_queue_depth = max_queue_depth
+        self.max_batch_concurrency = max(1, min(max_batch_concurrency, max_concurrency))
+        self._queues: Dict[str, List] = {lane: [] for lane in LANES}
+        self._queued: Dict[str, int] = {lane: 0 for lane in LANES}
+        self._running: Dict[str, int] = {lane: 0 for lane in LANES}
+        self._clock: Dict[str, float] = {lane: 0.0 for lane in LANES}
+        self._user_finish: Dict[str, Dict] = {lane: {} for lane in LANES}
+        self._sequence = itertools.count()
+
+    @property
+    def running(self) -> int:
+        return sum(self._running.values())
+
+    @property
+    def queued(self) -> int:
+        return sum(self._queued.values())
+
+    def _can_start(self, lane: str) -> bool:
+        if self.running >= self.max_concurrency:
+            return False
+        return lane != "batch" or self._running["batch"] < self.max_batch_concurrency
+
+    def _retry_after(self) -> int:
+        service = metrics.percentile("peka.scheduler.service", 50) or DEFAULT_SERVICE_SECONDS
+        return max(1, math.ceil(service * (self.queued + 1) / self.max_concurrency))
+
+    def _publish(self) -> None:
+        metrics.set_gauge("peka.scheduler.running", self.running)
+        for lane in LANES:
+            metrics.set_gauge(f"peka.scheduler.{lane}.queue_depth", self._queued[lane])
+
+    def _start(self, lane: str) -> None:
+        self._running[lane] += 1
+        self._publish()
+
+    def _dispatch(self) -> None:
+        for lane in LANES:
+            queue = self._queues[lane]
+            while queue and self._can_start(lane):
+                tag, _, waiter = heapq.heappop(queue)
+                if waiter.cancelled:
+                    continue
+                self._queued[lane] -= 1
+                self._clock[lane] = tag
+                metrics.observe(f"peka.scheduler.{lane}.wait", time.perf_counter() - waiter.enqueued_at)
+                self._start(lane)
+                waiter.future.set_result(None)
+        self._publish()
+
+    def _tag(self, user_id, lane: str, weight: float) -> float:
+        finish = self._user_finish[lane]
+        tag = max(self._clock[lane], finish.get(user_id, 0.0)) + 1.0 / max(weight, 1e-3)
+        finish[user_id] = tag
+        return tag
+
+    async def _acquire(self, user_id, lane: str, weight: float) -> None:
+        if not self._queued[lane] and self._can_start(lane):
+            self._tag(user_id, lane, weight)
+            metrics.observe(f"peka.scheduler.{lane}.wait", 0.0)
+            self._start(lane)
+            return
+
+        if self.queued >= self.max_queue_depth:
+            metrics.increment(f"peka.scheduler.{lane}.rejected")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Peka is busy right now. Please try again shortly.",
+                headers={"Retry-After": str(self._retry_after())},
+            )
+
+        tag = self._tag(user_id, lane, weight)
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), user_id, lane)
+        heapq.heappush(self._queues[lane], (tag, next(self._sequence), waiter))
+        self._queued[lane] += 1
+        self._publish()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Granted just as we were cancelled: hand the slot back
+                self._release(lane)
+            else:
+                waiter.cancelled = True
+                self._queued[lane] -= 1
+                self._publish()
+            raise
+
+    def _release(self, lane: str) -> None:
+        self._running[lane] -= 1
+        # Forget fairness state for users with nothing queued once the lane drains
+        if not self._queued[lane] and not self._running[lane]:
+            self._user_finish[lane].clear()
+        self._dispatch()
+
+    async def acquire(self, user_id, lane: str = "interactive", weight: float = 1.0) -> Callable[[], None]:
+        """Wait for an LLM slot; returns an idempotent release function.
+
+        For work whose lifetime does not fit a single block (e.g. a streamed
+        response that outlives the route handler); otherwise use ``slot``.
+        """
+        if lane not in LANES:
+            raise ValueError(f"Unknown scheduler lane: {lane}")
+        await self._acquire(user_id, lane, weight)
+        start = time.perf_counter()
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            if released:
+                return
+            released = True
+            metrics.observe("peka.scheduler.service", time.perf_counter() - start)
+            self._release(lane)
+
+        return release
+
+    @asynccontextmanager
+    async def slot(self, user_id, lane: str = "interactive", weight: float = 1.0):
+        """Hold one LLM slot for the duration of the block."""
+        release = await self.acquire(user_id, lane, weight)
+        try:
+            yield
+        finally:
+            release()
+
+    def stats(self) -> Dict:
+        return {
+            "running": dict(self._running),
+            "queued": dict(self._queued),
+            "max_concurrency": self.max_concurrency,
+            "max_queue_depth": self.max_queue_depth,
+        }
@@ -1,296 +1,578 @@
-from langchain_community.chat_models import ChatCohere
 from langchain.prompts import ChatPromptTemplate
-from langchain.output_parsers import PydanticOutputParser
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import json
-from typing import List, Optional, Dict, Union
-from schemas.peka import Task, TaskRecommendation, PekaResponse, GeneralResponse
+import asyncio
+import contextvars
+from contextlib import aclosing
+import time
+from typing import AsyncIterator, List, Optional, Dict, Set, Tuple, Type, Union
+from schemas.peka import Task, TaskRecommendation, PekaResponse, GeneralResponse, TaskCreationResponse, TaskDetails, UnifiedResponse
 from fastapi import HTTPException
 import logging
 from pydantic import BaseModel
-import cohere
+from core.config import (
+    PEKA_LLM_THREADS, PEKA_INTENT_CONFIDENCE, PEKA_SPECULATIVE,
+    PEKA_CACHE_TTL, PEKA_CACHE_MAX_ENTRIES, PEKA_CACHE_MAX_BYTES,
+    PEKA_CACHE_SEMANTIC, PEKA_CACHE_SIMILARITY, PEKA_EMBED_MODEL, PEKA_ANALYZE_MODE,
+    PEKA_PROMPT_TASK_TOKENS, PEKA_PROMPT_QUERY_CHARS, PEKA_PROMPT_DESCRIPTION_CHARS,
+    PEKA_REQUEST_DEADLINE, PEKA_LLM_RETRIES, PEKA_RETRY_BASE_SECONDS,
+    PEKA_BREAKER_FAILURES, PEKA_BREAKER_RESET_SECONDS, PEKA_HEDGE, PEKA_HEDGE_MIN_SAMPLES,
+    PEKA_ANALYZE_MAX_TASKS, PEKA_RECOMMENDATION_MAX_AGE, PEKA_SERVE_STORED_RECOMMENDATIONS,
+    PEKA_MEMORY_MAX_USERS, PEKA_MEMORY_TTL, PEKA_MEMORY_TURN_TOKENS, PEKA_MEMORY_SUMMARY_TOKENS,
+    PEKA_LLM_BACKEND,
+)
+from core.metrics import metrics
+from services.intent_classifier import get_intent_classifier
+from services.response_cache import ResponseCache, InMemoryResponseCacheBackend
+from services.task_scoring import analyze_locally
+from services.analysis_cache import analysis_cache, task_set_hash
+from services.llm_backends import LLMBackend, create_backend
+from services.conversation_memory import Conversation, ConversationMemory, Turn, clip_tokens, extractive_summary, refers_back
+from services.single_flight import SingleFlight, make_key
+from services.prompt_builder import TASK_LEGEND, record_prompt, serialize_tasks, truncate
+from services.resilience import (
+    CircuitBreaker,
+    DeadlineExceeded,
+    UpstreamCaller,
+    UpstreamUnavailable,
+    deadline,
+    expires_in,
+)
+from services.structured_output import StructuredOutputError, parse_structured
+from services.todo_service import get_tasks_for_analysis
+from repositories.recommendation_repo import get_recommendation
 
 logger = logging.getLogger(__name__)
 
+def upstream_http_error(e: UpstreamUnavailable) -> HTTPException:
+    """503 (circuit open) or 504 (deadline exceeded), with Retry-After when known."""
+    return HTTPException(status_code=e.status_code, detail=e.detail, headers=e.headers)
+
 class PekaService:
-    def __init__(self, cohere_api_key: str):
+    def __init__(
+        self,
+        cohere_api_key: str,
+        general_cache: Optional[ResponseCache] = None,
+        memory: Optional[ConversationMemory] = None,
+        backend: Optional[LLMBackend] = None,
+    ):
         try:
-            if not cohere_api_key:
-                raise ValueError("Cohere API key is not provided")
-            
-            logger.info("Initializing PekaService with Cohere API")
-            logger.debug(f"Using Cohere API key: {cohere_api_key[:5]}...")
-            
-            # Initialize Cohere client with timeout settings
-            self.client = cohere.Client(
-                api_key=cohere_api_key,
-                timeout=30  # 30 second timeout
+            # The real Cohere API unless a backend is passed or PEKA_LLM_BACKEND picks another
+            self.backend = backend or create_backend(PEKA_LLM_BACKEND, cohere_api_key)
+            logger.info(f"Initializing PekaService with the {self.backend.name} LLM backend")
+            self.client = self.backend.client
+            self.llm = self.backend.chat_model
+
+            # ChatCohere's non-streaming async path still uses the sync client, so
+            # LangChain chains run on a small bounded pool instead of the event loop
+            self._executor = ThreadPoolExecutor(
+                max_workers=PEKA_LLM_THREADS,
+                thread_name_prefix="peka-llm"
             )
             
-            # Test the connection
-            try:
-                self.client.generate(
-                    prompt="Test connection",
-                    max_tokens=1,
-                    temperature=0.1,
-                    k=0,
-                    stop_sequences=["\n"],
-                    return_likelihoods='NONE'
-                )
-                logger.info("Successfully connected to Cohere API")
-            except Exception as e:
-                logger.error(f"Failed to connect to Cohere API: {str(e)}")
-                raise HTTPException(
-                    status_code=503,
-                    detail="Failed to connect to Cohere API. Please check your internet connection and API key."
-                )
-            
-            self.llm = ChatCohere(
-                model="command",
-                temperature=0.7,
-                cohere_api_key=cohere_api_key,
-                verbose=True,
-                streaming=False,
-                timeout=30  # 30 second timeout
+            self.intent_classifier = get_intent_classifier()
+
+            # Double-clicks and client retries share one upstream call
+            self._single_flight = SingleFlight()
+
+            # Every Cohere call goes through one breaker, so a degraded provider fails fast
+            self._upstream = UpstreamCaller(
+                CircuitBreaker("peka.breaker", PEKA_BREAKER_FAILURES, PEKA_BREAKER_RESET_SECONDS),
+                retries=PEKA_LLM_RETRIES,
+                backoff_base=PEKA_RETRY_BASE_SECONDS,
+                hedge=PEKA_HEDGE,
+                hedge_min_samples=PEKA_HEDGE_MIN_SAMPLES,
             )
-            logger.debug("ChatCohere model initialized")
-            
-            self.task_parser = PydanticOutputParser(pydantic_object=PekaResponse)
-            self.general_parser = PydanticOutputParser(pydantic_object=GeneralResponse)
-            logger.debug("Output parsers initialized")
+
+            # Cache for general-intent answers; pass general_cache to use a shared backend
+            self.general_cache = general_cache or ResponseCache(
+                InMemoryResponseCacheBackend(PEKA_CACHE_MAX_ENTRIES, PEKA_CACHE_TTL, PEKA_CACHE_MAX_BYTES),
+                embedder=self._embed_text if PEKA_CACHE_SEMANTIC else None,
+                min_similarity=PEKA_CACHE_SIMILARITY,
+            )
+
+            # Per-user conversation state for handle_query/stream_query
+            self.memory = memory or ConversationMemory(
+                PEKA_MEMORY_MAX_USERS, PEKA_MEMORY_TTL, PEKA_MEMORY_TURN_TOKENS, PEKA_MEMORY_SUMMARY_TOKENS
+            )
+            self._background: Set[asyncio.Task] = set()
+
+            # Chains return raw text; services.structured_output validates it against the schemas
+            self.json_prompt = ChatPromptTemplate.from_messages([
+                ("system", "You are Peka, an AI productivity assistant. Always respond with valid JSON."),
+                ("user", "{input}")
+            ])
             
             logger.info("PekaService initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize PekaService: {str(e)}")
             logger.exception("Full traceback:")
+            raise
+
+    async def close(self) -> None:
+        """Stop memory compactions, then release the LLM backend and the chain worker threads."""
+        for task in self._background:
+            task.cancel()
+        await asyncio.gather(*self._background, return_exceptions=True)
+        await self.backend.close()
+        self._executor.shutdown(wait=False)
+
+    async def _generate(self, prompt: str, **params) -> str:
+        """Run a Cohere generate call and return the text of the first generation.
+
+        Identical concurrent calls (same prompt and parameters) share one upstream request,
+        which is retried, hedged and bounded by the request deadline through self._upstream.
+        """
+        async def attempt():
+            response = await self.client.generate(prompt=prompt, **params)
+            return response.generations[0].text
+
+        async def call():
+            return await self._upstream.call("generate", attempt)
+
+        return await self._single_flight.do(make_key("generate", prompt, params), call)
+
+    async def _generate_stream(
+        self, prompt: str, expires_at: Optional[float] = None, **params
+    ) -> AsyncIterator[str]:
+        """Yield generated text chunks as Cohere produces them.
+
+        Only opening the stream is retried; once tokens flow a failure ends the stream.
+        The whole stream, not only opening it, must finish by expires_at (default: the
+        request deadline from now), or it is closed and a 504 is raised.
+        """
+        if expires_at is None:
+            expires_at = expires_in(PEKA_REQUEST_DEADLINE)
+        try:
+            with deadline(expires_at):
+                stream = await self._upstream.call(
+                    "generate_stream",
+                    lambda: self.client.generate(prompt=prompt, stream=True, **params),
+                    hedge=False
+                )
+        except UpstreamUnavailable as e:
+            raise upstream_http_error(e)
+        tokens = stream.__aiter__()
+        try:
+            while True:
+                try:
+                    # The Cohere client's own timeout only bounds its retries, not a stalled stream
+                    token = await asyncio.wait_for(tokens.__anext__(), max(0.0, expires_at - time.monotonic()))
+                except StopAsyncIteration:
+                    return
+                except asyncio.TimeoutError:
+                    metrics.increment("peka.stream.deadline_exceeded")
+                    raise upstream_http_error(DeadlineExceeded("The AI service did not respond in time."))
+                if token.text:
+                    yield token.text
+        finally:
+            # Also on a deadline, an error, or the consumer closing or cancelling us (client gone)
+            await self._close_stream(stream, tokens)
+
+    @staticmethod
+    async def _close_stream(stream, tokens) -> None:
+        """End a token stream and close Cohere's HTTP response, so the generation stops upstream."""
+        aclose = getattr(tokens, "aclose", None)
+        if aclose is not None:
+            await aclose()
+        response = getattr(stream, "response", None)
+        if response is not None:
+            response.close()
+
+    async def _embed_text(self, text: str) -> List[float]:
+        """Embed a short query with Cohere for semantic cache lookups."""
+        response = await self._upstream.call(
+            "embed",
+            lambda: self.client.embed(texts=[text], model=PEKA_EMBED_MODEL, input_type="search_query")
+        )
+        return response.embeddings[0]
+
+    async def _invoke_chain(self, name: str, chain, chain_input: Dict):
+        """Invoke a LangChain chain on the bounded executor, coalescing identical concurrent calls by name and input."""
+        async def call():
+            loop = asyncio.get_running_loop()
+            return await self._upstream.call(
+                f"chain.{name}", lambda: loop.run_in_executor(self._executor, chain.invoke, chain_input)
+            )
+
+        return await self._single_flight.do(make_key("chain", name, chain_input), call)
+
+    async def _invoke_structured(
+        self, name: str, model: Type[BaseModel], user_input: str, defaults=None
+    ) -> BaseModel:
+        """Run the JSON chat chain and validate its output against model (see parse_structured)."""
+        message = await self._invoke_chain(name, self.json_prompt | self.llm, {"input": user_input})
+        return parse_structured(name, message.content, model, defaults, retry_key=make_key(name, user_input))
+
+    async def check_connection(self) -> bool:
+        """Verify the Cohere API is reachable. Used by the startup/readiness probes, never per request."""
+        try:
+            await self._generate(
+                "Test connection",
+                max_tokens=1,
+                temperature=0.1,
+                k=0,
+                stop_sequences=["\n"],
+                return_likelihoods='NONE'
+            )
+            logger.info("Successfully connected to Cohere API")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to connect to Cohere API: {str(e)}")
+            return False
+
+    async def handle_query(self, query: str, bypass_cache: bool = False, user_id: Optional[int] = None) -> Dict:
+        """Handle any type of query and return a unified response using a single Cohere API call.
+
+        user_id is needed for 'analyze' queries, which load that user's open tasks, and
+        for conversation memory: the user's earlier turns are sent along with the query.
+        """
+        try:
+            with metrics.timer("peka.query.total"), deadline(expires_in(PEKA_REQUEST_DEADLINE)):
+                return await self._handle_query(query, bypass_cache, user_id)
+        except HTTPException:
+            raise
+        except UpstreamUnavailable as e:
+            raise upstream_http_error(e)
+        except Exception as e:
+            logger.error(f"Error in handle_query: {str(e)}")
+            logger.exception("Full traceback:")
             raise HTTPException(
                 status_code=500,
-                detail=f"Failed to initialize Peka service: {str(e)}"
+                detail=f"Failed to process query: {str(e)}"
             )
 
-    async def handle_query(self, query: str) -> Dict:
-        """Handle any type of query and return a unified response using a single Cohere API call."""
+    async def _handle_query(self, query: str, bypass_cache: bool = False, user_id: Optional[int] = None) -> Dict:
+        context = self.memory.context(user_id)
+        intent, response_data = await self._resolve_intent(query, context)
+        response_data = await self._complete_query(query, intent, response_data, bypass_cache, user_id, context)
+        self._remember(user_id, query, response_data)
+        return response_data
+
+    def _remember(self, user_id: Optional[int], query: str, response_data: Dict) -> None:
+        """Add the exchange to the user's conversation and compact older turns in the background."""
+        if user_id is None:
+            return
+        conversation = self.memory.record(user_id, query, response_data.get("message", ""))
+        if conversation.overflow and not conversation.compacting:
+            conversation.compacting = True
+            # A fresh context, so the summary is not bound by this request's deadline
+            task = asyncio.create_task(self._compact_memory(conversation), context=contextvars.Context())
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+
+    async def _compact_memory(self, conversation: Conversation) -> None:
+        """Fold overflowed turns into the running summary, falling back to a local summary."""
         try:
-            # First, detect the intent
-            intent = self.detect_query_intent(query)
-            logger.info(f"Detected intent: {intent}")
-
-            # If it's a general query, handle it differently
-            if intent == "general":
+            while conversation.overflow:
+                turns, conversation.overflow = conversation.overflow, []
+                metrics.increment("peka.memory.compactions")
                 try:
-                    general_response = await self.handle_general_query(query)
-                    return {
-                        "intent": "general",
-                        "task_details": None,
-                        "message": general_response.response,
-                        "action_items": general_response.action_items,
-                        "timestamp": datetime.utcnow().isoformat()
-                    }
+                    with deadline(expires_in(PEKA_REQUEST_DEADLINE)):
+                        summary = await self._generate(
+                            self._create_summary_prompt(conversation.summary, turns),
+                            max_tokens=PEKA_MEMORY_SUMMARY_TOKENS,
+                            temperature=0.2,
+                            k=0,
+                            return_likelihoods='NONE'
+                        )
+                    summary = clip_tokens(summary.strip(), PEKA_MEMORY_SUMMARY_TOKENS)
+                    if not summary:
+                        raise ValueError("empty summary")
                 except Exception as e:
-                    logger.error(f"Failed to handle general query: {str(e)}")
-                    return {
-                        "intent": "general",
-                        "task_details": None,
-                        "message": "I'm here to help! What would you like to know about productivity or task management?",
-                        "action_items": ["Ask about productivity tips", "Get help with task management", "Learn about time management"],
-                        "timestamp": datetime.utcnow().isoformat()
-                    }
-
-            # For create and analyze intents, proceed with the existing prompt
-            prompt = f"""You are Peka, a friendly AI assistant. The user said: "{query}"
-
-Figure out what they want and respond in JSON format. They might use casual language, typos, or slang - that's okay!
-
-IMPORTANT: You must classify the intent as one of these three:
-
-1. "create" - ONLY if they explicitly want to:
-   - Create a task, todo, or reminder
-   - Schedule something for a specific time
-   - Set a deadline for something
-   - Add something to their list
-   - Plan an activity
-
-2. "analyze" - if they want to:
-   - Check their progress
-   - Review their tasks
-   - Get insights about their productivity
-   - See task statistics
-   - Get recommendations
-   - Need help prioritizing tasks
-   - Ask what tasks they should do
-   - Get task management advice
-
-3. "general" - for ANY other type of query or question
-
-CRITICAL: For task creation, you MUST:
-1. Extract the EXACT time duration if mentioned by the user (e.g., "30 minutes", "2 hours", "1.5 hours")
-2. Convert the duration to minutes
-3. Use that exact duration in estimated_duration
-4. If no duration is specified, only then use a default of 30 minutes
-
-Examples:
-
-For "create" intent with duration:
-User: "Create a task for studying for 45 minutes"
-{{
-    "intent": "create",
-    "task_details": {{
-        "title": "Study Session",
-        "description": "Focused study session",
-        "priority": "medium",
-        "estimated_duration": 45
-    }},
-    "message": "I've created a task for your 45-minute study session.",
-    "action_items": ["Prepare study materials", "Find a quiet place", "Set a timer for 45 minutes"]
-}}
-
-User: "Add a 2 hour task for project planning"
-{{
-    "intent": "create",
-    "task_details": {{
-        "title": "Project Planning",
-        "description": "Detailed project planning session",
-        "priority": "high",
-        "estimated_duration": 120
-    }},
-    "message": "I've created a task for 2 hours of project planning.",
-    "action_items": ["Gather project requirements", "Set up planning documents", "Schedule any necessary meetings"]
-}}
-
-For "create" intent without duration (use default):
-User: "Create a task to call John"
-{{
-    "intent": "create",
-    "task_details": {{
-        "title": "Call John",
-        "description": "Make a phone call to John",
-        "priority": "medium",
-        "estimated_duration": 30
-    }},
-    "message": "I've created a task for calling John with a default duration of 30 minutes.",
-    "action_items": ["Prepare any topics to discuss", "Find a quiet time to call"]
-}}
-
-For "analyze" intent:
-{{
-    "intent": "analyze",
-    "task_details": null,
-    "message": "Let me analyze your tasks and provide personalized recommendations.",
-    "action_items": ["Review your task list", "Check task priorities", "Update task statuses"]
-}}
-
-For "general" intent:
-{{
-    "intent": "general",
-    "task_details": null,
-    "message": "Here are some tips to boost your productivity:",
-    "action_items": ["Create a daily schedule", "Take regular breaks", "Set clear goals"]
-}}
-
-IMPORTANT: Your response must be a complete, valid JSON object. Do not include any text before or after the JSON. Do not use markdown code blocks. Do not include any comments in the JSON."""
-
+                    logger.warning(f"Conversation summary failed, summarizing locally: {str(e)}")
+                    metrics.increment("peka.memory.summary_fallbacks")
+                    summary = extractive_summary(conversation.summary, turns, PEKA_MEMORY_SUMMARY_TOKENS)
+                conversation.summary = summary
+        finally:
+            conversation.compacting = False
+
+    async def _resolve_intent(self, query: str, context: str = "") -> Tuple[str, Optional[Dict]]:
+        """Detect the intent - locally when confident, otherwise via Cohere.
+
+        Also returns the unified response when speculative mode already produced it.
+        """
+        response_data = None
+        intent = self._local_intent(query)
+        if intent is None:
+            if PEKA_SPECULATIVE:
+                intent, response_data = await self._speculative_intent(query, context)
+            else:
+                with metrics.timer("peka.stage.intent"):
+                    intent = await self._detect_query_intent_llm(query)
+        logger.info(f"Detected intent: {intent}")
+        return intent, response_data
+
+    async def _complete_query(
+        self,
+        query: str,
+        intent: str,
+        response_data: Optional[Dict],
+        bypass_cache: bool = False,
+        user_id: Optional[int] = None,
+        context: str = "",
+    ) -> Dict:
+        # If it's a general query, handle it differently
+        if intent == "general":
             try:
-                # Single API call to handle everything
-                response = self.client.generate(
-                    prompt=prompt,
-                    max_tokens=1000,  # Increased to ensure complete response
-                    temperature=0.3,
-                    k=0,
-                    stop_sequences=["\n\n"],  # Stop on double newline to ensure complete response
-                    return_likelihoods='NONE'
-                )
+                with metrics.timer("peka.stage.general"):
+                    general_response = await self.handle_general_query(
+                        query, bypass_cache=bypass_cache, context=context
+                    )
+                return {
+                    "intent": "general",
+                    "task_details": None,
+                    "message": general_response.response,
+                    "action_items": general_response.action_items,
+                    "timestamp": datetime.utcnow().isoformat()
+                }
             except Exception as e:
-                logger.error(f"Failed to generate response from Cohere: {str(e)}")
-                raise HTTPException(
-                    status_code=503,
-                    detail="Failed to connect to Cohere API. Please try again later."
-                )
-            
-            # Clean the response text to ensure it's valid JSON
-            response_text = response.generations[0].text.strip()
-            # Remove any markdown code block markers if present
-            response_text = response_text.replace('```json', '').replace('```', '').strip()
-            
-            try:
-                response_data = json.loads(response_text)
-            except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse JSON response: {response_text}")
-                logger.error(f"JSON error: {str(e)}")
-                # If JSON parsing fails, return a general response
-                response_data = {
+                logger.error(f"Failed to handle general query: {str(e)}")
+                return {
                     "intent": "general",
                     "task_details": None,
-                    "message": "I'm not sure what you want to do. Could you explain it differently?",
-                    "action_items": ["Try explaining it another way", "Give me more details"]
+                    "message": "I'm here to help! What would you like to know about productivity or task management?",
+                    "action_items": ["Ask about productivity tips", "Get help with task management", "Learn about time management"],
+                    "timestamp": datetime.utcnow().isoformat()
                 }
+
+        # Analyze needs no generated text of its own; the analysis below supplies the message
+        if response_data is None and intent == "analyze":
+            response_data = {
+                "intent": "analyze",
+                "task_details": None,
+                "message": "Let me analyze your tasks and provide personalized recommendations.",
+                "action_items": ["Review your task list", "Check task priorities", "Update task statuses"]
+            }
+        elif response_data is None:
+            with metrics.timer("peka.stage.unified"):
+                response_data = await self._generate_unified_response(query, context)
+
+        # Add timestamp
+        response_data['timestamp'] = datetime.utcnow().isoformat()
+        
+        # If the intent is "analyze", we need to make a call to the analyze endpoint
+        if response_data.get('intent') == 'analyze' and user_id is not None:
+            try:
+                # Get the current user's tasks
+                tasks = await self.get_user_tasks(user_id)
+                if tasks:
+                    # Call the analyze endpoint
+                    with metrics.timer("peka.stage.analyze"):
+                        analyze_response = await self.analyze_tasks(tasks, user_id=user_id)
+                    # Merge the analyze response with our current response
+                    response_data.update({
+                        'message': analyze_response.explanation,
+                        'action_items': analyze_response.top_recommendation.reason.split('. ') if analyze_response.top_recommendation else []
+                    })
+            except Exception as e:
+                logger.error(f"Failed to analyze tasks: {str(e)}")
+                # If analysis fails, keep the original response but add a note
+                response_data['message'] = "I tried to analyze your tasks but encountered an error. " + response_data['message']
+        
+        # Validate task details if present
+        if response_data.get('task_details'):
+            task_data = response_data['task_details']
+            task_data['priority'] = task_data.get('priority', 'low').lower()
+            if task_data['priority'] not in ['high', 'medium', 'low']:
+                task_data['priority'] = 'low'
             
-            # Add timestamp
-            response_data['timestamp'] = datetime.utcnow().isoformat()
-            
-            # If the intent is "analyze", we need to make a call to the analyze endpoint
-            if response_data.get('intent') == 'analyze':
-                try:
-                    # Get the current user's tasks
-                    tasks = await self.get_user_tasks()  # You'll need to implement this method
-                    if tasks:
-                        # Call the analyze endpoint
-                        analyze_response = await self.analyze_tasks(tasks)
-                        # Merge the analyze response with our current response
-                        response_data.update({
-                            'message': analyze_response.explanation,
-                            'action_items': analyze_response.top_recommendation.reason.split('. ') if analyze_response.top_recommendation else []
-                        })
-                except Exception as e:
-                    logger.error(f"Failed to analyze tasks: {str(e)}")
-                    # If analysis fails, keep the original response but add a note
-                    response_data['message'] = "I tried to analyze your tasks but encountered an error. " + response_data['message']
-            
-            # Validate task details if present
-            if response_data.get('task_details'):
-                task_data = response_data['task_details']
-                task_data['priority'] = task_data.get('priority', 'low').lower()
-                if task_data['priority'] not in ['high', 'medium', 'low']:
-                    task_data['priority'] = 'low'
-                
-                task_data['estimated_duration'] = max(1, min(
-                    int(task_data.get('estimated_duration', 30)),
-                    1440  # Max 24 hours
-                ))
-            
-            return response_data
+            task_data['estimated_duration'] = max(1, min(
+                int(task_data.get('estimated_duration', 30)),
+                1440  # Max 24 hours
+            ))
+        
+        return response_data
 
-        except HTTPException:
-            raise
+    async def _generate_unified_response(self, query: str, context: str = "") -> Dict:
+        """Run the few-shot unified prompt that classifies the query and extracts task details."""
+        prompt = self._create_query_prompt(query, context)
+
+        try:
+            # Single API call to handle everything
+            response_text = await self._generate(
+                prompt,
+                max_tokens=1000,  # Increased to ensure complete response
+                temperature=0.3,
+                k=0,
+                stop_sequences=["\n\n"],  # Stop on double newline to ensure complete response
+                return_likelihoods='NONE'
+            )
+        except UpstreamUnavailable as e:
+            raise upstream_http_error(e)
         except Exception as e:
-            logger.error(f"Error in handle_query: {str(e)}")
-            logger.exception("Full traceback:")
+            logger.error(f"Failed to generate response from Cohere: {str(e)}")
             raise HTTPException(
-                status_code=500,
-                detail=f"Failed to process query: {str(e)}"
+                status_code=503,
+                detail="Failed to connect to Cohere API. Please try again later."
             )
+        
+        def defaults(data: Dict) -> Dict:
+            # Truncated output keeps whatever fields made it; create still needs usable task details
+            task_defaults = None
+            if data.get("intent") == "create":
+                task_defaults = {"title": truncate(query, 80), "description": "", "priority": "low", "estimated_duration": 30}
+            return {
+                "task_details": task_defaults,
+                "message": "",
+                "action_items": [],
+                "timestamp": datetime.utcnow().isoformat(),
+            }
+
+        try:
+            response_data = parse_structured(
+                "query", response_text, UnifiedResponse, defaults, retry_key=make_key("query", prompt)
+            ).model_dump(mode="json")
+        except StructuredOutputError:
+            # If the output cannot be parsed or repaired, return a general response
+            response_data = {
+                "intent": "general",
+                "task_details": None,
+                "message": "I'm not sure what you want to do. Could you explain it differently?",
+                "action_items": ["Try explaining it another way", "Give me more details"]
+            }
+
+        return response_data
+
+    async def stream_query(
+        self, query: str, bypass_cache: bool = False, user_id: Optional[int] = None
+    ) -> AsyncIterator[Tuple[str, Dict]]:
+        """Yield (event, data) pairs for a query: 'intent' as soon as it is known,
+        'token' chunks of the message as they are generated, then 'final' with the
+        same payload handle_query returns.
+
+        Only general answers are generated token by token; create and analyze need
+        their structured result first, so their message arrives as a single chunk.
+        """
+        start = time.perf_counter()
+        # The deadline is re-entered around each await rather than held across yields,
+        # since the consumer may resume this generator from another context
+        expires_at = expires_in(PEKA_REQUEST_DEADLINE)
+        context = self.memory.context(user_id)
+        with deadline(expires_at):
+            intent, response_data = await self._resolve_intent(query, context)
+        yield "intent", {"intent": intent}
+
+        if intent != "general":
+            with deadline(expires_at):
+                response_data = await self._complete_query(
+                    query, intent, response_data, bypass_cache, user_id, context
+                )
+            self._remember(user_id, query, response_data)
+            yield "token", {"text": response_data.get("message", "")}
+            yield "final", response_data
+            return
+
+        context = self._general_context(query, context)
+        # Answers that depend on earlier turns are neither served from nor stored in the cache
+        cached = None if bypass_cache or context else await self.general_cache.get(query)
+        if cached is not None:
+            message, action_items = cached["response"], cached["action_items"]
+            yield "token", {"text": message}
+        else:
+            chunks = []
+            # aclosing, so closing this generator (the client went away) closes the upstream stream too
+            async with aclosing(self._generate_stream(
+                self._create_general_stream_prompt(query, context),
+                expires_at=expires_at,
+                max_tokens=400,
+                temperature=0.7,
+                k=0,
+                return_likelihoods='NONE'
+            )) as stream:
+                async for chunk in stream:
+                    if not chunks:
+                        metrics.observe("peka.stream.first_token", time.perf_counter() - start)
+                    chunks.append(chunk)
+                    yield "token", {"text": chunk}
+            message = "".join(chunks).strip()
+            action_items = self._extract_action_items(message)
+            if not context:
+                general_response = GeneralResponse(
+                    response=message, action_items=action_items, timestamp=datetime.utcnow()
+                )
+                await self.general_cache.set(query, general_response.model_dump(mode="json"))
+
+        response_data = {
+            "intent": "general",
+            "task_details": None,
+            "message": message,
+            "action_items": action_items,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+        self._remember(user_id, query, response_data)
+        yield "final", response_data
+
+    def _local_intent(self, query: str) -> Optional[str]:
+        """Return the locally classified intent, or None when the classifier is not confident."""
+        prediction = self.intent_classifier.predict(query)
+        if prediction.confidence >= PEKA_INTENT_CONFIDENCE:
+            logger.debug(f"Local intent {prediction.intent} ({prediction.source}, {prediction.confidence:.2f})")
+            metrics.increment("peka.intent.local")
+            return prediction.intent
+        logger.debug(f"Local intent confidence {prediction.confidence:.2f} too low, asking Cohere")
+        return None
+
+    async def detect_query_intent(self, query: str) -> str:
+        """Detect the intent locally, asking Cohere only when the local classifier is unsure."""
+        intent = self._local_intent(query)
+        if intent is not None:
+            return intent
+        return await self._detect_query_intent_llm(query)
 
-    def detect_query_intent(self, query: str) -> str:
+    async def _speculative_intent(self, query: str, context: str = "") -> Tuple[str, Optional[Dict]]:
+        """Run the Cohere intent call and the unified generation concurrently.
+
+        Both calls classify the query, so whichever finishes first decides the intent
+        and the other is cancelled unless it is still needed: the unified response is
+        kept only for 'create', which needs its task details.
+        """
+        async def timed(stage, coro):
+            with metrics.timer(f"peka.stage.{stage}"):
+                return await coro
+
+        intent_task = asyncio.create_task(timed("intent", self._detect_query_intent_llm(query)))
+        unified_task = asyncio.create_task(timed("unified", self._generate_unified_response(query, context)))
+        try:
+            done, _ = await asyncio.wait({intent_task, unified_task}, return_when=asyncio.FIRST_COMPLETED)
+
+            if unified_task in done and unified_task.exception() is None:
+                metrics.increment("peka.speculative.unified_first")
+                intent_task.cancel()
+                response_data = unified_task.result()
+                intent = response_data.get("intent", "general")
+                return intent, response_data if intent == "create" else None
+
+            # The intent call won (or the unified call failed); it never raises
+            metrics.increment("peka.speculative.intent_first")
+            intent = await intent_task
+            if intent == "create":
+                return intent, await unified_task
+            unified_task.cancel()
+            metrics.increment("peka.speculative.discarded")
+            return intent, None
+        finally:
+            for task in (intent_task, unified_task):
+                if not task.done():
+                    task.cancel()
+
+    async def _detect_query_intent_llm(self, query: str) -> str:
         """Detect the intent of the query using Cohere."""
-        prompt = f"""Analyze the following query and determine its intent. The intent should be one of:
-        - 'create': If the user wants to create a new task, schedule something, or add a new item to their list
-        - 'analyze': If the user wants to analyze, review, check status, or get insights about their tasks
-        - 'general': For any other type of query or question
+        metrics.increment("peka.intent.llm")
+        prompt = record_prompt("intent", f"""Classify the query's intent as one of:
+- create: create a task, schedule something or add an item to their list
+- analyze: analyze, review, check status of or get insights about their tasks
+- general: anything else
 
-        Examples:
-        - "create a task for meeting tomorrow" -> create
-        - "add a reminder for dentist appointment" -> create
-        - "how are my tasks going?" -> analyze
-        - "check my progress" -> analyze
-        - "what's the weather?" -> general
-        - "help me be more productive" -> general
+Examples: "add a reminder for dentist appointment" -> create; "check my progress" -> analyze; "help me be more productive" -> general
 
-        Query: "{query}"
+Query: "{truncate(query, PEKA_PROMPT_QUERY_CHARS)}"
 
-        Respond with ONLY the intent (create/analyze/general), nothing else."""
+Respond with ONLY the intent (create/analyze/general).""")
 
         try:
-            response = self.client.generate(
-                prompt=prompt,
+            response_text = await self._generate(
+                prompt,
                 max_tokens=10,
                 temperature=0.1,  # Low temperature for more consistent results
                 k=0,
@@ -298,7 +580,7 @@ IMPORTANT: Your response must be a complete, valid JSON object. Do not include a
                 return_likelihoods='NONE'
             )
             
-            intent = response.generations[0].text.strip().lower()
+            intent = response_text.strip().lower()
             if intent not in ['create', 'analyze', 'general']:
                 logger.warning(f"Unexpected intent from Cohere: {intent}, defaulting to 'general'")
                 return 'general'
@@ -308,27 +590,17 @@ IMPORTANT: Your response must be a complete, valid JSON object. Do not include a
             logger.error(f"Failed to detect intent with Cohere: {str(e)}")
             return 'general'  # Fallback to general on error
 
-    def parse_task_details(self, query: str) -> Dict:
+    async def parse_task_details(self, query: str) -> Dict:
         """Parse task details from the query using Cohere."""
-        prompt = f"""Extract task details from the following query. Provide a JSON response with:
-        - title: A concise but descriptive title
-        - description: A detailed description of the task
-        - priority: One of 'high', 'medium', or 'low'
-        - estimated_duration: Duration in minutes (default to 30 if not specified)
-
-        Query: "{query}"
-
-        Respond with ONLY a JSON object in this format:
-        {{
-            "title": "Task title",
-            "description": "Task description",
-            "priority": "high/medium/low",
-            "estimated_duration": number
-        }}"""
+        prompt = record_prompt("task_details", f"""Extract task details from the query: a concise title, a description, priority (high/medium/low) and estimated_duration in minutes (30 if not specified).
+
+Query: "{truncate(query, PEKA_PROMPT_QUERY_CHARS)}"
+
+Respond with ONLY a JSON object on one line: {{"title": "...", "description": "...", "priority": "high|medium|low", "estimated_duration": number}}""")
 
         try:
-            response = self.client.generate(
-                prompt=prompt,
+            response_text = await self._generate(
+                prompt,
                 max_tokens=200,
                 temperature=0.3,
                 k=0,
@@ -336,8 +608,13 @@ IMPORTANT: Your response must be a complete, valid JSON object. Do not include a
                 return_likelihoods='NONE'
             )
             
-            # Parse the response
-            task_data = json.loads(response.generations[0].text.strip())
+            task_data = parse_structured(
+                "task_details",
+                response_text,
+                TaskDetails,
+                {"title": query.strip(), "description": "", "priority": "low", "estimated_duration": 30},
+                retry_key=make_key("task_details", prompt),
+            ).model_dump(exclude={"task_id"})
             
             # Validate and clean the data
             task_data['priority'] = task_data.get('priority', 'low').lower()
@@ -361,49 +638,73 @@ IMPORTANT: Your response must be a complete, valid JSON object. Do not include a
                 'estimated_duration': 30
             }
 
+    @staticmethod
+    def _general_context(query: str, context: str) -> str:
+        """The context a general answer needs: all of it for a follow-up, none for a standalone query."""
+        if context and not refers_back(query):
+            metrics.increment("peka.memory.standalone")
+            return ""
+        return context
+
+    def _conversation_block(self, context: str) -> str:
+        """Earlier turns to prepend to a prompt; empty when there are none."""
+        if not context:
+            return ""
+        return f"""Conversation so far (use it to resolve references like "that" or "it"; respond only to the latest message):
+{context}
+
+"""
+
+    def _create_summary_prompt(self, summary: str, turns: List[Turn]) -> str:
+        """Prompt that folds older turns into the running conversation summary."""
+        previous = f"Summary so far: {summary}\n" if summary else ""
+        exchange = "\n".join(f"{role}: {text}" for role, text in turns)
+        prompt = f"""Summarize this conversation between a user and Peka, an AI productivity assistant, in under {PEKA_MEMORY_SUMMARY_TOKENS // 2} words. Keep what the user shared about their goals, tasks and constraints, and any open questions; leave out pleasantries.
+
+{previous}{exchange}
+
+Respond with the summary only, as plain text."""
+        return record_prompt("memory_summary", prompt)
+
+    def _create_query_prompt(self, query: str, context: str = "") -> str:
+        """Compact few-shot prompt that classifies the query and extracts task details."""
+        query = truncate(query, PEKA_PROMPT_QUERY_CHARS)
+        prompt = f"""{self._conversation_block(context)}You are Peka, a friendly AI assistant. The user said: "{query}"
+
+Classify the intent (casual language, typos and slang are fine) and respond with one JSON object:
+- "create": they explicitly want to create a task/todo/reminder, schedule or plan something, set a deadline or add to their list
+- "analyze": they want to check progress, review or prioritize their tasks, or get task statistics or recommendations
+- "general": anything else
+
+For "create", use the exact duration the user gave, converted to minutes; only default to 30 if none is given.
+
+Examples:
+"Create a task for studying for 45 minutes" -> {{"intent": "create", "task_details": {{"title": "Study Session", "description": "Focused study session", "priority": "medium", "estimated_duration": 45}}, "message": "I've created a task for your 45-minute study session.", "action_items": ["Prepare study materials", "Set a timer for 45 minutes"]}}
+"Create a task to call John" -> {{"intent": "create", "task_details": {{"title": "Call John", "description": "Make a phone call to John", "priority": "medium", "estimated_duration": 30}}, "message": "I've created a task for calling John with a default duration of 30 minutes.", "action_items": ["Prepare any topics to discuss"]}}
+"How am I doing on my tasks?" -> {{"intent": "analyze", "task_details": null, "message": "Let me analyze your tasks and provide personalized recommendations.", "action_items": ["Review your task list"]}}
+"Any productivity tips?" -> {{"intent": "general", "task_details": null, "message": "Here are some tips to boost your productivity:", "action_items": ["Take regular breaks"]}}
+
+Respond with only the JSON object on a single line: no markdown, comments or other text."""
+        return record_prompt("query", prompt)
+
     def _create_task_prompt(self, tasks: List[Task]) -> str:
         try:
-            tasks_json = json.dumps([task.model_dump() for task in tasks], default=str)
-            logger.debug(f"Creating task prompt for tasks: {tasks_json}")
-            
-            prompt = f"""You are Peka, an AI productivity assistant. Analyze the following to-do list and provide detailed recommendations.
-
-Tasks:
-{tasks_json}
-Should not exceed 200 words.
-
-Consider the following factors when analyzing tasks:
-1. Priority (high, medium, low)
-   - High priority tasks often have immediate impact or deadlines
-   - Medium priority tasks are important but can be scheduled
-   - Low priority tasks can be deferred if needed
-
-2. Estimated duration (shorter tasks might be quicker wins)
-   - Quick wins can build momentum
-   - Longer tasks might need to be broken down
-   - Consider time of day and energy levels
-
-3. Age of the task (older tasks may be more time-sensitive)
-   - Stale tasks might indicate procrastination
-   - Recent tasks might be more relevant
-   - Consider if older tasks are still valid
-
-4. Progress (unfinished or stalled tasks may need focus)
-   - In-progress tasks might need completion to free up mental space
-   - Stalled tasks might need reevaluation
-   - Completed tasks should be celebrated
-
-Provide a JSON response with the following structure:
-{{
-    "sorted_tasks": [list of task IDs in order of importance],
-    "top_recommendation": {{
-        "task_id": ID of the recommended task,
-        "reason": "Detailed explanation of why this task should be prioritized"
-    }},
-    "explanation": "Detailed explanation of the task ordering and recommendations"
-}}"""
-            logger.debug(f"Created task prompt: {prompt[:100]}...")
-            return prompt
+            tasks_text, included = serialize_tasks(tasks, PEKA_PROMPT_TASK_TOKENS)
+            omitted = len(tasks) - included
+            if omitted:
+                tasks_text += f"\n({omitted} lower-scoring tasks omitted)"
+            logger.debug(f"Creating task prompt for {included} of {len(tasks)} tasks")
+
+            prompt = f"""You are Peka, an AI productivity assistant. Analyze the user's to-do list and recommend what to do next.
+
+Tasks ({TASK_LEGEND}):
+{tasks_text}
+
+Rank the tasks weighing priority (high first), estimated duration (short tasks are quick wins), age (old tasks may be stale or urgent) and status (finish in-progress tasks, celebrate completed ones). Keep the explanation under 200 words.
+
+Respond with JSON:
+{{"sorted_tasks": [task IDs, most important first], "top_recommendation": {{"task_id": ID, "reason": "why this task first"}}, "explanation": "the reasoning behind the order"}}"""
+            return record_prompt("analyze", prompt)
         except Exception as e:
             logger.error(f"Failed to create task prompt: {str(e)}")
             logger.exception("Full traceback:")
@@ -412,26 +713,47 @@ Provide a JSON response with the following structure:
                 detail=f"Failed to create task prompt: {str(e)}"
             )
 
-    def _create_general_prompt(self, query: str) -> str:
+    def _create_explanation_prompt(self, tasks: List[Task], analysis: PekaResponse) -> str:
+        try:
+            tasks_by_id = {task.id: task for task in tasks}
+            ranked = "\n".join(
+                f"{rank}. {truncate(tasks_by_id[task_id].title, 80)} ({tasks_by_id[task_id].priority} priority, "
+                f"{tasks_by_id[task_id].progress or 'not_started'})"
+                for rank, task_id in enumerate(analysis.sorted_tasks[:10], start=1)
+            )
+            prompt = f"""You are Peka, an AI productivity assistant. The user's tasks have already been prioritized in this order:
+{ranked}
+
+The top recommendation is: {analysis.top_recommendation.reason}
+
+In under 120 words, explain this ordering to the user in a friendly, encouraging way and tell them how to get started. Respond with plain text only."""
+            return record_prompt("explanation", prompt)
+        except Exception as e:
+            logger.error(f"Failed to create explanation prompt: {str(e)}")
+            logger.exception("Full traceback:")
+            raise HTTPException(
+                status_code=500,
+                detail=f"Failed to create explanation prompt: {str(e)}"
+            )
+
+    def _create_general_stream_prompt(self, query: str, context: str = "") -> str:
+        """Plain-text variant of the general prompt, so the answer can be shown while it streams."""
+        prompt = f"""{self._conversation_block(context)}You are Peka, an AI productivity assistant. The user has asked: "{truncate(query, PEKA_PROMPT_QUERY_CHARS)}"
+
+Give a practical, encouraging answer about learning, productivity, time management or personal development, based on proven principles and tailored to the question, in under 200 words.
+
+Write plain text, not JSON: a short answer followed by 2-4 action items, each on its own line starting with "- "."""
+        return record_prompt("general_stream", prompt)
+
+    def _create_general_prompt(self, query: str, context: str = "") -> str:
         try:
             logger.debug(f"Creating general prompt for query: {query}")
-            prompt = f"""You are Peka, an AI productivity assistant. The user has asked: "{query}"
-
-Provide a helpful, actionable response that focuses on learning. Or  productivity, time management, or personal development. Your response should be:
-1. Practical and actionable
-2. Based on proven productivity principles
-3. Tailored to the user's specific question
-4. Encouraging and motivating 
-5. Should not exceed 200 words.
-
-Provide a JSON response with the following structure:
-{{
-    "response": "Your detailed response here",
-    "action_items": ["List", "of", "actionable", "items"],
-    "timestamp": "Current timestamp in ISO format"
-}}"""
-            logger.debug(f"Created general prompt: {prompt[:100]}...")
-            return prompt
+            prompt = f"""{self._conversation_block(context)}You are Peka, an AI productivity assistant. The user has asked: "{truncate(query, PEKA_PROMPT_QUERY_CHARS)}"
+
+Give a practical, encouraging answer about learning, productivity, time management or personal development, based on proven principles and tailored to the question, in under 200 words.
+
+Respond with JSON: {{"response": "your answer", "action_items": ["actionable", "items"], "timestamp": "current ISO timestamp"}}"""
+            return record_prompt("general", prompt)
         except Exception as e:
             logger.error(f"Failed to create general prompt: {str(e)}")
             logger.exception("Full traceback:")
@@ -440,24 +762,116 @@ Provide a JSON response with the following structure:
                 detail=f"Failed to create general prompt: {str(e)}"
             )
 
-    async def analyze_tasks(self, tasks: List[Task]) -> PekaResponse:
+    async def get_user_tasks(self, user_id: int) -> List[Task]:
+        """The user's open tasks, newest first and capped at PEKA_ANALYZE_MAX_TASKS."""
+        return await get_tasks_for_analysis(user_id, PEKA_ANALYZE_MAX_TASKS)
+
+    async def analyze_tasks(
+        self,
+        tasks: List[Task],
+        mode: Optional[str] = None,
+        user_id: Optional[int] = None,
+        use_stored: Optional[bool] = None,
+    ) -> PekaResponse:
+        """Rank tasks and recommend one.
+
+        mode 'local' ranks and explains without the LLM, 'hybrid' ranks locally and
+        asks the LLM only for the explanation text, 'llm' sends the full task list.
+        With a user_id, results are cached until the task set or the user's todos change,
+        and a recommendation precomputed by the nightly batch is served if it was made
+        for the same task set. That lookup is made when use_stored is True (default:
+        PEKA_SERVE_STORED_RECOMMENDATIONS), and never in 'local' mode.
+        """
+        mode = mode or PEKA_ANALYZE_MODE
+        if use_stored is None:
+            use_stored = PEKA_SERVE_STORED_RECOMMENDATIONS
+        if not tasks:
+            raise HTTPException(status_code=400, detail="No tasks to analyze")
+
+        tasks_hash = task_set_hash(tasks) if user_id is not None else None
+        if tasks_hash:
+            cached = analysis_cache.get(user_id, tasks_hash, mode)
+            if cached is not None:
+                logger.debug(f"Serving cached {mode} analysis for user {user_id}")
+                return cached.model_copy(update={"cached": True})
+            if use_stored and mode != "local":
+                stored = await self._stored_analysis(user_id, tasks_hash, mode)
+                if stored is not None:
+                    analysis_cache.set(user_id, tasks_hash, mode, stored)
+                    return stored
+
+        cacheable = True
+        with deadline(expires_in(PEKA_REQUEST_DEADLINE)):
+            if mode == "local":
+                response = analyze_locally(tasks)
+            elif mode == "hybrid":
+                response, cacheable = await self._analyze_tasks_hybrid(tasks)
+            else:
+                response, cacheable = await self._analyze_tasks_llm(tasks)
+
+        if tasks_hash and cacheable:
+            analysis_cache.set(user_id, tasks_hash, mode, response)
+        return response
+
+    async def _stored_analysis(self, user_id: int, tasks_hash: str, mode: str) -> Optional[PekaResponse]:
+        """The batch-computed analysis for this exact task set, if it is recent enough."""
         try:
-            logger.info(f"Analyzing {len(tasks)} tasks")
-            prompt = ChatPromptTemplate.from_messages([
-                ("system", "You are Peka, an AI productivity assistant. Always respond with valid JSON."),
-                ("user", "{input}")
-            ])
-            logger.debug("Created chat prompt template")
+            row = await get_recommendation(user_id)
+        except Exception as e:
+            # The stored copy is only a shortcut; compute the analysis instead
+            logger.error(f"Failed to load stored recommendation for user {user_id}: {str(e)}")
+            return None
+        if row is None or row["tasks_hash"] != tasks_hash or row["mode"] != mode:
+            metrics.increment("peka.recommendations.miss")
+            return None
+        computed_at = datetime.fromisoformat(row["computed_at"])
+        if (datetime.now(computed_at.tzinfo) - computed_at).total_seconds() > PEKA_RECOMMENDATION_MAX_AGE:
+            metrics.increment("peka.recommendations.expired")
+            return None
+        metrics.increment("peka.recommendations.served")
+        logger.debug(f"Serving stored {mode} analysis for user {user_id} from {row['computed_at']}")
+        return PekaResponse(**{**row["response"], "cached": True, "computed_at": computed_at})
+
+    async def _analyze_tasks_hybrid(self, tasks: List[Task]) -> Tuple[PekaResponse, bool]:
+        """Local ranking plus an LLM explanation; the flag is False when the LLM part failed."""
+        response = analyze_locally(tasks)
+        try:
+            explanation = await self._generate(
+                self._create_explanation_prompt(tasks, response),
+                max_tokens=300,
+                temperature=0.5,
+                k=0,
+                return_likelihoods='NONE'
+            )
+            if explanation.strip():
+                response.explanation = explanation.strip()
+        except Exception as e:
+            # The local ranking is complete on its own; keep its templated explanation
+            logger.error(f"Failed to generate analysis explanation: {str(e)}")
+            return response, False
+        return response, True
 
-            chain = prompt | self.llm | self.task_parser
-            logger.debug("Created processing chain")
+    async def _analyze_tasks_llm(self, tasks: List[Task]) -> Tuple[PekaResponse, bool]:
+        """Full LLM analysis; fields missing from its output come from the local ranking.
 
+        The flag is False when the output was unusable and the local analysis is returned instead.
+        """
+        try:
+            logger.info(f"Analyzing {len(tasks)} tasks")
+            local = analyze_locally(tasks)
             logger.debug("Invoking chain with task prompt")
-            response = chain.invoke({"input": self._create_task_prompt(tasks)})
+            try:
+                response = await self._invoke_structured(
+                    "analyze", PekaResponse, self._create_task_prompt(tasks), local.model_dump(exclude={"cached"})
+                )
+            except StructuredOutputError:
+                return local, False
             logger.debug(f"Received response: {response}")
             
             logger.info("Task analysis completed successfully")
-            return response
+            return response, True
+        except UpstreamUnavailable as e:
+            raise upstream_http_error(e)
         except Exception as e:
             logger.error(f"Failed to analyze tasks: {str(e)}")
             logger.exception("Full traceback:")
@@ -466,24 +880,37 @@ Provide a JSON response with the following structure:
                 detail=f"Failed to analyze tasks: {str(e)}"
             )
 
-    async def handle_general_query(self, query: str) -> GeneralResponse:
+    async def handle_general_query(self, query: str, bypass_cache: bool = False, context: str = "") -> GeneralResponse:
+        """Answer a general query, serving repeats and near-paraphrases from the response cache.
+
+        bypass_cache skips the lookup but still stores the fresh answer. A follow-up is
+        answered with the conversation context and does not use the cache at all; a
+        standalone query is answered without it, so users with history share the cache.
+        """
         try:
             logger.info(f"Handling general query: {query}")
-            prompt = ChatPromptTemplate.from_messages([
-                ("system", "You are Peka, an AI productivity assistant. Always respond with valid JSON."),
-                ("user", "{input}")
-            ])
-            logger.debug("Created chat prompt template")
-
-            chain = prompt | self.llm | self.general_parser
-            logger.debug("Created processing chain")
-
+            context = self._general_context(query, context)
+            if not bypass_cache and not context:
+                cached = await self.general_cache.get(query)
+                if cached is not None:
+                    logger.debug("General query served from cache")
+                    return GeneralResponse(**cached)
             logger.debug("Invoking chain with general prompt")
-            response = chain.invoke({"input": self._create_general_prompt(query)})
+            with deadline(expires_in(PEKA_REQUEST_DEADLINE)):
+                response = await self._invoke_structured(
+                    "general",
+                    GeneralResponse,
+                    self._create_general_prompt(query, context),
+                    {"action_items": [], "timestamp": datetime.utcnow().isoformat()},
+                )
             logger.debug(f"Received response: {response}")
+            if not context:
+                await self.general_cache.set(query, response.model_dump(mode="json"))
             
             logger.info("General query handled successfully")
             return response
+        except UpstreamUnavailable as e:
+            raise upstream_http_error(e)
         except Exception as e:
             logger.error(f"Failed to process general query: {str(e)}")
             logger.exception("Full traceback:")
@@ -495,30 +922,17 @@ Provide a JSON response with the following structure:
     def _create_task_creation_prompt(self, task_details: dict) -> str:
         try:
             logger.debug(f"Creating task creation prompt for details: {task_details}")
-            prompt = f"""You are Peka, an AI productivity assistant. The user wants to create a task with the following details:
+            prompt = f"""You are Peka, an AI productivity assistant. The user wants to create this task:
 
-Title: {task_details.get('title', '')}
-Description: {task_details.get('description', '')}
+Title: {truncate(task_details.get('title', ''), 120)}
+Description: {truncate(task_details.get('description', ''), PEKA_PROMPT_DESCRIPTION_CHARS)}
 Priority: {task_details.get('priority', 'low')}
 Estimated Duration: {task_details.get('estimated_duration', 30)} minutes
 
-Please analyze these details and provide a response that:
-1. Confirms the task creation
-2. Suggests any improvements to the task details
-3. Provides context about why this task is important
-4. Offers any relevant productivity tips
-
-Provide a JSON response with the following structure:
-{{
-    "task_id": 0,  // This will be set by the server 
-    "title": "The task title",
-    "description": "The task description",
-    "priority": "high|medium|low",
-    "estimated_duration": duration in minutes,
-    "message": "A helpful message about the task and suggestions"
-}}"""
-            logger.debug(f"Created task creation prompt: {prompt[:100]}...")
-            return prompt
+Confirm the task, suggest improvements to its details, say why it matters and offer a relevant productivity tip.
+
+Respond with JSON: {{"title": "...", "description": "...", "priority": "high|medium|low", "estimated_duration": minutes, "message": "helpful message with your suggestions"}}"""
+            return record_prompt("task_creation", prompt)
         except Exception as e:
             logger.error(f"Failed to create task creation prompt: {str(e)}")
             logger.exception("Full traceback:")
@@ -527,30 +941,21 @@ Provide a JSON response with the following structure:
                 detail=f"Failed to create task creation prompt: {str(e)}"
             )
 
+    async def suggest_task(self, task_details: dict) -> TaskCreationResponse:
+        """Ask the LLM to review a task: its suggested details and a message for the user."""
+        logger.debug("Invoking chain with task creation prompt")
+        with deadline(expires_in(PEKA_REQUEST_DEADLINE)):
+            return await self._invoke_structured(
+                "task_creation",
+                TaskCreationResponse,
+                self._create_task_creation_prompt(task_details),
+                {**task_details, "message": "Your task is ready."},
+            )
+
     async def create_task(self, task_details: dict) -> dict:
         try:
             logger.info(f"Creating task with details: {task_details}")
-            prompt = ChatPromptTemplate.from_messages([
-                ("system", "You are Peka, an AI productivity assistant. Always respond with valid JSON."),
-                ("user", "{input}")
-            ])
-            logger.debug("Created chat prompt template")
-
-            # Create a custom parser for task creation response
-            class TaskCreationResponse(BaseModel):
-                task_id: int = 0
-                title: str
-                description: str
-                priority: str
-                estimated_duration: int
-                message: str
-
-            parser = PydanticOutputParser(pydantic_object=TaskCreationResponse)
-            chain = prompt | self.llm | parser
-            logger.debug("Created processing chain")
-
-            logger.debug("Invoking chain with task creation prompt")
-            response = chain.invoke({"input": self._create_task_creation_prompt(task_details)})
+            response = await self.suggest_task(task_details)
             logger.debug(f"Received response: {response}")
             
             # Convert the response to a dict and add the task details
@@ -559,6 +964,8 @@ Provide a JSON response with the following structure:
             
             logger.info("Task creation completed successfully")
             return response_dict
+        except UpstreamUnavailable as e:
+            raise upstream_http_error(e)
         except Exception as e:
             logger.error(f"Failed to create task: {str(e)}")
             logger.exception("Full traceback:")
@@ -569,17 +976,18 @@ Provide a JSON response with the following structure:
 
     def _create_unified_prompt(self, query: str, intent: str, task_details: Optional[Dict] = None) -> str:
         """Create a prompt for the AI based on the query intent."""
+        query = truncate(query, PEKA_PROMPT_QUERY_CHARS)
         if intent == 'create':
-            return f"""You are Peka, an AI productivity assistant. The user wants to create a task with the following details:
-Title: {task_details['title']}
-Description: {task_details['description']}
+            prompt = f"""You are Peka, an AI productivity assistant. The user wants to create a task with the following details:
+Title: {truncate(task_details['title'], 120)}
+Description: {truncate(task_details['description'], PEKA_PROMPT_DESCRIPTION_CHARS)}
 Priority: {task_details['priority']}
 Estimated Duration: {task_details['estimated_duration']} minutes
 
 Please provide a friendly confirmation message and any relevant suggestions for completing this task effectively."""
         
         elif intent == 'analyze':
-            return f"""You are Peka, an AI productivity assistant. The user wants to analyze their tasks:
+            prompt = f"""You are Peka, an AI productivity assistant. The user wants to analyze their tasks:
 Query: {query}
 
 Please provide:
@@ -588,11 +996,13 @@ Please provide:
 3. Actionable steps to improve productivity"""
         
         else:
-            return f"""You are Peka, an AI productivity assistant. The user has a general query:
+            prompt = f"""You are Peka, an AI productivity assistant. The user has a general query:
 Query: {query}
 
 Please provide helpful advice and actionable steps to improve their productivity."""
 
+        return record_prompt(f"unified_{intent}", prompt)
+
     def _extract_action_items(self, message: str) -> List[str]:
         """Extract action items from the AI's response."""
         # Simple extraction of bullet points or numbered lists
@@ -0,0 +1,100 @@
+"""Helpers shared by PekaService's prompt builders.
+
+Prompts are measured before they are sent (an estimate close to Cohere's BPE
+counts for English text), task lists are serialized in a compact one-line-per-task
+form, and lists that would exceed the token budget are cut down to the
+highest-scoring tasks from services.task_scoring.
+"""
+import json
+import logging
+import math
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+from core.metrics import metrics
+from schemas.peka import Task
+from services.task_scoring import rank_tasks
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+PRIORITY_CODES = {"high": "h", "medium": "m", "low": "l"}
+PROGRESS_CODES = {"not_started": "ns", "in_progress": "ip", "completed": "done"}
+
+TASK_LEGEND = (
+    "One task per line. Keys: id, t=title, p=priority (h/m/l), min=estimated minutes, "
+    "age=days since created, st=status (ns=not started, ip=in progress, done=completed), d=description"
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count: one per word or symbol, plus one per extra 4 chars of long words."""
+    return sum(1 + max(0, len(piece) - 1) // 4 for piece in _TOKEN_RE.findall(text))
+
+
+def truncate(text: Optional[str], max_chars: int) -> str:
+    text = " ".join((text or "").split())
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars - 1].rstrip() + "…"
+
+
+def compact_task(task: Task, now: float, description_chars: int) -> str:
+    row = {
+        "id": task.id,
+        "t": truncate(task.title, 80),
+        "p": PRIORITY_CODES.get((task.priority or "").lower(), "l"),
+        "min": task.estimated_duration,
+        "age": max(0, math.floor((now - task.created_at.timestamp()) / 86400)),
+        "st": PROGRESS_CODES.get(task.progress or "not_started", "ns"),
+    }
+    description = truncate(task.description, description_chars)
+    if description:
+        row["d"] = description
+    return json.dumps(row, ensure_ascii=False, separators=(",", ":"))
+
+
+def serialize_tasks(
+    tasks: List[Task], max_tokens: int, description_chars: int = 120, now: Optional[float] = None
+) -> Tuple[str, int]:
+    """Compact task lines within max_tokens; returns the text and how many tasks it holds.
+
+    If the whole list does not fit, tasks are taken in local-score order until the
+    budget is used up, so the ones dropped are the least important.
+    """
+    now = time.time() if now is None else now
+    lines = [compact_task(task, now, description_chars) for task in tasks]
+    costs = [estimate_tokens(line) + 1 for line in lines]
+    if sum(costs) <= max_tokens:
+        return "\n".join(lines), len(lines)
+
+    kept, used = [], 0
+    for index in rank_tasks(tasks, now):
+        if used + costs[index] > max_tokens:
+            break
+        kept.append(lines[index])
+        used += costs[index]
+    logger.info(f"Task list trimmed to {len(kept)} of {len(tasks)} tasks to fit {max_tokens} tokens")
+    metrics.increment("peka.prompt.tasks_trimmed", len(tasks) - len(kept))
+    return "\n".join(kept), len(kept)
+
+
+def record_prompt(name: str, prompt: str) -> str:
+    """Log and count the size of a prompt about to be sent; returns the prompt unchanged."""
+    tokens = estimate_tokens(prompt)
+    logger.info(f"Prompt {name}: {len(prompt)} chars, ~{tokens} tokens")
+    metrics.increment(f"peka.prompt.{name}.calls")
+    metrics.increment(f"peka.prompt.{name}.tokens", tokens)
+    return prompt
+
+
+def prompt_stats() -> Dict[str, float]:
+    """Average estimated tokens per prompt type, from the counters above."""
+    snapshot = metrics.snapshot()["counters"]
+    return {
+        name[len("peka.prompt."):-len(".calls")]: snapshot[name.replace(".calls", ".tokens")] / count
+        for name, count in snapshot.items()
+        if name.startswith("peka.prompt.") and name.endswith(".calls") and count
+    }
@@ -0,0 +1,221 @@
+"""Nightly precomputation of task recommendations.
+
+Pages through the users that have open todos, by id, loading a whole page's
+open tasks in one query (db/peka_open_tasks_page.sql), so dormant accounts are
+never visited. The analysis runs with at most ``concurrency`` users in flight,
+each inside a batch-lane slot of the LLM scheduler so interactive requests keep
+priority. Results are stored in ``peka_recommendation``
+(db/peka_recommendation.sql) with the task-set hash and a timestamp;
+``PekaService.analyze_tasks`` serves them while the hash matches, on workers
+with PEKA_SERVE_STORED_RECOMMENDATIONS set. Users whose stored result already
+matches their task set are skipped without an LLM call.
+
+Progress is written to a JSON checkpoint after every page, so a run that is
+interrupted resumes after the last finished page of the same day instead of
+starting over. Throughput is published as ``peka.batch.users_per_sec`` and
+``peka.batch.llm_calls_per_sec``.
+
+Run once from the command line (e.g. from cron) with
+``python -m services.recommendation_batch [--restart]``, or set
+PEKA_BATCH_ENABLED on one worker to run it daily from the app's lifespan.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from core.config import (
+    COHERE_API_KEY,
+    PEKA_ANALYZE_MAX_TASKS,
+    PEKA_ANALYZE_MODE,
+    PEKA_BATCH_CHECKPOINT_PATH,
+    PEKA_BATCH_CONCURRENCY,
+    PEKA_BATCH_HOUR_UTC,
+    PEKA_BATCH_PAGE_SIZE,
+)
+from core.metrics import metrics
+from db.supabase import close_async_postgrest_client
+from repositories.recommendation_repo import get_recommendation, save_recommendation
+from repositories.todo_repo import get_open_tasks_page
+from schemas.peka import Task
+from services.analysis_cache import task_set_hash
+from services.llm_scheduler import LLMScheduler
+from services.peka_service import PekaService
+
+logger = logging.getLogger(__name__)
+
+STAT_KEYS = ("users", "computed", "unchanged", "failed", "llm_calls")
+
+
+class RecommendationBatch:
+    def __init__(
+        self,
+        peka_service: PekaService,
+        scheduler: LLMScheduler,
+        concurrency: int = PEKA_BATCH_CONCURRENCY,
+        page_size: int = PEKA_BATCH_PAGE_SIZE,
+        checkpoint_path: str = PEKA_BATCH_CHECKPOINT_PATH,
+        mode: Optional[str] = None,
+    ):
+        self.peka_service = peka_service
+        self.scheduler = scheduler
+        self.concurrency = concurrency
+        self.page_size = page_size
+        self.checkpoint_path = checkpoint_path
+        self.mode = mode or PEKA_ANALYZE_MODE
+
+    def _load_checkpoint(self) -> Optional[Dict]:
+        try:
+            with open(self.checkpoint_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable batch checkpoint {self.checkpoint_path}: {str(e)}")
+            return None
+
+    def has_unfinished_run(self) -> bool:
+        """Whether today's run was started and interrupted before it finished."""
+        checkpoint = self._load_checkpoint()
+        return bool(
+            checkpoint
+            and checkpoint.get("run_date") == datetime.now(timezone.utc).date().isoformat()
+            and not checkpoint.get("done")
+        )
+
+    def _save_checkpoint(self, checkpoint: Dict) -> None:
+        # Write-then-rename, so a crash mid-write never leaves a truncated checkpoint
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    async def _process_user(self, user_id: int, tasks: List[Task], stats: Dict) -> None:
+        try:
+            tasks_hash = task_set_hash(tasks)
+            stored = await get_recommendation(user_id)
+            if stored and stored["tasks_hash"] == tasks_hash and stored["mode"] == self.mode:
+                stats["unchanged"] += 1
+                return
+            async with self.scheduler.slot(user_id, lane="batch"):
+                with metrics.timer("peka.batch.user"):
+                    response = await self.peka_service.analyze_tasks(
+                        tasks, self.mode, user_id=user_id, use_stored=False
+                    )
+            # An analysis-cache hit made no upstream call
+            if self.mode != "local" and not response.cached:
+                stats["llm_calls"] += 1
+            await save_recommendation(
+                user_id,
+                self.mode,
+                tasks_hash,
+                response.model_dump(mode="json", exclude={"cached", "computed_at"}),
+            )
+            stats["computed"] += 1
+        except Exception as e:
+            # One user's failure must not stop the run; they are served live in the morning
+            stats["failed"] += 1
+            logger.error(f"Batch recommendation failed for user {user_id}: {str(e)}")
+
+    def _publish(self, stats: Dict, elapsed: float) -> None:
+        for key in STAT_KEYS:
+            metrics.set_gauge(f"peka.batch.{key}", stats[key])
+        if elapsed > 0:
+            metrics.set_gauge("peka.batch.users_per_sec", stats["users"] / elapsed)
+            metrics.set_gauge("peka.batch.llm_calls_per_sec", stats["llm_calls"] / elapsed)
+
+    async def run(self, resume: bool = True) -> Dict:
+        """Process every user with open tasks once for today (UTC); returns the run's cumulative stats.
+
+        With resume, an unfinished run from today continues after its last finished
+        page, and a finished one is not repeated.
+        """
+        run_date = datetime.now(timezone.utc).date().isoformat()
+        checkpoint = self._load_checkpoint() if resume else None
+        if checkpoint and checkpoint.get("run_date") == run_date:
+            if checkpoint.get("done"):
+                logger.info(f"Recommendation batch for {run_date} already finished")
+                return checkpoint["stats"]
+            logger.info(f"Resuming recommendation batch for {run_date} after user {checkpoint['last_user_id']}")
+        else:
+            checkpoint = {"run_date": run_date, "last_user_id": 0, "elapsed": 0.0,
+                          "done": False, "stats": dict.fromkeys(STAT_KEYS, 0)}
+
+        stats = checkpoint["stats"]
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def bounded(user_id: int, tasks: List[Task]) -> None:
+            async with semaphore:
+                await self._process_user(user_id, tasks, stats)
+
+        start = time.monotonic()
+        elapsed_before = checkpoint["elapsed"]
+        while True:
+            page = await get_open_tasks_page(checkpoint["last_user_id"], self.page_size, PEKA_ANALYZE_MAX_TASKS)
+            if not page:
+                break
+            await asyncio.gather(*(bounded(user_id, tasks) for user_id, tasks in page.items()))
+            stats["users"] += len(page)
+            checkpoint["last_user_id"] = max(page)
+            checkpoint["elapsed"] = elapsed_before + time.monotonic() - start
+            self._save_checkpoint(checkpoint)
+            self._publish(stats, checkpoint["elapsed"])
+
+        checkpoint["done"] = True
+        checkpoint["elapsed"] = elapsed_before + time.monotonic() - start
+        self._save_checkpoint(checkpoint)
+        self._publish(stats, checkpoint["elapsed"])
+        logger.info(f"Recommendation batch for {run_date} finished in {checkpoint['elapsed']:.1f}s: {stats}")
+        return stats
+
+
+def seconds_until(hour_utc: int, now: Optional[datetime] = None) -> float:
+    """Seconds from now until the next time the UTC clock reads hour_utc:00."""
+    now = now or datetime.now(timezone.utc)
+    next_run = now.replace(hour=hour_utc, minute=0, second=0, microsecond=0)
+    if next_run <= now:
+        next_run += timedelta(days=1)
+    return (next_run - now).total_seconds()
+
+
+async def run_daily(batch: RecommendationBatch, hour_utc: int = PEKA_BATCH_HOUR_UTC) -> None:
+    """Run the batch every day at hour_utc until cancelled; a run interrupted today resumes right away."""
+    if not batch.has_unfinished_run():
+        await asyncio.sleep(seconds_until(hour_utc))
+    while True:
+        try:
+            await batch.run()
+        except Exception as e:
+            # The checkpoint keeps the progress; the next run resumes or starts fresh
+            logger.error(f"Recommendation batch failed: {str(e)}")
+        await asyncio.sleep(seconds_until(hour_utc))
+
+
+async def _main(args) -> None:
+    service = PekaService(COHERE_API_KEY)
+    # Nothing else competes for the LLM in this process
+    scheduler = LLMScheduler(
+        max_concurrency=args.concurrency,
+        max_queue_depth=args.concurrency,
+        max_batch_concurrency=args.concurrency,
+    )
+    batch = RecommendationBatch(service, scheduler, concurrency=args.concurrency, page_size=args.page_size)
+    try:
+        stats = await batch.run(resume=not args.restart)
+    finally:
+        await service.close()
+        await close_async_postgrest_client()
+    print(json.dumps(stats))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute today's task recommendations for every user with open tasks.")
+    parser.add_argument("--concurrency", type=int, default=PEKA_BATCH_CONCURRENCY)
+    parser.add_argument("--page-size", type=int, default=PEKA_BATCH_PAGE_SIZE)
+    parser.add_argument("--restart", action="store_true", help="ignore today's checkpoint and start from the first user")
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(parser.parse_args()))
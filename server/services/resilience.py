@@ -0,0 +1,257 @@
+"""Deadlines, circuit breaking, hedging and retries for Peka's upstream LLM calls.
+
+A request sets one deadline at its entry point (``with deadline(expires_in(s))``)
+and every Cohere call made while handling it - across intent detection,
+generation and analysis - is bounded by whatever is left of that budget,
+including calls made from tasks spawned by the request, which inherit the
+context. ``UpstreamCaller`` runs each call through a shared circuit breaker,
+retries only errors that can succeed on a second try (timeouts, connection
+errors, 429 and 5xx) with full-jitter backoff, and can optionally hedge: when
+an attempt is slower than the observed p95 for that operation, a second one is
+started and whichever finishes first wins.
+"""
+import asyncio
+import contextvars
+import logging
+import random
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+# Transport errors from the Cohere SDK / aiohttp / httpx, matched by name so
+# this module does not depend on any one client library
+RETRYABLE_ERROR_NAMES = {
+    "CohereConnectionError",
+    "ClientConnectionError",
+    "ClientConnectorError",
+    "ServerDisconnectedError",
+    "ConnectError",
+    "ConnectTimeout",
+    "ReadTimeout",
+    "RemoteProtocolError",
+}
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("peka_deadline", default=None)
+
+
+class UpstreamUnavailable(Exception):
+    """The upstream call was not made or not finished in time; maps to an HTTP error."""
+
+    status_code = 503
+
+    def __init__(self, detail: str, retry_after: Optional[float] = None):
+        super().__init__(detail)
+        self.detail = detail
+        self.retry_after = retry_after
+
+    @property
+    def headers(self) -> Optional[dict]:
+        if self.retry_after is None:
+            return None
+        return {"Retry-After": str(max(1, int(self.retry_after + 0.999)))}
+
+
+class CircuitOpenError(UpstreamUnavailable):
+    pass
+
+
+class DeadlineExceeded(UpstreamUnavailable):
+    status_code = 504
+
+
+def expires_in(seconds: float) -> float:
+    return time.monotonic() + seconds
+
+
+@contextmanager
+def deadline(expires_at: float):
+    """Bound upstream calls in this block; a nested deadline can only shorten the outer one."""
+    current = _deadline.get()
+    token = _deadline.set(expires_at if current is None else min(current, expires_at))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left in the current deadline, or None when no deadline is set."""
+    expires_at = _deadline.get()
+    return None if expires_at is None else expires_at - time.monotonic()
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, UpstreamUnavailable):
+        return False
+    if isinstance(exc, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    status = getattr(exc, "http_status", None) or getattr(exc, "status_code", None)
+    if isinstance(status, int):
+        return status in RETRYABLE_STATUS
+    return type(exc).__name__ in RETRYABLE_ERROR_NAMES
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open after N failures -> half-open after a cool-down.
+
+    While open every call fails fast; in half-open a single trial call is let
+    through and its outcome closes or re-opens the circuit.
+    """
+
+    STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_inflight = False
+        self._publish()
+
+    def _publish(self) -> None:
+        metrics.set_gauge(f"{self.name}.state", self.STATES[self.state])
+
+    def _set_state(self, state: str) -> None:
+        if state != self.state:
+            logger.warning(f"Circuit {self.name}: {self.state} -> {state}")
+            self.state = state
+            self._publish()
+
+    def retry_after(self) -> float:
+        return max(0.0, self._opened_at + self.reset_seconds - time.monotonic())
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError unless a call may go through now."""
+        if self.state == "open":
+            if self.retry_after() > 0:
+                metrics.increment(f"{self.name}.rejected")
+                raise CircuitOpenError("The AI service is temporarily unavailable.", self.retry_after())
+            self._set_state("half_open")
+        if self.state == "half_open":
+            if self._trial_inflight:
+                metrics.increment(f"{self.name}.rejected")
+                raise CircuitOpenError("The AI service is temporarily unavailable.", 1.0)
+            self._trial_inflight = True
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._trial_inflight = False
+        self._set_state("closed")
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        self._trial_inflight = False
+        if self.state == "half_open" or self._failures >= self.failure_threshold:
+            if self.state != "open":
+                metrics.increment(f"{self.name}.opened")
+            self._opened_at = time.monotonic()
+            self._set_state("open")
+
+    def release(self) -> None:
+        """Give back a half-open trial slot without judging the upstream (e.g. a 400 or a cancel)."""
+        self._trial_inflight = False
+
+
+class UpstreamCaller:
+    def __init__(
+        self,
+        breaker: CircuitBreaker,
+        retries: int = 2,
+        backoff_base: float = 0.25,
+        backoff_cap: float = 4.0,
+        hedge: bool = False,
+        hedge_min_samples: int = 20,
+    ):
+        self.breaker = breaker
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+
+    def _hedge_delay(self, op: str) -> Optional[float]:
+        if not self.hedge:
+            return None
+        if metrics.sample_count(f"peka.upstream.{op}") < self.hedge_min_samples:
+            return None
+        return metrics.percentile(f"peka.upstream.{op}", 95)
+
+    async def _hedged(self, op: str, fn: Callable[[], Awaitable[T]], hedge: bool) -> T:
+        delay = self._hedge_delay(op) if hedge else None
+        first = asyncio.ensure_future(fn())
+        tasks = [first]
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done:
+                    metrics.increment(f"peka.upstream.{op}.hedged")
+                    tasks.append(asyncio.ensure_future(fn()))
+            pending, error = set(tasks), None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            metrics.increment(f"peka.upstream.{op}.hedge_wins")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def _attempt_timeout(self, op: str) -> Optional[float]:
+        left = remaining()
+        if left is not None and left <= 0:
+            metrics.increment(f"peka.upstream.{op}.deadline_exceeded")
+            raise DeadlineExceeded("The AI service did not respond in time.")
+        return left
+
+    async def call(self, op: str, fn: Callable[[], Awaitable[T]], hedge: bool = True) -> T:
+        """Run fn (a factory for one upstream attempt) with breaker, deadline, hedging and retries.
+
+        Pass hedge=False for calls whose losing attempt cannot simply be dropped (e.g. streams).
+        """
+        attempt = 0
+        while True:
+            timeout = self._attempt_timeout(op)
+            self.breaker.before_call()
+            start = time.perf_counter()
+            try:
+                result = await asyncio.wait_for(self._hedged(op, fn, hedge), timeout)
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except Exception as e:
+                retryable = is_retryable(e)
+                if not retryable:
+                    self.breaker.release()
+                    raise
+                self.breaker.record_failure()
+                metrics.increment(f"peka.upstream.{op}.errors")
+                left = remaining()
+                if isinstance(e, asyncio.TimeoutError) and left is not None and left <= 0:
+                    metrics.increment(f"peka.upstream.{op}.deadline_exceeded")
+                    raise DeadlineExceeded("The AI service did not respond in time.") from e
+                backoff = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+                # No point waiting out a backoff if this failure just opened the circuit
+                if attempt >= self.retries or self.breaker.state == "open" or (left is not None and left <= backoff):
+                    raise
+                attempt += 1
+                metrics.increment(f"peka.upstream.{op}.retries")
+                logger.warning(f"Retrying {op} after {type(e).__name__} (attempt {attempt + 1}, backoff {backoff:.2f}s)")
+                await asyncio.sleep(backoff)
+                continue
+            self.breaker.record_success()
+            metrics.observe(f"peka.upstream.{op}", time.perf_counter() - start)
+            return result
@@ -0,0 +1,132 @@
+"""Response cache for general Peka queries.
+
+Lookups try the normalized query text first and, when an embedder is configured,
+fall back to the most similar cached query above a cosine-similarity threshold.
+Storage goes through ``ResponseCacheBackend`` so a shared backend (e.g. Redis)
+can replace the in-process one without touching PekaService.
+"""
+import json
+import math
+import re
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from core.cache import TTLCache
+from core.metrics import metrics
+
+Embedder = Callable[[str], Awaitable[List[float]]]
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s']")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Case-fold, drop punctuation and collapse whitespace."""
+    query = _PUNCTUATION_RE.sub(" ", query.lower())
+    return _WHITESPACE_RE.sub(" ", query).strip()
+
+
+def _unit(vector: List[float]) -> List[float]:
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+class ResponseCacheBackend(ABC):
+    """Storage for cached responses keyed by normalized query."""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Dict]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: Dict, embedding: Optional[List[float]] = None) -> None:
+        ...
+
+    @abstractmethod
+    async def search(self, embedding: List[float], min_similarity: float) -> Optional[Dict]:
+        """Return the value whose stored embedding is most similar, if above min_similarity."""
+
+    @abstractmethod
+    def stats(self) -> Dict:
+        ...
+
+
+class InMemoryResponseCacheBackend(ResponseCacheBackend):
+    """Per-worker backend on TTLCache; similarity search is a linear scan over live entries."""
+
+    def __init__(self, max_entries: int, ttl: float, max_bytes: int):
+        self._cache = TTLCache(
+            max_entries=max_entries,
+            ttl=ttl,
+            max_bytes=max_bytes,
+            name="peka.response_cache",
+            sizeof=lambda entry: len(json.dumps(entry["value"], default=str)) + 8 * len(entry["embedding"] or ()),
+        )
+
+    async def get(self, key: str) -> Optional[Dict]:
+        entry = self._cache.get(key)
+        return entry["value"] if entry else None
+
+    async def set(self, key: str, value: Dict, embedding: Optional[List[float]] = None) -> None:
+        self._cache.set(key, {"value": value, "embedding": _unit(embedding) if embedding else None})
+
+    async def search(self, embedding: List[float], min_similarity: float) -> Optional[Dict]:
+        query = _unit(embedding)
+        best_value, best_similarity = None, min_similarity
+        for _, entry in self._cache.items():
+            if not entry["embedding"]:
+                continue
+            similarity = sum(a * b for a, b in zip(query, entry["embedding"]))
+            if similarity >= best_similarity:
+                best_value, best_similarity = entry["value"], similarity
+        return best_value
+
+    def stats(self) -> Dict:
+        return self._cache.stats()
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        backend: ResponseCacheBackend,
+        embedder: Optional[Embedder] = None,
+        min_similarity: float = 0.92,
+    ):
+        self.backend = backend
+        self.embedder = embedder
+        self.min_similarity = min_similarity
+        # A miss embeds the query once for the lookup and reuses it for the store
+        self._embeddings = TTLCache(max_entries=256, ttl=120.0)
+
+    async def _embed(self, text: str) -> Optional[List[float]]:
+        embedding = self._embeddings.get(text)
+        if embedding is None:
+            try:
+                embedding = await self.embedder(text)
+            except Exception:
+                # A failed embedding only costs us the semantic lookup
+                metrics.increment("peka.response_cache.embed_errors")
+                return None
+            self._embeddings.set(text, embedding)
+        return embedding
+
+    async def get(self, query: str) -> Optional[Dict]:
+        key = normalize_query(query)
+        value = await self.backend.get(key)
+        if value is not None:
+            metrics.increment("peka.response_cache.exact_hits")
+            return value
+        if self.embedder:
+            embedding = await self._embed(key)
+            if embedding:
+                value = await self.backend.search(embedding, self.min_similarity)
+                if value is not None:
+                    metrics.increment("peka.response_cache.semantic_hits")
+                    return value
+        metrics.increment("peka.response_cache.lookup_misses")
+        return None
+
+    async def set(self, query: str, value: Dict) -> None:
+        key = normalize_query(query)
+        embedding = await self._embed(key) if self.embedder else None
+        await self.backend.set(key, value, embedding)
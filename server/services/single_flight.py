@@ -0,0 +1,62 @@
+"""Single-flight coalescing for identical in-flight upstream calls.
+
+Concurrent callers with the same key share one execution and all receive its
+result (followers get a deep copy, so nobody mutates a shared object). The
+shared call is only cancelled once every caller waiting on it has gone away.
+"""
+import asyncio
+import copy
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict, TypeVar
+
+from core.metrics import metrics
+
+T = TypeVar("T")
+
+
+def make_key(*parts: Any) -> str:
+    """Stable digest of a prompt and its call parameters."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self, name: str = "peka.single_flight"):
+        self.name = name
+        self._calls: Dict[str, _Call] = {}
+
+    def _forget(self, key: str, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        call = self._calls.get(key)
+        leader = call is None
+        if leader:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+            metrics.increment(f"{self.name}.calls")
+        else:
+            metrics.increment(f"{self.name}.coalesced")
+        metrics.set_gauge(f"{self.name}.inflight", len(self._calls))
+
+        call.waiters += 1
+        try:
+            result = await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+        return result if leader else copy.deepcopy(result)
+
+    def inflight(self) -> int:
+        return len(self._calls)
@@ -0,0 +1,175 @@
+"""Parse LLM JSON output into Peka's response models in one pass.
+
+The pinned Cohere SDK has no JSON or tool-calling mode for ``generate``, so
+structure is enforced here instead: the first JSON object in the text is taken
+(ignoring markdown fences and chatter around it), output cut off by
+``max_tokens`` or a stop sequence is repaired by closing the open string and
+brackets and dropping the incomplete trailing field, missing fields are filled
+from caller-supplied defaults, and the result is validated once against the
+pydantic model.
+
+Per-schema counters (``peka.structured.<name>.*``) record clean parses,
+repairs and failures, plus ``wasted_retries``: the same prompt sent again
+shortly after its output could not be parsed - usually the user retrying.
+"""
+import json
+import logging
+import re
+from typing import Any, Callable, Dict, Hashable, Optional, Type, TypeVar, Union
+
+from pydantic import BaseModel, ValidationError
+
+from core.cache import TTLCache
+from core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+M = TypeVar("M", bound=BaseModel)
+
+_FENCE_RE = re.compile(r"```(?:json)?", re.IGNORECASE)
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+_CLOSERS = {"{": "}", "[": "]"}
+
+# Prompts whose output recently failed to parse, to spot the retries that follow
+_recent_failures = TTLCache(max_entries=4096, ttl=600.0)
+
+
+class StructuredOutputError(ValueError):
+    pass
+
+
+def extract_json(text: str) -> Optional[str]:
+    """The text from the first '{' on, without markdown fences; None if there is no object."""
+    text = _FENCE_RE.sub("", text or "")
+    start = text.find("{")
+    return text[start:].strip() if start != -1 else None
+
+
+def _scan(text: str):
+    """Return (end of the first complete top-level value or None, open bracket stack,
+    start of an unterminated string or None, whether the text ends mid-escape)."""
+    stack, string_start, escaped = [], None, False
+    for i, ch in enumerate(text):
+        if string_start is not None:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                string_start = None
+        elif ch == '"':
+            string_start = i
+        elif ch in _CLOSERS:
+            stack.append(ch)
+        elif ch in "}]" and stack:
+            stack.pop()
+            if not stack:
+                return i + 1, stack, None, False
+    return None, stack, string_start, escaped
+
+
+def _close(text: str) -> str:
+    _, stack, string_start, escaped = _scan(text)
+    if string_start is not None:
+        if string_start == len(text) - 1:
+            # A string cut off right after its opening quote carries nothing; drop it
+            text = text[:-1]
+        else:
+            text = (text[:-1] if escaped else text) + '"'
+    text = _TRAILING_COMMA_RE.sub(r"\1", text.rstrip().rstrip(","))
+    return text + "".join(_CLOSERS[ch] for ch in reversed(stack))
+
+
+def repair_json(text: str) -> Dict[str, Any]:
+    """Best-effort parse of a truncated JSON object.
+
+    Closes an unterminated string and any open brackets; if that is still not
+    valid (e.g. the text stops after a key), cuts back to the previous comma
+    and tries again, so only the incomplete trailing field is lost.
+    """
+    candidate = text
+    while candidate:
+        try:
+            value = json.loads(_close(candidate))
+            if isinstance(value, dict):
+                return value
+        except json.JSONDecodeError:
+            pass
+        cut = candidate.rfind(",")
+        if cut <= 0:
+            break
+        candidate = candidate[:cut]
+    raise StructuredOutputError("Could not repair JSON output")
+
+
+def _load(text: str):
+    """Parse the first JSON object in text; returns (data, repaired)."""
+    body = extract_json(text)
+    if body is None:
+        raise StructuredOutputError("No JSON object in output")
+    end = _scan(body)[0]
+    if end is not None:
+        try:
+            return json.loads(_TRAILING_COMMA_RE.sub(r"\1", body[:end])), False
+        except json.JSONDecodeError:
+            pass
+    return repair_json(body if end is None else body[:end]), True
+
+
+def _fill(data: Dict[str, Any], defaults: Dict[str, Any]) -> Dict[str, Any]:
+    """Add missing (or null) fields from defaults, recursing into nested objects."""
+    merged = dict(data)
+    for key, default in defaults.items():
+        value = merged.get(key)
+        if value is None:
+            merged[key] = default
+        elif isinstance(value, dict) and isinstance(default, dict):
+            merged[key] = _fill(value, default)
+    return merged
+
+
+def parse_structured(
+    name: str,
+    text: str,
+    model: Type[M],
+    defaults: Union[Dict[str, Any], Callable[[Dict[str, Any]], Dict[str, Any]], None] = None,
+    retry_key: Optional[Hashable] = None,
+) -> M:
+    """Extract, repair, fill and validate LLM output as ``model``.
+
+    defaults may be a function of the parsed data, for fields whose fallback
+    depends on other fields (e.g. task details only for a 'create' intent).
+    retry_key identifies the request (e.g. a digest of the prompt); a repeat of
+    a recently failed key is counted as a wasted retry.
+    """
+    prefix = f"peka.structured.{name}"
+    metrics.increment(f"{prefix}.calls")
+    if retry_key is not None and _recent_failures.get(retry_key) is not None:
+        metrics.increment(f"{prefix}.wasted_retries")
+    try:
+        data, repaired = _load(text)
+        if repaired:
+            metrics.increment(f"{prefix}.repaired")
+        if defaults:
+            data = _fill(data, defaults(data) if callable(defaults) else defaults)
+        return model.model_validate(data)
+    except (StructuredOutputError, ValidationError) as e:
+        metrics.increment(f"{prefix}.failures")
+        if retry_key is not None:
+            _recent_failures.set(retry_key, True)
+        logger.error(f"Structured output '{name}' failed validation: {str(e)}; output: {text!r}")
+        raise StructuredOutputError(str(e)) from e
+
+
+def structured_output_stats() -> Dict[str, Dict[str, float]]:
+    """Per-schema call, repair and failure counts with the resulting failure rate."""
+    counters = metrics.snapshot()["counters"]
+    stats: Dict[str, Dict[str, float]] = {}
+    for key, value in counters.items():
+        if key.startswith("peka.structured."):
+            name, _, field = key[len("peka.structured."):].rpartition(".")
+            stats.setdefault(name, {})[field] = value
+    for entry in stats.values():
+        calls = entry.get("calls", 0)
+        entry["failure_rate"] = entry.get("failures", 0) / calls if calls else 0.0
+    return stats
@@ -0,0 +1,50 @@
+"""Background AI enrichment for todos created through /api/peka/create-task."""
+import logging
+from typing import Dict
+
+from schemas.todo import Todo, TodoCreate
+from services.llm_scheduler import LLMScheduler
+from services.peka_service import PekaService
+from services.todo_service import get_todo, update_todo
+
+logger = logging.getLogger(__name__)
+
+
+async def enrich_todo(peka_service: PekaService, scheduler: LLMScheduler, todo: Todo, user_id: int) -> Dict:
+    """Ask Peka to review a freshly created todo and write its improved description back.
+
+    Title, priority and duration were chosen by the user, so they are only returned
+    as suggestions. If the todo was edited while the job waited, the row is left alone.
+    """
+    task_details = {
+        "title": todo.title,
+        "description": todo.description,
+        "priority": todo.priority.value,
+        "estimated_duration": todo.estimated_duration or 30,
+    }
+    async with scheduler.slot(user_id, lane="batch"):
+        suggestion = await peka_service.suggest_task(task_details)
+
+    current = await get_todo(todo.id, user_id)
+    updated = current.description == todo.description and bool(suggestion.description.strip())
+    if updated:
+        current = await update_todo(
+            todo.id,
+            TodoCreate(
+                title=current.title,
+                description=suggestion.description.strip(),
+                priority=current.priority,
+                estimated_duration=current.estimated_duration,
+            ),
+            user_id,
+        )
+    else:
+        logger.info(f"Todo {todo.id} changed while enrichment was queued; keeping the user's version")
+
+    return {
+        "task_id": todo.id,
+        "updated": updated,
+        "todo": current.model_dump(mode="json"),
+        "message": suggestion.message,
+        "suggestions": suggestion.model_dump(exclude={"task_id", "message"}),
+    }
@@ -0,0 +1,274 @@
+"""Per-user embedding index over todos, for semantic search and duplicate detection.
+
+Each user's todos (title and description) are embedded into rows of a
+normalized float32 NumPy matrix, so a search is one matrix-vector product and a
+partial sort. A user's index is built from the database on first use and then
+kept current by todo_repo on create, update and delete: new rows are appended
+(capacity doubles as needed), updates overwrite their row, deletes move the last
+row into the gap. Embeddings are cached by text, so rebuilding an index or
+saving an unchanged todo never embeds the same text twice.
+
+Indexes live per worker process, bounded by user count and rebuilt after
+PEKA_TODO_INDEX_TTL so writes handled by other workers show up eventually.
+
+Embedders: Cohere (``CohereEmbedder``) or ``HashingEmbedder``, a deterministic
+local stand-in (hashed words and character trigrams) for tests, benchmarks and
+deployments without a Cohere key.
+"""
+import hashlib
+import logging
+import threading
+import zlib
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from core.cache import TTLCache
+from core.config import (
+    COHERE_API_KEY,
+    PEKA_EMBED_MODEL,
+    PEKA_TODO_EMBED_CACHE_ENTRIES,
+    PEKA_TODO_EMBEDDER,
+    PEKA_TODO_INDEX_MAX_USERS,
+    PEKA_TODO_INDEX_TTL,
+)
+from core.metrics import metrics
+from schemas.todo import Todo
+
+logger = logging.getLogger(__name__)
+
+TodoLoader = Callable[[int], List[Todo]]
+
+
+def todo_text(title: str, description: Optional[str]) -> str:
+    return f"{title}\n{description or ''}".strip()
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return (matrix / np.where(norms == 0, 1, norms)).astype(np.float32)
+
+
+class HashingEmbedder:
+    """Deterministic bag of hashed words and character trigrams; no model, no network."""
+    name = "hashing"
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def _features(self, text: str) -> List[str]:
+        words = text.lower().split()
+        grams = [f"#{word}#"[i:i + 3] for word in words for i in range(len(word))]
+        return words + grams
+
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                # crc32 rather than hash(): str hashes are salted per process
+                h = zlib.crc32(feature.encode())
+                matrix[row, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        return _normalize(matrix)
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return self.embed_documents([text])[0]
+
+
+class CohereEmbedder:
+    name = "cohere"
+    batch_size = 96  # Most texts Cohere's embed endpoint takes per call
+
+    def __init__(self, api_key: str, model: str = PEKA_EMBED_MODEL):
+        import cohere
+
+        self.client = cohere.Client(api_key=api_key)
+        self.model = model
+        self.dim = None
+
+    def _embed(self, texts: List[str], input_type: str) -> np.ndarray:
+        rows = []
+        for start in range(0, len(texts), self.batch_size):
+            response = self.client.embed(
+                texts=texts[start:start + self.batch_size], model=self.model, input_type=input_type
+            )
+            rows.extend(response.embeddings)
+        matrix = _normalize(np.asarray(rows, dtype=np.float32))
+        self.dim = matrix.shape[1]
+        return matrix
+
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        return self._embed(texts, "search_document")
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return self._embed([text], "search_query")[0]
+
+
+def create_embedder(name: str = PEKA_TODO_EMBEDDER):
+    if name == "cohere" and COHERE_API_KEY:
+        return CohereEmbedder(COHERE_API_KEY)
+    if name == "cohere":
+        logger.warning("COHERE_API_KEY not set; todo search uses the local hashing embedder")
+    return HashingEmbedder()
+
+
+class UserIndex:
+    """One user's todos and their embedding rows."""
+
+    def __init__(self, dim: int, capacity: int = 16):
+        self.dim = dim
+        self.size = 0
+        self._matrix = np.zeros((capacity, dim), dtype=np.float32)
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._positions: Dict[int, int] = {}
+        self.todos: Dict[int, Todo] = {}
+
+    def upsert(self, todo: Todo, vector: np.ndarray) -> None:
+        if not self.size and len(vector) != self.dim:
+            # An index built empty learns its width from the first vector
+            self.dim = len(vector)
+            self._matrix = np.zeros((len(self._ids), self.dim), dtype=np.float32)
+        position = self._positions.get(todo.id)
+        if position is None:
+            if self.size == len(self._ids):
+                self._matrix = np.concatenate([self._matrix, np.zeros_like(self._matrix)])
+                self._ids = np.concatenate([self._ids, np.zeros_like(self._ids)])
+            position = self.size
+            self.size += 1
+            self._positions[todo.id] = position
+            self._ids[position] = todo.id
+        self._matrix[position] = vector
+        self.todos[todo.id] = todo
+
+    def remove(self, todo_id: int) -> None:
+        position = self._positions.pop(todo_id, None)
+        if position is None:
+            return
+        last = self.size - 1
+        if position != last:
+            # Fill the gap with the last row so the live rows stay contiguous
+            moved = int(self._ids[last])
+            self._matrix[position] = self._matrix[last]
+            self._ids[position] = moved
+            self._positions[moved] = position
+        self.size = last
+        del self.todos[todo_id]
+
+    def search(self, vector: np.ndarray, limit: int) -> List[Tuple[Todo, float]]:
+        """The limit todos most similar to vector (cosine), best first."""
+        if not self.size or limit <= 0:
+            return []
+        scores = self._matrix[:self.size] @ vector
+        limit = min(limit, self.size)
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top])]
+        return [(self.todos[int(self._ids[i])], float(scores[i])) for i in top]
+
+
+class TodoIndex:
+    def __init__(
+        self,
+        embedder,
+        max_users: int,
+        ttl: float,
+        cache_entries: int,
+        embedder_factory: Optional[Callable[[], object]] = None,
+    ):
+        """Pass an embedder, or None and an embedder_factory to build it on first use."""
+        self._embedder = embedder
+        self._embedder_factory = embedder_factory
+        self._embedder_lock = threading.Lock()
+        self._users = TTLCache(max_entries=max_users, ttl=ttl, name="peka.todo_index")
+        # An embedding never goes stale; the TTL only ages out texts nobody has anymore
+        self._embeddings = TTLCache(max_entries=cache_entries, ttl=7 * 86400, name="peka.todo_embeddings")
+        self._lock = threading.Lock()
+
+    @property
+    def embedder(self):
+        if self._embedder is None:
+            with self._embedder_lock:
+                if self._embedder is None:
+                    self._embedder = self._embedder_factory()
+        return self._embedder
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        """Document embeddings for texts, only calling the embedder for texts not seen before."""
+        keys = [(self.embedder.name, hashlib.sha256(text.encode()).hexdigest()) for text in texts]
+        vectors: List[Optional[np.ndarray]] = [self._embeddings.get(key) for key in keys]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            metrics.increment("peka.todo_index.embedded", len(missing))
+            with metrics.timer("peka.todo_index.embed"):
+                fresh = self.embedder.embed_documents([texts[i] for i in missing])
+            for i, vector in zip(missing, fresh):
+                self._embeddings.set(keys[i], vector)
+                vectors[i] = vector
+        return np.stack(vectors) if vectors else np.zeros((0, self.embedder.dim or 0), dtype=np.float32)
+
+    def load(self, user_id: int, loader: TodoLoader) -> UserIndex:
+        """The user's index, built from loader(user_id) if it is not in memory."""
+        index = self._users.get(user_id)
+        if index is not None:
+            return index
+        with metrics.timer("peka.todo_index.build"):
+            todos = loader(user_id)
+            vectors = self._embed([todo_text(todo.title, todo.description) for todo in todos])
+            index = UserIndex(vectors.shape[1] if len(todos) else (self.embedder.dim or 0), max(16, len(todos)))
+            for todo, vector in zip(todos, vectors):
+                index.upsert(todo, vector)
+        with self._lock:
+            # Another request may have built it meanwhile; keep the one already serving
+            existing = self._users.get(user_id)
+            if existing is not None:
+                return existing
+            self._users.set(user_id, index)
+        return index
+
+    def upsert(self, todo: Todo) -> None:
+        """Add or refresh a todo in its user's index, if that index is loaded."""
+        if self._users.get(todo.user_id) is None:
+            return
+        try:
+            vector = self._embed([todo_text(todo.title, todo.description)])[0]
+        except Exception as e:
+            # Rebuilt from the database on next use rather than left missing this todo
+            logger.error(f"Failed to index todo {todo.id}: {str(e)}")
+            self._users.delete(todo.user_id)
+            return
+        with self._lock:
+            index = self._users.get(todo.user_id)
+            if index is not None:
+                index.upsert(todo, vector)
+
+    def remove(self, user_id: int, todo_id: int) -> None:
+        with self._lock:
+            index = self._users.get(user_id)
+            if index is not None:
+                index.remove(todo_id)
+
+    def search(self, user_id: int, query: str, loader: TodoLoader, limit: int = 10) -> List[Tuple[Todo, float]]:
+        index = self.load(user_id, loader)
+        with metrics.timer("peka.todo_index.query_embed"):
+            vector = self.embedder.embed_query(query)
+        with self._lock, metrics.timer("peka.todo_index.search"):
+            return index.search(vector, limit)
+
+    def similar(
+        self, user_id: int, title: str, description: str, loader: TodoLoader, threshold: float, limit: int = 3
+    ) -> List[Tuple[Todo, float]]:
+        """Existing todos whose text is at least threshold-similar to this title and description."""
+        index = self.load(user_id, loader)
+        vector = self._embed([todo_text(title, description)])[0]
+        with self._lock:
+            matches = index.search(vector, limit)
+        return [(todo, score) for todo, score in matches if score >= threshold]
+
+    def invalidate_user(self, user_id: int) -> None:
+        self._users.delete(user_id)
+
+
+# The embedder is built when the index is first used, so importing this module (every
+# process that imports todo_service) neither builds a client nor logs the fallback warning
+todo_index = TodoIndex(
+    None, PEKA_TODO_INDEX_MAX_USERS, PEKA_TODO_INDEX_TTL, PEKA_TODO_EMBED_CACHE_ENTRIES,
+    embedder_factory=create_embedder,
+)
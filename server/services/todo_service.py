@@ -1,41 +1,88 @@
-from schemas.todo import TodoCreate
-from repositories.todo_repo import create_todo as repo_create_todo, get_user_todos as repo_get_user_todos, get_todo as repo_get_todo, update_todo as repo_update_todo, delete_todo as repo_delete_todo
+import asyncio
+from schemas.todo import Progress, TodoCreate, TodoCreated, TodoMatch, TodoSearchResult
+from repositories.todo_repo import create_todo as repo_create_todo, get_user_todos as repo_get_user_todos, get_open_tasks as repo_get_open_tasks, get_todo as repo_get_todo, update_todo as repo_update_todo, delete_todo as repo_delete_todo
+from services.analysis_cache import analysis_cache
+from services.todo_index import todo_index
+from core.config import PEKA_TODO_DUPLICATE_SIMILARITY
 from fastapi import HTTPException
 
-def create_todo(todo: TodoCreate, user_id: int):
-    """Create a new todo item"""
+def _todo_loader(loop: asyncio.AbstractEventLoop):
+    """A todo_index loader for worker threads: fetches through the async repository on loop"""
+    return lambda user_id: asyncio.run_coroutine_threadsafe(repo_get_user_todos(user_id), loop).result()
+
+async def find_duplicates(todo: TodoCreate, user_id: int):
+    """Existing todos that look like the same task as this one (empty if the index is unavailable)"""
+    try:
+        # Building the index and embedding text block, so the index runs in a worker thread
+        matches = await asyncio.to_thread(
+            todo_index.similar, user_id, todo.title, todo.description,
+            _todo_loader(asyncio.get_running_loop()), PEKA_TODO_DUPLICATE_SIMILARITY
+        )
+        return [TodoMatch(id=match.id, title=match.title, score=round(score, 3)) for match, score in matches]
+    except Exception as e:
+        # Only a warning; never a reason to fail the create
+        print(f"Error checking for duplicate todos: {str(e)}")
+        return []
+
+async def create_todo(todo: TodoCreate, user_id: int):
+    """Create a new todo item, listing existing todos that look like duplicates"""
     try:
         print(f"Creating todo for user {user_id}: {todo.dict()}")
+        # Checked before the insert, so the new todo does not match itself
+        duplicates = await find_duplicates(todo, user_id)
         data = {
             "user_id": user_id,
             "title": todo.title,
             "description": todo.description,
             "priority": todo.priority,
-            "estimated_duration": todo.estimated_duration
+            "estimated_duration": todo.estimated_duration,
+            "progress": todo.progress or Progress.NOT_STARTED
         }
         print(f"Formatted data for database: {data}")
-        result = repo_create_todo(data)
+        result = await repo_create_todo(data)
         if result is None:
             raise HTTPException(status_code=500, detail="Failed to create todo")
-        return result
+        analysis_cache.invalidate_user(user_id)
+        return TodoCreated(**result.model_dump(), possible_duplicates=duplicates)
     except Exception as e:
         print(f"Error in create_todo service: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-def get_user_todos(user_id: int):
+async def get_user_todos(user_id: int):
     """Get all todos for a specific user"""
     try:
         print(f"Getting todos for user {user_id}")
-        return repo_get_user_todos(user_id)
+        return await repo_get_user_todos(user_id)
     except Exception as e:
         print(f"Error in get_user_todos service: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-def get_todo(todo_id: int, user_id: int):
+async def search_todos(user_id: int, query: str, limit: int):
+    """The user's todos most similar in meaning to query, best first"""
+    try:
+        print(f"Searching todos for user {user_id}: {query}")
+        matches = await asyncio.to_thread(
+            todo_index.search, user_id, query, _todo_loader(asyncio.get_running_loop()), limit
+        )
+        return [TodoSearchResult(todo=todo, score=round(score, 3)) for todo, score in matches]
+    except Exception as e:
+        print(f"Error in search_todos service: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def get_tasks_for_analysis(user_id: int, limit: int):
+    """Get the user's open tasks for Peka analysis (newest first, at most limit)"""
+    try:
+        print(f"Getting tasks for analysis for user {user_id}")
+        return await repo_get_open_tasks(user_id, limit)
+    except Exception as e:
+        print(f"Error in get_tasks_for_analysis service: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def get_todo(todo_id: int, user_id: int):
     """Get a specific todo by ID and user_id"""
     try:
         print(f"Getting todo {todo_id} for user {user_id}")
-        todo = repo_get_todo(todo_id, user_id)
+        todo = await repo_get_todo(todo_id, user_id)
         if todo is None:
             raise HTTPException(status_code=404, detail="Todo not found")
         return todo
@@ -45,14 +92,18 @@ def get_todo(todo_id: int, user_id: int):
         print(f"Error in get_todo service: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-def update_todo(todo_id: int, todo: TodoCreate, user_id: int):
+async def update_todo(todo_id: int, todo: TodoCreate, user_id: int):
     """Update a todo item"""
     try:
         print(f"Updating todo {todo_id} for user {user_id}: {todo.dict()}")
         data = todo.model_dump()
-        result = repo_update_todo(todo_id, user_id, data)
+        if data["progress"] is None:
+            # A client that does not send progress leaves it as it is
+            del data["progress"]
+        result = await repo_update_todo(todo_id, user_id, data)
         if result is None:
             raise HTTPException(status_code=404, detail="Todo not found")
+        analysis_cache.invalidate_user(user_id)
         return result
     except HTTPException as he:
         raise he
@@ -60,12 +111,13 @@ def update_todo(todo_id: int, todo: TodoCreate, user_id: int):
         print(f"Error in update_todo service: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-def delete_todo(todo_id: int, user_id: int):
+async def delete_todo(todo_id: int, user_id: int):
     """Delete a todo item"""
     try:
         print(f"Deleting todo {todo_id} for user {user_id}")
-        if not repo_delete_todo(todo_id, user_id):
+        if not await repo_delete_todo(todo_id, user_id):
             raise HTTPException(status_code=404, detail="Todo not found")
+        analysis_cache.invalidate_user(user_id)
         return True
     except HTTPException as he:
         raise he
@@ -0,0 +1,60 @@
+"""Per-worker cache of verified access tokens.
+
+A client sends the same bearer token on every request until it expires, so
+``get_current_user`` would otherwise repeat the HMAC check, claim parsing and
+TokenData validation hundreds of times for one token. Verified payloads are
+cached under the SHA-256 digest of the token (the token itself is never kept as
+a key) until the token's ``exp``, with scopes as a frozenset so scope checks are
+set lookups. Tokens that fail verification or have no ``exp`` are not cached.
+"""
+import hashlib
+import time
+from typing import FrozenSet, NamedTuple, Optional
+
+import jwt
+
+from core.cache import TTLCache
+from core.config import ALGORITHM, AUTH_TOKEN_CACHE_MAX_ENTRIES, SECRET_KEY
+from schemas.auth import TokenData
+
+
+class VerifiedToken(NamedTuple):
+    subject: Optional[str]
+    scopes: FrozenSet[str]
+
+
+class TokenCache:
+    def __init__(self, max_entries: int, secret_key: str = SECRET_KEY, algorithm: str = ALGORITHM):
+        self.secret_key = secret_key
+        self.algorithm = algorithm
+        # Every entry gets its own TTL from the token's exp
+        self._cache = TTLCache(max_entries=max_entries, name="auth.token_cache")
+
+    def verify(self, token: str) -> VerifiedToken:
+        """The token's subject and scopes, decoding and validating it only on a cache miss.
+
+        Raises what jwt.decode and TokenData raise for a bad token (ExpiredSignatureError,
+        InvalidTokenError, ValidationError).
+        """
+        key = hashlib.sha256(token.encode()).digest()
+        verified = self._cache.get(key)
+        if verified is not None:
+            return verified
+        payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
+        token_data = TokenData(scopes=payload.get("scopes", []), username=payload.get("sub"))
+        verified = VerifiedToken(token_data.username, frozenset(token_data.scopes))
+        exp = payload.get("exp")
+        if isinstance(exp, (int, float)):
+            ttl = exp - time.time()
+            if ttl > 0:
+                self._cache.set(key, verified, ttl=ttl)
+        return verified
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self):
+        return self._cache.stats()
+
+
+token_cache = TokenCache(AUTH_TOKEN_CACHE_MAX_ENTRIES)
@@ -0,0 +1,59 @@
+"""Per-worker cache of authenticated users, keyed by JWT subject (the user's email).
+
+``get_current_user`` runs on every authenticated request; without this cache
+each one paid a Supabase round-trip for the ``users`` row before doing any work.
+Users are kept for AUTH_USER_CACHE_TTL seconds. A subject with no user is
+remembered for the much shorter AUTH_USER_CACHE_NEGATIVE_TTL, so a token for a
+missing user cannot make every request query the database. Database errors are
+never cached.
+
+Writes to ``users`` (create_or_update_oauth_user, POST /api/users/) call
+``invalidate``; other workers pick the change up within the TTL. Lookups are
+counted as ``auth.user_cache.hits``/``misses``, with ``auth.user_cache.hit_rate``
+as a gauge.
+"""
+from typing import Awaitable, Callable, Optional
+
+from core.cache import TTLCache
+from core.config import AUTH_USER_CACHE_MAX_ENTRIES, AUTH_USER_CACHE_NEGATIVE_TTL, AUTH_USER_CACHE_TTL
+from core.metrics import metrics
+from schemas.user import UserInDB
+
+# Cached for subjects with no user row; distinct from a cache miss (None)
+_UNKNOWN = object()
+
+
+class UserCache:
+    def __init__(self, max_entries: int, ttl: float, negative_ttl: float):
+        self.negative_ttl = negative_ttl
+        self._cache = TTLCache(max_entries=max_entries, ttl=ttl, name="auth.user_cache")
+
+    async def get_or_load(
+        self, subject: str, loader: Callable[[str], Awaitable[Optional[UserInDB]]]
+    ) -> Optional[UserInDB]:
+        """The user for subject, from the cache or await loader(subject); None if there is no such user."""
+        user = self._cache.get(subject)
+        metrics.set_gauge("auth.user_cache.hit_rate", self._cache.stats()["hit_rate"])
+        if user is _UNKNOWN:
+            return None
+        if user is not None:
+            return user
+        # Exceptions propagate uncached: a database outage is not an unknown user
+        user = await loader(subject)
+        if user is None:
+            self._cache.set(subject, _UNKNOWN, ttl=self.negative_ttl)
+        else:
+            self._cache.set(subject, user)
+        return user
+
+    def invalidate(self, subject: str) -> None:
+        self._cache.delete(subject)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self):
+        return self._cache.stats()
+
+
+user_cache = UserCache(AUTH_USER_CACHE_MAX_ENTRIES, AUTH_USER_CACHE_TTL, AUTH_USER_CACHE_NEGATIVE_TTL)
@@ -0,0 +1,43 @@
+import asyncio
+import os
+from collections import Counter
+
+import pytest
+
+# Tests never reach Supabase; the clients only need a URL and a JWT-shaped key to be built
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_API_KEY", "test.test.test")
+
+from services.llm_backends import SyntheticBackend, synthetic_response
+
+
+class CountingBackend(SyntheticBackend):
+    """Synthetic backend that counts upstream calls by kind (generate, stream, chat, embed)."""
+
+    def __init__(self, latency_ms: float = 0.0, error: Exception = None, **kwargs):
+        self.calls = Counter()
+        self.error = error  # Raised by every call, after it is counted
+        super().__init__(latency_ms=latency_ms, sigma=0.0, responder=self._respond, **kwargs)
+
+    def _respond(self, kind: str, prompt: str, params):
+        self.calls[kind] += 1
+        if self.error is not None:
+            raise self.error
+        return synthetic_response(kind, prompt, params)
+
+
+@pytest.fixture
+def make_backend():
+    """CountingBackend's constructor, for tests that need latency or errors."""
+    return CountingBackend
+
+
+@pytest.fixture
+def backend():
+    return CountingBackend()
+
+
+@pytest.fixture
+def run():
+    """Run a coroutine to completion on a fresh event loop."""
+    return asyncio.run
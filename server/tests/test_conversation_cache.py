@@ -0,0 +1,65 @@
+from services.conversation_memory import ConversationMemory, refers_back
+from services.peka_service import PekaService
+
+STANDALONE = "How can I stay focused while working from home?"
+
+
+def make_service(backend):
+    memory = ConversationMemory(max_users=10, ttl=3600, turn_tokens=400, summary_tokens=150)
+    return PekaService("test-key", memory=memory, backend=backend)
+
+
+def test_refers_back():
+    assert refers_back("What about that one?")
+    assert refers_back("why?")
+    assert refers_back("Can you explain it again")
+    assert not refers_back(STANDALONE)
+    assert not refers_back("How can I be more productive in the mornings?")
+
+
+def test_repeated_standalone_query_with_history_is_served_from_cache(backend, run):
+    service = make_service(backend)
+
+    async def scenario():
+        try:
+            await service.handle_query(STANDALONE, user_id=1)
+            assert service.memory.context(1)
+            await service.handle_query(STANDALONE, user_id=1)
+            # Another user with their own history shares the cached answer
+            await service.handle_query("What is a good way to take breaks during the day?", user_id=2)
+            await service.handle_query(STANDALONE, user_id=2)
+        finally:
+            await service.close()
+
+    run(scenario())
+    assert backend.calls["chat"] == 2
+
+
+def test_follow_up_uses_history_and_skips_cache(backend, run):
+    service = make_service(backend)
+
+    async def scenario():
+        try:
+            await service.handle_query(STANDALONE, user_id=1)
+            await service.handle_query("Can you explain that again?", user_id=1)
+            await service.handle_query("Can you explain that again?", user_id=1)
+        finally:
+            await service.close()
+
+    run(scenario())
+    assert backend.calls["chat"] == 3
+
+
+def test_stream_query_serves_standalone_repeat_from_cache(backend, run):
+    service = make_service(backend)
+
+    async def scenario():
+        try:
+            for _ in range(2):
+                events = [event async for event, _ in service.stream_query(STANDALONE, user_id=1)]
+                assert events[-1] == "final"
+        finally:
+            await service.close()
+
+    run(scenario())
+    assert backend.calls["stream"] == 1
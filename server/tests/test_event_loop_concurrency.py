@@ -0,0 +1,64 @@
+import asyncio
+import time
+
+import httpx
+
+from api.dependencies import get_current_user
+from api.routes import todo as todo_routes
+from benchmarks.common import percentile
+from main import app
+from schemas.user import User
+from services.llm_scheduler import LLMScheduler
+from services.peka_service import PekaService
+
+LLM_SECONDS = 1.0
+INFLIGHT = 8
+
+
+async def sample_todo_latency(client: httpx.AsyncClient, samples: int):
+    latencies = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        response = await client.get("/api/todo/")
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.01)
+    return latencies
+
+
+def test_todo_latency_holds_while_llm_calls_are_in_flight(make_backend, run, monkeypatch):
+    service = PekaService("test-key", backend=make_backend(latency_ms=LLM_SECONDS * 1000))
+    monkeypatch.setattr(app.state, "peka_service", service, raising=False)
+    # ASGITransport does not run the lifespan; admit every request so only the event loop is measured
+    scheduler = LLMScheduler(max_concurrency=10_000, max_queue_depth=10_000, max_batch_concurrency=1)
+    monkeypatch.setattr(app.state, "llm_scheduler", scheduler, raising=False)
+    monkeypatch.setitem(
+        app.dependency_overrides, get_current_user, lambda: User(id=1, name="test", email="test@example.com")
+    )
+
+    async def no_todos(user_id):
+        return []
+    monkeypatch.setattr(todo_routes, "get_user_todos", no_todos)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=None) as client:
+                inflight = [
+                    # Distinct queries so neither the response cache nor coalescing hides the LLM latency
+                    asyncio.create_task(client.post("/api/peka/query", json={"query": f"how do I stop procrastinating {i}"}))
+                    for i in range(INFLIGHT)
+                ]
+                await asyncio.sleep(0.05)
+                busy = await sample_todo_latency(client, 20)
+                still_running = sum(not task.done() for task in inflight)
+                responses = await asyncio.gather(*inflight)
+        finally:
+            await service.close()
+        return busy, still_running, responses
+
+    busy, still_running, responses = run(scenario())
+    assert all(response.status_code == 200 for response in responses)
+    # Calls that block the event loop finish one after another before any todo request is served
+    assert still_running == INFLIGHT, "LLM calls finished before the todo requests were measured"
+    assert percentile(busy, 95) < LLM_SECONDS * 0.1
@@ -0,0 +1,30 @@
+import httpx
+import pytest
+
+import api.dependencies as dependencies
+from main import app
+
+
+def get_metrics(run, client_host: str, headers=None) -> int:
+    async def request():
+        transport = httpx.ASGITransport(app=app, client=(client_host, 50000))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return (await client.get("/metrics", headers=headers)).status_code
+    return run(request())
+
+
+def test_without_token_only_loopback_clients_are_served(run, monkeypatch):
+    monkeypatch.setattr(dependencies, "PEKA_METRICS_TOKEN", None)
+    assert get_metrics(run, "127.0.0.1") == 200
+    assert get_metrics(run, "203.0.113.7") == 403
+
+
+@pytest.mark.parametrize("headers, expected", [
+    (None, 401),
+    ({"Authorization": "Bearer wrong"}, 401),
+    ({"Authorization": "Bearer s3cret"}, 200),
+])
+def test_with_token_every_client_must_send_it(headers, expected, run, monkeypatch):
+    monkeypatch.setattr(dependencies, "PEKA_METRICS_TOKEN", "s3cret")
+    assert get_metrics(run, "203.0.113.7", headers) == expected
+    assert get_metrics(run, "127.0.0.1", headers) == expected
@@ -0,0 +1,115 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from services.llm_backends import LLMBackend
+from services.peka_service import PekaService
+from services.resilience import expires_in
+
+
+class StalledResponse:
+    """Stands in for the aiohttp response under Cohere's StreamingGenerations."""
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class StalledStream:
+    def __init__(self):
+        self.response = StalledResponse()
+
+    async def __aiter__(self):
+        yield SimpleNamespace(text="Start ")
+        await asyncio.sleep(3600)
+        yield SimpleNamespace(text="never")
+
+
+class StalledBackend(LLMBackend):
+    name = "stalled"
+
+    def __init__(self):
+        self.streams = []
+        self.client = self
+        self.chat_model = None
+
+    async def generate(self, prompt, stream=False, **params):
+        if not stream:
+            return SimpleNamespace(generations=[SimpleNamespace(text="general")])
+        self.streams.append(StalledStream())
+        return self.streams[-1]
+
+    async def close(self):
+        pass
+
+
+def test_stalled_stream_is_closed_at_the_deadline(run):
+    backend = StalledBackend()
+    service = PekaService("test-key", backend=backend)
+
+    async def scenario():
+        chunks = []
+        start = time.monotonic()
+        try:
+            with pytest.raises(HTTPException) as error:
+                async for chunk in service._generate_stream("prompt", expires_at=expires_in(0.2)):
+                    chunks.append(chunk)
+            return chunks, error.value, time.monotonic() - start
+        finally:
+            await service.close()
+
+    chunks, error, elapsed = run(scenario())
+    assert chunks == ["Start "]
+    assert error.status_code == 504
+    assert elapsed < 1.0
+    assert backend.streams[0].response.closed
+
+
+def test_closing_the_query_stream_closes_the_upstream_stream(run):
+    backend = StalledBackend()
+    service = PekaService("test-key", backend=backend)
+
+    async def scenario():
+        try:
+            events = service.stream_query("how do I stay motivated", bypass_cache=True)
+            async for event, data in events:
+                if event == "token":
+                    break
+            # What the route does when the client disconnects
+            await events.aclose()
+        finally:
+            await service.close()
+
+    run(scenario())
+    assert len(backend.streams) == 1
+    assert backend.streams[0].response.closed
+
+
+def test_cancelling_the_consumer_closes_the_upstream_stream(run):
+    backend = StalledBackend()
+    service = PekaService("test-key", backend=backend)
+
+    async def scenario():
+        first_token = asyncio.Event()
+
+        async def consume():
+            async for event, _ in service.stream_query("how do I stay motivated", bypass_cache=True):
+                if event == "token":
+                    first_token.set()
+
+        try:
+            task = asyncio.create_task(consume())
+            await asyncio.wait_for(first_token.wait(), 5)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+        finally:
+            await service.close()
+
+    run(scenario())
+    assert backend.streams[0].response.closed
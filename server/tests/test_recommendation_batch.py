@@ -0,0 +1,67 @@
+import services.recommendation_batch as recommendation_batch
+from schemas.peka import Task
+from services.analysis_cache import analysis_cache
+from services.llm_scheduler import LLMScheduler
+from services.peka_service import PekaService
+from services.recommendation_batch import STAT_KEYS, RecommendationBatch
+
+TASKS = [
+    Task(id=1, user_id=1, title="Pay rent", description="", priority="high", created_at="2024-01-01T00:00:00"),
+    Task(id=2, user_id=1, title="Call John", description="", priority="low", created_at="2024-01-02T00:00:00"),
+]
+
+
+def make_batch(backend, monkeypatch, tmp_path):
+    service = PekaService("test-key", backend=backend)
+
+    async def get_recommendation(user_id):
+        return None
+
+    async def save_recommendation(*args):
+        pass
+    monkeypatch.setattr(recommendation_batch, "get_recommendation", get_recommendation)
+    monkeypatch.setattr(recommendation_batch, "save_recommendation", save_recommendation)
+    scheduler = LLMScheduler(max_concurrency=4, max_queue_depth=4, max_batch_concurrency=4)
+    return RecommendationBatch(service, scheduler, checkpoint_path=str(tmp_path / "checkpoint.json"), mode="hybrid")
+
+
+def test_analysis_cache_hits_are_not_counted_as_llm_calls(backend, run, monkeypatch, tmp_path):
+    batch = make_batch(backend, monkeypatch, tmp_path)
+    analysis_cache.invalidate_user(1)
+    stats = dict.fromkeys(STAT_KEYS, 0)
+
+    async def scenario():
+        try:
+            await batch._process_user(1, TASKS, stats)
+            # Same task set: served from the analysis cache
+            await batch._process_user(1, TASKS, stats)
+        finally:
+            await batch.peka_service.close()
+
+    run(scenario())
+    assert stats["computed"] == 2
+    assert stats["llm_calls"] == backend.calls["generate"] == 1
+
+
+def test_run_pages_through_users_with_open_tasks(backend, run, monkeypatch, tmp_path):
+    batch = make_batch(backend, monkeypatch, tmp_path)
+    batch.page_size = 2
+    # Users 1, 4 and 9 have open tasks; the others are never returned, so never visited
+    pages = {0: {1: TASKS, 4: TASKS}, 4: {9: TASKS}, 9: {}}
+    requested = []
+
+    async def get_open_tasks_page(after_user_id, page_size, limit):
+        requested.append(after_user_id)
+        return pages[after_user_id]
+    monkeypatch.setattr(recommendation_batch, "get_open_tasks_page", get_open_tasks_page)
+
+    async def scenario():
+        try:
+            return await batch.run(resume=False)
+        finally:
+            await batch.peka_service.close()
+
+    stats = run(scenario())
+    assert requested == [0, 4, 9]
+    assert stats["users"] == 3
+    assert stats["computed"] + stats["failed"] == 3 and stats["failed"] == 0
@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+from services.peka_service import PekaService
+
+N = 20
+PROMPT = "Summarize this conversation in one sentence."
+
+
+def test_identical_concurrent_queries_make_one_upstream_call(make_backend, run):
+    backend = make_backend(latency_ms=100)
+    service = PekaService("test-key", backend=backend)
+
+    async def scenario():
+        try:
+            return await asyncio.gather(*(service.handle_query("add a task to call John") for _ in range(N)))
+        finally:
+            await service.close()
+
+    results = run(scenario())
+    assert backend.calls["generate"] == 1
+    assert all(result["intent"] == "create" for result in results)
+    # Followers get copies, so no caller can mutate another's response
+    assert len({id(result) for result in results}) == N
+
+
+def test_every_joiner_gets_the_shared_error(make_backend, run):
+    backend = make_backend(latency_ms=100, error=ValueError("bad request"))
+    service = PekaService("test-key", backend=backend)
+
+    async def scenario():
+        try:
+            return await asyncio.gather(*(service._generate(PROMPT, max_tokens=50) for _ in range(N)),
+                                        return_exceptions=True)
+        finally:
+            await service.close()
+
+    results = run(scenario())
+    assert backend.calls["generate"] == 1
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_cancelling_one_joiner_does_not_cancel_the_shared_call(make_backend, run):
+    backend = make_backend(latency_ms=100)
+    service = PekaService("test-key", backend=backend)
+
+    async def scenario():
+        try:
+            tasks = [asyncio.create_task(service._generate(PROMPT, max_tokens=50)) for _ in range(N)]
+            await asyncio.sleep(0.02)
+            tasks[0].cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await tasks[0]
+            return await asyncio.gather(*tasks[1:])
+        finally:
+            await service.close()
+
+    results = run(scenario())
+    assert backend.calls["generate"] == 1
+    assert len(results) == N - 1 and all(results)
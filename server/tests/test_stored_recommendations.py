@@ -0,0 +1,34 @@
+import pytest
+
+import services.peka_service as peka_service
+from schemas.peka import Task
+from services.analysis_cache import analysis_cache
+from services.peka_service import PekaService
+
+TASKS = [Task(id=1, user_id=1, title="Pay rent", description="", priority="high", created_at="2024-01-01T00:00:00")]
+
+
+@pytest.mark.parametrize("enabled, mode, looked_up", [
+    (False, "hybrid", False),
+    (True, "local", False),
+    (True, "hybrid", True),
+])
+def test_stored_recommendation_lookup(enabled, mode, looked_up, backend, run, monkeypatch):
+    monkeypatch.setattr(peka_service, "PEKA_SERVE_STORED_RECOMMENDATIONS", enabled)
+    service = PekaService("test-key", backend=backend)
+    lookups = []
+
+    async def stored_analysis(user_id, tasks_hash, mode):
+        lookups.append(user_id)
+        return None
+    monkeypatch.setattr(service, "_stored_analysis", stored_analysis)
+    analysis_cache.invalidate_user(1)
+
+    async def scenario():
+        try:
+            await service.analyze_tasks(TASKS, mode=mode, user_id=1)
+        finally:
+            await service.close()
+
+    run(scenario())
+    assert lookups == ([1] if looked_up else [])
@@ -0,0 +1,22 @@
+from schemas.todo import Todo
+from services.todo_index import HashingEmbedder, TodoIndex
+
+TODOS = [
+    Todo(id=1, user_id=1, title="Pay rent", description="before Friday", created_at="2024-01-01T00:00:00"),
+    Todo(id=2, user_id=1, title="Call John", description="about the trip", created_at="2024-01-01T00:00:00"),
+]
+
+
+def test_embedder_is_built_on_first_use_only():
+    built = []
+
+    def factory():
+        built.append(True)
+        return HashingEmbedder()
+
+    index = TodoIndex(None, max_users=10, ttl=60, cache_entries=100, embedder_factory=factory)
+    assert built == []
+    results = index.search(1, "pay the rent", lambda user_id: TODOS, limit=1)
+    index.search(1, "call john", lambda user_id: TODOS, limit=1)
+    assert built == [True]
+    assert results[0][0].id == 1